@@ -0,0 +1,381 @@
+# src/artwork_source.py
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+from render_cache import RenderCache
+
+
+# Raw decoded frame file: MAGIC, uint32 frame count, width, height, channels,
+# then frames as contiguous uint8 BGR starting at _DATA_OFFSET
+FRAMES_MAGIC = b'PRSMART1'
+FRAMES_EXT = '.frames'
+_DATA_OFFSET = 64
+
+# Size cap of the shared frame file directory, evicted least recently used
+FRAMES_CACHE_MAX_BYTES = 8 * 1024 ** 3
+
+
+def scaled_size(size: Tuple[int, int], max_size: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """(width, height) shrunk to fit max_size, keeping aspect ratio (never enlarged)"""
+    width, height = size
+    if not max_size:
+        return width, height
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def warp_resolution(corner_history, margin: float = 1.0) -> Tuple[int, int]:
+    """Largest marquee size in background pixels over the shot.
+
+    The warp never samples the artwork more densely than this, so artwork
+    downscaled to it (times margin) composes without visible loss.
+    """
+    quads = np.asarray(corner_history, dtype=np.float64).reshape(-1, 4, 2)
+    edges = np.linalg.norm(np.roll(quads, -1, axis=1) - quads, axis=2)
+    width = max(edges[:, 0].max(), edges[:, 2].max())
+    height = max(edges[:, 1].max(), edges[:, 3].max())
+    return int(np.ceil(width * margin)), int(np.ceil(height * margin))
+
+
+def _resize(frame: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    if (frame.shape[1], frame.shape[0]) == size:
+        return frame
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+class ArtworkSource:
+    """Artwork frames by index; indices wrap so short artwork loops"""
+
+    mode = 'base'
+
+    def __init__(self, path: str, max_size: Optional[Tuple[int, int]] = None):
+        self.path = path
+        self.max_size = tuple(max_size) if max_size else None
+        self.source_id = RenderCache.source_id(path)
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open artwork {path}")
+        native_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                       int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        self.frame_size = scaled_size(native_size, self.max_size)
+
+    @property
+    def corners(self):
+        """Artwork corners for the homography, in frame_size pixels"""
+        width, height = self.frame_size
+        return [(0, 0), (width, 0), (width, height), (0, height)]
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def get(self, index: int) -> np.ndarray:
+        """Frame index mod len(self) (read only; do not modify)"""
+        raise NotImplementedError
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.get(index)
+
+    def frame_key(self, index: int):
+        """RenderCache art_key of the frame returned by get(index)"""
+        return (self.source_id, self.frame_size, index % len(self))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamArtworkSource(ArtworkSource):
+    """Sequential decode, seeking only on non-sequential access or loop.
+
+    Lowest memory use; the length is learned on the first pass unless a
+    random access needs it earlier.
+    """
+
+    mode = 'stream'
+
+    def __init__(self, path: str, max_size: Optional[Tuple[int, int]] = None):
+        super().__init__(path, max_size)
+        self._cap = cv2.VideoCapture(path)
+        self._next = 0
+        self._length: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        if self._length is None:
+            cap = cv2.VideoCapture(self.path)
+            count = 0
+            while cap.grab():
+                count += 1
+            cap.release()
+            self._length = count
+        return self._length
+
+    def _seek(self, index: int):
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self._next = index
+
+    def get(self, index: int) -> np.ndarray:
+        with self._lock:
+            if self._length is not None:
+                index %= self._length
+            elif index != self._next:
+                index %= len(self)
+
+            if index != self._next:
+                self._seek(index)
+            ret, frame = self._cap.read()
+
+            # End of artwork: now we know its length, loop to the start
+            if not ret and self._length is None and index > 0:
+                self._length = index
+                index = 0
+                self._seek(0)
+                ret, frame = self._cap.read()
+            if not ret:
+                raise IOError(f"Cannot read artwork frame {index} from {self.path}")
+
+            self._next = index + 1
+            return _resize(frame, self.frame_size)
+
+    def close(self):
+        self._cap.release()
+
+
+class MemoryArtworkSource(ArtworkSource):
+    """Artwork decoded once into memory.
+
+    Artwork that fits in max_bytes (the common short looping logo) is held
+    whole and never decoded again. Longer artwork keeps an LRU of the most
+    recently used frames and decodes misses from a stream.
+    """
+
+    mode = 'memory'
+
+    def __init__(self,
+                 path: str,
+                 max_size: Optional[Tuple[int, int]] = None,
+                 max_bytes: int = 1024 ** 3):
+        super().__init__(path, max_size)
+        width, height = self.frame_size
+        self.capacity = max(1, max_bytes // (width * height * 3))
+
+        self._frames: 'OrderedDict[int, np.ndarray]' = OrderedDict()
+        self._stream: Optional[StreamArtworkSource] = None
+        self._lock = threading.Lock()
+
+        cap = cv2.VideoCapture(path)
+        length = 0
+        while True:
+            if length < self.capacity:
+                ret, frame = cap.read()
+                if ret:
+                    frame = _resize(frame, self.frame_size)
+                    frame.flags.writeable = False
+                    self._frames[length] = frame
+            else:
+                ret = cap.grab()
+            if not ret:
+                break
+            length += 1
+        cap.release()
+
+        if length == 0:
+            raise IOError(f"Cannot read artwork frames from {path}")
+        self._length = length
+        if length > self.capacity:
+            self._stream = StreamArtworkSource(path, max_size)
+            self._stream._length = length
+
+    @property
+    def fully_cached(self) -> bool:
+        return self._stream is None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def get(self, index: int) -> np.ndarray:
+        index %= self._length
+        with self._lock:
+            frame = self._frames.get(index)
+            if frame is not None:
+                if self._stream is not None:
+                    self._frames.move_to_end(index)
+                return frame
+
+            frame = self._stream.get(index)
+            frame.flags.writeable = False
+            self._frames[index] = frame
+            if len(self._frames) > self.capacity:
+                self._frames.popitem(last=False)
+            return frame
+
+    @property
+    def nbytes(self) -> int:
+        return sum(frame.nbytes for frame in self._frames.values())
+
+    def close(self):
+        self._frames.clear()
+        if self._stream is not None:
+            self._stream.close()
+
+
+def frames_cache_path(path: str, max_size: Optional[Tuple[int, int]] = None,
+                      cache_dir: Optional[str] = None) -> str:
+    """Raw frame file for an artwork source, keyed by its identity and size"""
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'prisma_artwork')
+    digest = hashlib.sha1(repr((RenderCache.source_id(path), max_size)).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{digest}{FRAMES_EXT}")
+
+
+def prune_frames_cache(cache_dir: str,
+                       max_bytes: int = FRAMES_CACHE_MAX_BYTES,
+                       keep: Optional[str] = None) -> int:
+    """Delete least recently used frame files until cache_dir holds max_bytes.
+
+    A file's mtime is its last use (MemmapArtworkSource touches the file it
+    opens); keep is never deleted. Mappings of a deleted file stay valid
+    where the OS allows deleting open files; elsewhere the file is skipped.
+    Returns the number of bytes freed.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(FRAMES_EXT):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+
+    total = sum(size for _, _, size in entries)
+    freed = 0
+    keep = os.path.abspath(keep) if keep else None
+    for _, path, size in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        if os.path.abspath(path) == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        freed += size
+    return freed
+
+
+def write_frames_file(path: str, frames_path: str, max_size: Optional[Tuple[int, int]] = None) -> int:
+    """Decode artwork once into a raw frame file; returns the frame count"""
+    os.makedirs(os.path.dirname(frames_path) or '.', exist_ok=True)
+    tmp_path = f"{frames_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    cap = cv2.VideoCapture(path)
+    count = 0
+    size = None
+    with open(tmp_path, 'wb') as f:
+        f.seek(_DATA_OFFSET)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if size is None:
+                size = scaled_size((frame.shape[1], frame.shape[0]), max_size)
+            f.write(np.ascontiguousarray(_resize(frame, size)).tobytes())
+            count += 1
+        width, height = size or (0, 0)
+        f.seek(0)
+        f.write(FRAMES_MAGIC + struct.pack('<IIII', count, width, height, 3))
+    cap.release()
+
+    os.replace(tmp_path, frames_path)
+    return count
+
+
+class MemmapArtworkSource(ArtworkSource):
+    """Artwork decoded once to a raw frame file and memory-mapped.
+
+    Frames are shared through the page cache, so worker processes of a
+    chunked render decode nothing. The file is reused while the source is
+    unchanged. Files in the shared cache directory (every source and
+    max_size gets its own) are capped at cache_max_bytes in total, least
+    recently used first; an explicit frames_path is left alone.
+    """
+
+    mode = 'memmap'
+
+    def __init__(self,
+                 path: str,
+                 max_size: Optional[Tuple[int, int]] = None,
+                 frames_path: Optional[str] = None,
+                 cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = FRAMES_CACHE_MAX_BYTES):
+        super().__init__(path, max_size)
+        shared = frames_path is None
+        self.frames_path = frames_path or frames_cache_path(path, self.max_size, cache_dir)
+
+        # Another process may evict the file between writing and opening it
+        for attempt in range(2):
+            if not os.path.exists(self.frames_path):
+                write_frames_file(path, self.frames_path, self.max_size)
+            try:
+                self._open()
+                break
+            except FileNotFoundError:
+                if attempt:
+                    raise
+        if self._frames is None:
+            raise IOError(f"Cannot read artwork frames from {path}")
+
+        if shared:
+            os.utime(self.frames_path)
+            prune_frames_cache(os.path.dirname(self.frames_path), cache_max_bytes, keep=self.frames_path)
+
+    def _open(self):
+        with open(self.frames_path, 'rb') as f:
+            if f.read(len(FRAMES_MAGIC)) != FRAMES_MAGIC:
+                raise ValueError(f"{self.frames_path} is not a Prisma frame file")
+            count, width, height, channels = struct.unpack('<IIII', f.read(16))
+        self._frames = None
+        if count == 0:
+            return
+        self.frame_size = (width, height)
+        self._frames = np.memmap(self.frames_path, dtype=np.uint8, mode='r',
+                                 offset=_DATA_OFFSET, shape=(count, height, width, channels))
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, index: int) -> np.ndarray:
+        return self._frames[index % len(self._frames)]
+
+    def close(self):
+        # Drop the mapping; the frame file stays for the next render
+        self._frames = np.empty((0,) + self._frames.shape[1:], dtype=np.uint8)
+
+
+ARTWORK_SOURCES = {
+    StreamArtworkSource.mode: StreamArtworkSource,
+    MemoryArtworkSource.mode: MemoryArtworkSource,
+    MemmapArtworkSource.mode: MemmapArtworkSource,
+}
+
+
+def open_artwork(path: str, mode: str = 'memory', **kwargs) -> ArtworkSource:
+    """Artwork source for path in one of the ARTWORK_SOURCES modes"""
+    if mode not in ARTWORK_SOURCES:
+        raise ValueError(f"Unknown artwork mode '{mode}', "
+                         f"expected one of {sorted(ARTWORK_SOURCES)}")
+    return ARTWORK_SOURCES[mode](path, **kwargs)
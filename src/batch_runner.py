@@ -0,0 +1,397 @@
+# src/batch_runner.py
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from artwork_source import open_artwork
+from compositor import DynamicCompositor
+from corner_init import corners_path
+from motion_tracker import MarqueeTracker
+from pipeline import SEGMENT_EXT, render_segment, stitch_segments
+from render_cache import RenderCache
+from tracking_io import LOG_EXT, TrackingLog, load_tracking
+
+
+# Shot fields besides 'background' and 'artwork' (required) and 'name' and
+# 'output' (derived when missing); a manifest's 'defaults' override these
+SHOT_DEFAULTS = {
+    'corners': None,
+    'corners_file': None,
+    'auto_corners': False,
+    'tracking': None,
+    'blend_mode': 'normal',
+    'backend': 'csrt',
+    'proxy_scale': None,
+    'artwork_mode': 'memmap',
+    'segment_frames': 300,
+    'compositor': {},
+}
+_PATH_FIELDS = ('background', 'artwork', 'corners_file', 'tracking', 'output')
+
+CHECKPOINT_NAME = 'checkpoint.json'
+TRACKING_NAME = 'tracking_data.json'
+OUTPUT_NAME = 'composition.mp4'
+
+
+def load_manifest(filepath: str, output_root: Optional[str] = None) -> List[dict]:
+    """Shots of a JSON manifest with defaults applied and paths resolved.
+
+    The manifest is a list of shots or {"defaults": {...}, "shots": [...]}.
+    Relative paths are relative to the manifest; a shot without 'output'
+    renders to <output_root>/<name>.
+    """
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {'shots': data}
+
+    defaults = {**SHOT_DEFAULTS, **data.get('defaults', {})}
+    base = os.path.dirname(os.path.abspath(filepath))
+    output_root = output_root or os.path.join(base, 'batch_output')
+
+    shots = []
+    names = set()
+    for index, entry in enumerate(data['shots']):
+        shot = {**defaults, **entry}
+        for key in ('background', 'artwork'):
+            if not shot.get(key):
+                raise ValueError(f"Shot {index} of {filepath} has no '{key}'")
+        for key in _PATH_FIELDS:
+            if shot.get(key):
+                shot[key] = os.path.join(base, shot[key])
+
+        name = shot.get('name') or f"{index:03d}_{os.path.splitext(os.path.basename(shot['background']))[0]}"
+        if name in names:
+            raise ValueError(f"Duplicate shot name '{name}' in {filepath}")
+        names.add(name)
+        shot['name'] = name
+        shot['output'] = shot.get('output') or os.path.join(output_root, name)
+        shots.append(shot)
+    return shots
+
+
+def select_shard(shots: List[dict], shard: Optional[str]) -> List[dict]:
+    """Shots of shard 'i/n' (every n-th shot from i), so n machines can split a manifest"""
+    if not shard:
+        return shots
+    index, count = (int(v) for v in shard.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{shard}', expected i/n with 0 <= i < n")
+    return shots[index::count]
+
+
+def load_checkpoint(output_dir: str) -> dict:
+    path = os.path.join(output_dir, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return {'segments': {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_checkpoint(output_dir: str, checkpoint: dict):
+    """Write the checkpoint atomically, so a crash never leaves it torn"""
+    path = os.path.join(output_dir, CHECKPOINT_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def track_shot(shot: dict, checkpoint: dict) -> Tuple[int, float, str]:
+    """Track a shot, resuming from its tracking log.
+
+    Every tracked frame goes to an append-only log; after a crash the
+    recovery templates are cut from the first frame again and the backend
+    restarts on the last validly tracked frame from its logged corners.
+    Frames logged after it are tracked again.
+    Returns (frames tracked in this run, seconds, tracking data path).
+    """
+    output_dir = shot['output']
+    tracking_path = os.path.join(output_dir, TRACKING_NAME)
+    if checkpoint.get('tracking_done') and os.path.exists(tracking_path):
+        return 0, 0.0, tracking_path
+
+    cap = cv2.VideoCapture(shot['background'])
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {shot['background']}")
+
+    tracker = MarqueeTracker(debug_mode=False, backend=shot['backend'], proxy_scale=shot['proxy_scale'])
+    start_time = time.perf_counter()
+
+    with TrackingLog(os.path.join(output_dir, 'tracking' + LOG_EXT)) as log:
+        valid_records = np.flatnonzero(log.records['valid'])
+        resumed = int(valid_records[-1]) + 1 if len(valid_records) else 0
+        log.truncate(resumed)
+        for record in log.records:
+            tracker.tracking_history.append(record['corners'], bool(record['valid']), float(record['confidence']))
+
+        if resumed == 0:
+            ret, frame = cap.read()
+            if not ret:
+                raise IOError(f"Cannot read first frame of {shot['background']}")
+            corners = tracker.setup_tracking(
+                frame,
+                corners=shot['corners'],
+                corners_file=shot['corners_file'] or corners_path(shot['background']),
+                auto_detect=shot['auto_corners'],
+                interactive=False
+            )
+            if not corners:
+                raise ValueError("No initial corners (set corners, corners_file or auto_corners)")
+            checkpoint['initial_corners'] = [[float(x), float(y)] for x, y in corners]
+            save_checkpoint(output_dir, checkpoint)
+            tracker.initialize_trackers(frame, corners)
+        else:
+            # Same templates as the interrupted run; only the backend
+            # restarts, on the last valid frame, and tracking continues after it
+            print(f"[{shot['name']}] Resuming tracking at frame {resumed}")
+            initial_corners = [tuple(c) for c in checkpoint['initial_corners']]
+            last_corners = [tuple(c) for c in log.records[-1]['corners']]
+            tracker.initial_corners = initial_corners
+            tracker._start_corners = np.asarray(initial_corners, dtype=np.float32)
+            ret, frame = cap.read()
+            if not ret:
+                raise IOError(f"Cannot read first frame of {shot['background']}")
+            if tracker.recovery is not None:
+                tracker.recovery.init(frame, initial_corners, last_corners)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, resumed - 1)
+            ret, frame = cap.read()
+            if not ret:
+                raise IOError(f"Cannot seek to frame {resumed - 1} of {shot['background']}")
+            tracker._start_backend(frame, last_corners)
+            ret, frame = cap.read()
+            if not ret:
+                frame = None
+
+        while frame is not None:
+            tracker.track_frame(frame)
+            history = tracker.tracking_history
+            log.append(history[-1], history.valid[-1], history.confidence[-1])
+            ret, frame = cap.read()
+            if not ret:
+                frame = None
+
+    cap.release()
+    tracker.save_tracking_data(tracking_path)
+    checkpoint['tracking_done'] = True
+    save_checkpoint(output_dir, checkpoint)
+    return len(tracker.tracking_history) - resumed, time.perf_counter() - start_time, tracking_path
+
+
+def render_settings_key(shot: dict) -> str:
+    """Hash of the sources and settings a shot's segments are rendered with"""
+    return RenderCache.make_key(
+        RenderCache.source_id(shot['background']),
+        RenderCache.source_id(shot['artwork']),
+        shot['artwork_mode'],
+        shot['blend_mode'],
+        json.dumps(shot['compositor'], sort_keys=True)
+    )
+
+
+def compose_shot(shot: dict, checkpoint: dict, tracking_path: str) -> Dict[str, float]:
+    """Compose a shot segment by segment, skipping segments already encoded.
+
+    Each finished segment is recorded in the checkpoint with its frame
+    range and a hash of its render settings and tracking, so a restarted
+    run reuses it only when it would render the same frames again. The
+    segments are stitched into the output once all exist.
+    """
+    output_dir = shot['output']
+    data = load_tracking(tracking_path)
+    corner_history = np.asarray(data.smoothed)
+
+    with open_artwork(shot['artwork'], shot['artwork_mode']) as artwork:
+        art_corners = artwork.corners
+    homographies, valid = DynamicCompositor().batch_homographies(art_corners, corner_history)
+    # Frames without valid tracking stay uncomposited
+    valid = valid & data.valid
+
+    segment_dir = os.path.join(output_dir, 'segments')
+    os.makedirs(segment_dir, exist_ok=True)
+    done = checkpoint.setdefault('segments', {})
+    step = max(1, int(shot['segment_frames']))
+    settings_key = render_settings_key(shot)
+
+    segment_paths = []
+    rendered = reused = 0
+    start_time = time.perf_counter()
+    for start in range(0, len(corner_history), step):
+        end = min(start + step, len(corner_history))
+        name = f"segment_{start // step:04d}.{SEGMENT_EXT}"
+        segment_path = os.path.join(segment_dir, name)
+        segment_paths.append(segment_path)
+        record = {
+            'start': start,
+            'end': end,
+            'key': RenderCache.make_key(settings_key, corner_history[start:end], valid[start:end]),
+        }
+        if done.get(name) == record and os.path.exists(segment_path):
+            reused += 1
+            continue
+
+        written = render_segment(
+            segment_path, shot['background'], shot['artwork'], start, end,
+            corner_history[start:end], homographies[start:end], valid[start:end],
+            artwork_mode=shot['artwork_mode'],
+            blend_mode=shot['blend_mode'],
+            compositor_options=shot['compositor']
+        )
+        # A short segment (unreadable background frames) is never recorded,
+        # so it is rendered again instead of being stitched as if complete
+        if written != end - start:
+            raise IOError(f"Segment {name} has {written} of {end - start} frames")
+        done[name] = record
+        save_checkpoint(output_dir, checkpoint)
+        rendered += written
+    compose_seconds = time.perf_counter() - start_time
+
+    cap = cv2.VideoCapture(shot['background'])
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    # Stitch to a temporary name first: the output exists only when complete
+    start_time = time.perf_counter()
+    partial_path = os.path.join(output_dir, 'composition.partial.mp4')
+    frames = stitch_segments(segment_paths, partial_path, fps, size, remove=False)
+    if frames != len(corner_history):
+        os.remove(partial_path)
+        raise IOError(f"Stitched {frames} of {len(corner_history)} frames")
+    os.replace(partial_path, os.path.join(output_dir, OUTPUT_NAME))
+    checkpoint['done'] = True
+    checkpoint['frames'] = frames
+    save_checkpoint(output_dir, checkpoint)
+    for segment_path in segment_paths:
+        os.remove(segment_path)
+    os.rmdir(segment_dir)
+
+    return {
+        'frames': frames,
+        'composed_frames': rendered,
+        'compose_s': compose_seconds,
+        'segments_reused': reused,
+        'stitch_s': time.perf_counter() - start_time,
+    }
+
+
+def run_shot(shot: dict) -> dict:
+    """Track and compose one shot; failures are reported, not raised"""
+    summary = {
+        'name': shot['name'],
+        'status': 'done',
+        'frames': 0,
+        'tracked_frames': 0,
+        'tracking_s': 0.0,
+        'composed_frames': 0,
+        'compose_s': 0.0,
+        'segments_reused': 0,
+        'stitch_s': 0.0,
+        'error': None,
+    }
+    start_time = time.perf_counter()
+    try:
+        output_dir = shot['output']
+        # Fail before spending any time tracking
+        for key in ('background', 'artwork', 'tracking'):
+            if shot[key] and not os.path.exists(shot[key]):
+                raise FileNotFoundError(f"{key} not found: {shot[key]}")
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint = load_checkpoint(output_dir)
+
+        if checkpoint.get('done') and os.path.exists(os.path.join(output_dir, OUTPUT_NAME)):
+            summary['status'] = 'skipped'
+            summary['frames'] = checkpoint.get('frames', 0)
+        else:
+            tracking_path = shot['tracking']
+            if not tracking_path:
+                tracked, seconds, tracking_path = track_shot(shot, checkpoint)
+                summary['tracked_frames'] = tracked
+                summary['tracking_s'] = seconds
+            summary.update(compose_shot(shot, checkpoint, tracking_path))
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['error'] = f"{type(e).__name__}: {e}"
+
+    summary['total_s'] = time.perf_counter() - start_time
+    summary['tracking_fps'] = summary['tracked_frames'] / summary['tracking_s'] if summary['tracking_s'] else 0.0
+    summary['compose_fps'] = summary['composed_frames'] / summary['compose_s'] if summary['compose_s'] else 0.0
+    print(f"[{shot['name']}] {summary['status']}"
+          + (f": {summary['error']}" if summary['error'] else f", {summary['frames']} frames"))
+    return summary
+
+
+def _init_worker(threads: int):
+    cv2.setNumThreads(threads)
+
+
+def run_batch(shots: List[dict], jobs: int = 1, threads_per_job: Optional[int] = None) -> List[dict]:
+    """Run shots on a pool of `jobs` worker processes; summaries in manifest order.
+
+    Each worker handles one shot at a time and is replaced after it, so a
+    long campaign does not accumulate memory. OpenCV threads are split
+    between the workers unless threads_per_job is given.
+    """
+    if not shots:
+        return []
+    jobs = max(1, min(jobs, len(shots)))
+    threads = threads_per_job or max(1, (os.cpu_count() or 1) // jobs)
+
+    if jobs == 1:
+        _init_worker(threads)
+        return [run_shot(shot) for shot in shots]
+
+    # spawn: cv2 and fork do not mix well once OpenCV threads exist
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(jobs, initializer=_init_worker, initargs=(threads,), maxtasksperchild=1) as pool:
+        summaries = list(pool.imap_unordered(run_shot, shots))
+
+    order = {shot['name']: i for i, shot in enumerate(shots)}
+    return sorted(summaries, key=lambda summary: order[summary['name']])
+
+
+def summary_table(summaries: List[dict]) -> str:
+    """Human-readable run summary, one row per shot"""
+    lines = [f"{'shot':<28} {'status':<8} {'frames':>7} {'track fps':>10} {'comp fps':>9} "
+             f"{'reused':>7} {'total s':>8}"]
+    for s in summaries:
+        lines.append(f"{s['name']:<28} {s['status']:<8} {s['frames']:>7} {s['tracking_fps']:>10.1f} "
+                     f"{s['compose_fps']:>9.1f} {s['segments_reused']:>7} {s['total_s']:>8.1f}")
+        if s['error']:
+            lines.append(f"    {s['error']}")
+    counts = {status: sum(s['status'] == status for s in summaries) for status in ('done', 'skipped', 'failed')}
+    lines.append(f"{counts['done']} done, {counts['skipped']} skipped, {counts['failed']} failed")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Track and compose a manifest of shots, resumably")
+    parser.add_argument('manifest', help="JSON list of shots, or {'defaults': {...}, 'shots': [...]}")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="shots processed concurrently")
+    parser.add_argument('--threads-per-job', type=int, help="OpenCV threads per worker (default: cores / jobs)")
+    parser.add_argument('--output-root', help="output for shots without 'output' (default <manifest dir>/batch_output)")
+    parser.add_argument('--shard', help="process only shard i/n of the manifest (e.g. 0/4)")
+    parser.add_argument('--summary', help="write the run summary to this JSON file")
+    args = parser.parse_args()
+
+    shots = select_shard(load_manifest(args.manifest, args.output_root), args.shard)
+    print(f"Processing {len(shots)} shots with {min(args.jobs, len(shots)) or 1} workers")
+    start = time.perf_counter()
+    summaries = run_batch(shots, args.jobs, args.threads_per_job)
+
+    print("=== BATCH SUMMARY ===")
+    print(summary_table(summaries))
+    print(f"elapsed {time.perf_counter() - start:.1f} s")
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({'shots': summaries}, f, indent=2)
+        print(f"Summary saved to {args.summary}")
+
+    if any(s['status'] == 'failed' for s in summaries):
+        sys.exit(1)
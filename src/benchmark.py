@@ -0,0 +1,497 @@
+# src/benchmark.py
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from compositor import DynamicCompositor
+from motion_tracker import MarqueeTracker
+from tracker_backends import TRACKER_BACKENDS
+
+
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+BLEND_MODES = ('normal', 'multiply', 'screen')
+
+# Fraction of throughput (or accuracy) a result may lose against the
+# baseline before compare() reports a regression
+DEFAULT_THRESHOLD = 0.20
+
+# Occlusion scenario as (first frame, end frame, occluded corners): a hand
+# over the top-right corner for frames 20-35, then the whole marquee for
+# frames 55-60
+OCCLUSIONS = ((20, 36, (1,)), (55, 61, (0, 1, 2, 3)))
+
+
+def _texture(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """Multi-scale noise plus gradients: trackable everywhere, never periodic"""
+    texture = np.zeros((height, width, 3), dtype=np.float32)
+    for sigma, weight in ((2, 0.25), (8, 0.35), (32, 0.4)):
+        noise = rng.standard_normal((height, width, 3)).astype(np.float32)
+        noise = cv2.GaussianBlur(noise, (0, 0), sigma)
+        noise /= noise.std() + 1e-6
+        texture += weight * noise
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, np.newaxis]
+    texture += (0.8 * x + 0.5 * y)[:, :, np.newaxis] * np.float32([1.0, 0.6, 0.3])
+    return np.clip(90 + 45 * texture, 0, 255).astype(np.uint8)
+
+
+def _draw_marquee(texture: np.ndarray, quad: np.ndarray, rng: np.random.Generator):
+    """Bright bordered panel with a checker and text, so corners have structure"""
+    x0, y0 = quad[0].astype(int)
+    x1, y1 = quad[2].astype(int)
+    panel = texture[y0:y1, x0:x1]
+    panel[:] = (235, 235, 225)
+
+    h, w = panel.shape[:2]
+    cell = max(4, min(w, h) // 10)
+    yy, xx = np.mgrid[0:h, 0:w]
+    checker = ((yy // cell + xx // cell) % 2).astype(bool)
+    inner = np.zeros((h, w), dtype=bool)
+    inner[h // 4:3 * h // 4, w // 8:7 * w // 8] = True
+    panel[checker & inner] = (40, 40, 160)
+
+    thickness = max(2, min(w, h) // 40)
+    cv2.rectangle(panel, (0, 0), (w - 1, h - 1), (20, 20, 20), thickness)
+    cv2.putText(panel, 'PRISMA', (w // 8, h // 5), cv2.FONT_HERSHEY_SIMPLEX,
+                max(0.5, w / 400), (20, 120, 20), max(1, w // 200))
+    for _ in range(12):
+        cx, cy = int(rng.uniform(0.1, 0.9) * w), int(rng.uniform(0.78, 0.92) * h)
+        cv2.circle(panel, (cx, cy), max(2, w // 80), (0, 90, 200), -1)
+
+
+def _camera_path(t: np.ndarray, width: int, height: int, margin: int) -> np.ndarray:
+    """Smooth (N, 3, 3) texture-to-frame homographies: pan, zoom, roll, keystone"""
+    n = len(t)
+    angle = 0.04 * np.sin(2 * np.pi * t / 97)
+    scale = 1.0 + 0.08 * np.sin(2 * np.pi * t / 71)
+    tx = -margin + 0.6 * margin * np.sin(2 * np.pi * t / 83)
+    ty = -margin + 0.5 * margin * np.cos(2 * np.pi * t / 61)
+    px = 4e-5 * 1280 / width * np.sin(2 * np.pi * t / 113)
+    py = 3e-5 * 720 / height * np.cos(2 * np.pi * t / 89)
+
+    cx, cy = width / 2 + margin, height / 2 + margin
+    cos, sin = np.cos(angle) * scale, np.sin(angle) * scale
+
+    # Rotate and zoom about the frame center, then pan and add keystone
+    H = np.zeros((n, 3, 3), dtype=np.float64)
+    H[:, 0, 0], H[:, 0, 1] = cos, -sin
+    H[:, 1, 0], H[:, 1, 1] = sin, cos
+    H[:, 0, 2] = cx - cos * cx + sin * cy + tx
+    H[:, 1, 2] = cy - sin * cx - cos * cy + ty
+    H[:, 2, 2] = 1
+    H[:, 2, 0], H[:, 2, 1] = px, py
+    return H
+
+
+def synthetic_shot(size: Tuple[int, int],
+                   frames: int = 60,
+                   seed: int = 0,
+                   noise: float = 3.0,
+                   blur: float = 0.8,
+                   lighting: float = 0.12) -> Tuple[Iterator[np.ndarray], np.ndarray]:
+    """Procedural background footage with a marquee of known position.
+
+    A textured plane holding a marquee panel is viewed through a smooth
+    homography path; frames get sensor noise, varying blur and a global
+    lighting drift. Returns (frame iterator, (frames, 4, 2) ground-truth
+    corners clockwise from top-left). Frames are generated lazily so 4K
+    shots do not sit in memory.
+    """
+    width, height = size
+    margin = width // 8
+    rng = np.random.default_rng(seed)
+    texture = _texture(width + 2 * margin, height + 2 * margin, rng)
+
+    # Marquee centered on the plane, a third of the frame wide
+    mw, mh = width // 3, height // 4
+    x0 = margin + width // 2 - mw // 2
+    y0 = margin + height // 2 - mh // 2
+    quad = np.array([[x0, y0], [x0 + mw, y0], [x0 + mw, y0 + mh], [x0, y0 + mh]], dtype=np.float64)
+    _draw_marquee(texture, quad, rng)
+
+    t = np.arange(frames, dtype=np.float64)
+    homographies = _camera_path(t, width, height, margin)
+    # The panel covers texture pixels x0..x0+mw-1, so its pixel edges sit
+    # half a pixel before each drawn coordinate on every side
+    corners = quad - 0.5
+    truth = np.stack([
+        cv2.perspectiveTransform(corners.reshape(-1, 1, 2), H).reshape(4, 2) for H in homographies
+    ]).astype(np.float32)
+
+    def generate():
+        frame_rng = np.random.default_rng(seed + 1)
+        for i, H in enumerate(homographies):
+            frame = cv2.warpPerspective(texture, H, (width, height), flags=cv2.INTER_LINEAR,
+                                        borderMode=cv2.BORDER_REFLECT)
+            sigma = blur * (1 + 0.5 * np.sin(i / 7.0))
+            if sigma > 0.3:
+                frame = cv2.GaussianBlur(frame, (0, 0), sigma)
+            gain = 1 + lighting * np.sin(2 * np.pi * i / 120)
+            frame = frame.astype(np.float32) * gain
+            if noise:
+                frame += frame_rng.normal(0, noise, frame.shape).astype(np.float32)
+            yield np.clip(frame, 0, 255).astype(np.uint8)
+
+    return generate(), truth
+
+
+def synthetic_artwork(size: Tuple[int, int] = (1024, 576), seed: int = 1) -> np.ndarray:
+    """Smooth colorful artwork frame for composition benchmarks"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    art = _texture(width, height, rng)
+    cv2.putText(art, 'ARTWORK', (width // 10, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                width / 300, (250, 250, 250), max(2, width // 150))
+    return art
+
+
+def write_synthetic_video(path: str, size=(1280, 720), frames: int = 60, fps: int = 30,
+                          seed: int = 0, fourcc: str = 'mp4v', **kwargs) -> np.ndarray:
+    """Write a synthetic shot to a video file; returns ground-truth corners"""
+    shot, truth = synthetic_shot(size, frames, seed, **kwargs)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    for frame in shot:
+        writer.write(frame)
+    writer.release()
+    return truth
+
+
+def occlude_shot(shot: Iterator[np.ndarray],
+                 truth: np.ndarray,
+                 occlusions=OCCLUSIONS,
+                 seed: int = 0) -> Iterator[np.ndarray]:
+    """Paint textured occluders over the marquee of a synthetic shot.
+
+    occlusions holds (start, end, corners) frame ranges, end exclusive. A
+    disc covers each listed corner and its surroundings; listing all four
+    corners covers the whole marquee with an ellipse, which unlike a
+    bigger quad has no corners of its own to be mistaken for the marquee's.
+    """
+    occluder = None
+    for index, frame in enumerate(shot):
+        active = [corners for start, end, corners in occlusions if start <= index < end]
+        if active:
+            quad = truth[index]
+            mask = np.zeros(frame.shape[:2], dtype=np.uint8)
+            for corners in active:
+                if len(set(corners)) == 4:
+                    center = quad.mean(axis=0)
+                    top, side = quad[1] - quad[0], quad[3] - quad[0]
+                    axes = (int(0.8 * np.linalg.norm(top)), int(0.8 * np.linalg.norm(side)))
+                    angle = float(np.degrees(np.arctan2(top[1], top[0])))
+                    cv2.ellipse(mask, (int(center[0]), int(center[1])), axes, angle, 0, 360, 255, -1)
+                    continue
+                radius = int(np.linalg.norm(quad[2] - quad[0]) / 8)
+                for corner in corners:
+                    cv2.circle(mask, tuple(int(v) for v in np.round(quad[corner])), radius, 255, -1)
+            if occluder is None:
+                height, width = frame.shape[:2]
+                occluder = _texture(width, height, np.random.default_rng(seed + 2))
+            np.copyto(frame, occluder, where=mask[:, :, np.newaxis] > 0)
+        yield frame
+
+
+def _track_shot(backend: str,
+                size: Tuple[int, int],
+                frames: int,
+                seed: int,
+                occlusions=(),
+                **tracker_kwargs) -> Tuple[List[float], np.ndarray, np.ndarray]:
+    """Per-frame times, tracked corners (NaN where lost) and ground truth"""
+    shot, truth = synthetic_shot(size, frames, seed)
+    if occlusions:
+        shot = occlude_shot(shot, truth, occlusions, seed)
+    tracker = MarqueeTracker(debug_mode=False, backend=backend, **tracker_kwargs)
+
+    first = next(shot)
+    tracker.initialize_trackers(first, [tuple(c) for c in truth[0]])
+    tracked = np.full(truth.shape, np.nan, dtype=np.float32)
+
+    times = []
+    for index, frame in enumerate(itertools.chain([first], shot)):
+        start = time.perf_counter()
+        corners = tracker.track_frame(frame)
+        times.append(time.perf_counter() - start)
+        if corners is not None:
+            tracked[index] = corners
+    return times, tracked, truth
+
+
+def _rmse(tracked: np.ndarray, reference: np.ndarray) -> float:
+    ok = ~np.isnan(tracked[:, 0, 0]) & ~np.isnan(reference[:, 0, 0])
+    if not ok.any():
+        return float('inf')
+    errors = np.linalg.norm(tracked[ok] - reference[ok], axis=2)
+    return float(np.sqrt(np.mean(errors ** 2)))
+
+
+def _tracking_result(times: List[float], tracked: np.ndarray, truth: np.ndarray) -> dict:
+    ok = ~np.isnan(tracked[:, 0, 0])
+    errors = np.linalg.norm(tracked[ok] - truth[ok], axis=2)
+    return {
+        **_throughput(times),
+        'rmse_px': _rmse(tracked, truth),
+        'max_error_px': float(errors.max()) if len(errors) else float('inf'),
+        'tracked_frames': int(ok.sum()),
+    }
+
+
+def bench_tracking(backend: str,
+                   size: Tuple[int, int],
+                   frames: int = 60,
+                   seed: int = 0,
+                   **tracker_kwargs) -> dict:
+    """Tracking throughput and corner RMSE (pixels) against ground truth"""
+    return _tracking_result(*_track_shot(backend, size, frames, seed, **tracker_kwargs))
+
+
+def bench_proxy_tracking(backend: str,
+                         size: Tuple[int, int],
+                         scales=(0.5, 0.25),
+                         refine: Optional[str] = 'template',
+                         frames: int = 60,
+                         seed: int = 0) -> Dict[str, dict]:
+    """Full-resolution tracking and proxy tracking at each scale on the same shot.
+
+    Returns results keyed 'full' and by scale; proxy results add
+    rmse_vs_full_px (distance to the full-resolution corners, not the
+    ground truth) and the speedup over full resolution.
+    """
+    times, full, truth = _track_shot(backend, size, frames, seed)
+    results = {'full': _tracking_result(times, full, truth)}
+    for scale in scales:
+        times, tracked, _ = _track_shot(backend, size, frames, seed, proxy_scale=scale, refine=refine)
+        result = _tracking_result(times, tracked, truth)
+        result['rmse_vs_full_px'] = _rmse(tracked, full)
+        result['speedup'] = result['fps'] / results['full']['fps'] if results['full']['fps'] else 0.0
+        results[scale] = result
+    return results
+
+
+def bench_occlusion(backend: str,
+                    size: Tuple[int, int],
+                    frames: int = 90,
+                    seed: int = 0,
+                    occlusions=OCCLUSIONS,
+                    **tracker_kwargs) -> dict:
+    """Tracking through the occlusion scenario (see OCCLUSIONS).
+
+    Adds the RMSE and valid frame count while occluded and after the last
+    occlusion; a track that never comes back has an infinite RMSE after.
+    """
+    times, tracked, truth = _track_shot(backend, size, frames, seed, occlusions, **tracker_kwargs)
+    result = _tracking_result(times, tracked, truth)
+
+    occluded = np.zeros(len(truth), dtype=bool)
+    for start, end, _ in occlusions:
+        occluded[start:end] = True
+    after = np.arange(len(truth)) >= max(end for _, end, _ in occlusions)
+    for name, frames_mask in (('occluded', occluded), ('after', after)):
+        result[f'{name}_rmse_px'] = _rmse(tracked[frames_mask], truth[frames_mask])
+        result[f'{name}_tracked_frames'] = int(np.count_nonzero(~np.isnan(tracked[frames_mask, 0, 0])))
+    return result
+
+
+def _throughput(times: List[float]) -> dict:
+    """fps from the median frame time, which shrugs off warm-up and scheduler noise"""
+    ms = 1e3 * np.asarray(times, dtype=np.float64)
+    median = float(np.median(ms))
+    return {
+        'fps': 1e3 / median if median > 0 else 0.0,
+        'p50_ms': median,
+        'p95_ms': float(np.percentile(ms, 95)),
+        'mean_ms': float(ms.mean()),
+        'frames': len(ms),
+    }
+
+
+def bench_composition(blend_mode: str,
+                      size: Tuple[int, int],
+                      frames: int = 60,
+                      use_roi: bool = True,
+                      seed: int = 0,
+                      rounds: int = 3) -> dict:
+    """Composition throughput of compose_frame, composing in place like render_frame.
+
+    Reports the fastest of several rounds; composing is cheap enough that
+    a single round is at the mercy of other load on the machine.
+    """
+    shot, truth = synthetic_shot(size, min(frames, 8), seed)
+    backgrounds = list(shot)
+    artwork = synthetic_artwork()
+    height, width = artwork.shape[:2]
+    art_corners = [(0, 0), (width, 0), (width, height), (0, height)]
+
+    compositor = DynamicCompositor(debug_mode=False, use_roi=use_roi)
+    homographies, valid = compositor.batch_homographies(art_corners, truth)
+    work = np.empty_like(backgrounds[0])
+
+    best = None
+    for _ in range(max(1, rounds)):
+        times = []
+        for i in range(frames):
+            k = i % len(backgrounds)
+            np.copyto(work, backgrounds[k])
+            start = time.perf_counter()
+            compositor.compose_frame(work, artwork, homographies[k], truth[k],
+                                     blend_mode=blend_mode, out=work)
+            times.append(time.perf_counter() - start)
+        result = _throughput(times)
+        if best is None or result['fps'] > best['fps']:
+            best = result
+    return best
+
+
+def environment() -> dict:
+    """Machine description stored with results; baselines only compare like with like"""
+    return {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'opencv_threads': cv2.getNumThreads(),
+    }
+
+
+def run_benchmarks(resolutions=('720p', '1080p', '4k'),
+                   backends=tuple(TRACKER_BACKENDS),
+                   blend_modes=BLEND_MODES,
+                   paths=('roi',),
+                   tracking_frames: int = 60,
+                   compose_frames: int = 60,
+                   seed: int = 0,
+                   proxy_scales=(),
+                   refine: Optional[str] = 'template',
+                   occlusion: bool = False) -> Dict[str, dict]:
+    """Run the suite; results are keyed 'track/<backend>/<res>',
+    'track/<backend>@<scale>/<res>' for proxy tracking,
+    'occlusion/<backend>/<res>' for the occlusion scenario and
+    'compose/<path>/<mode>/<res>'"""
+    results = {}
+    for resolution in resolutions:
+        size = RESOLUTIONS[resolution]
+        for backend in backends:
+            key = f"track/{backend}/{resolution}"
+            if not proxy_scales:
+                results[key] = bench_tracking(backend, size, tracking_frames, seed)
+                print(f"{key:<32} {results[key]['fps']:>8.1f} fps  rmse {results[key]['rmse_px']:.2f} px")
+                continue
+
+            proxy = bench_proxy_tracking(backend, size, proxy_scales, refine, tracking_frames, seed)
+            results[key] = proxy.pop('full')
+            print(f"{key:<32} {results[key]['fps']:>8.1f} fps  rmse {results[key]['rmse_px']:.2f} px")
+            for scale, result in proxy.items():
+                key = f"track/{backend}@{scale:g}/{resolution}"
+                results[key] = result
+                print(f"{key:<32} {result['fps']:>8.1f} fps  rmse {result['rmse_px']:.2f} px  "
+                      f"vs full {result['rmse_vs_full_px']:.2f} px  x{result['speedup']:.1f}")
+        if occlusion:
+            for backend in backends:
+                key = f"occlusion/{backend}/{resolution}"
+                results[key] = bench_occlusion(backend, size, max(tracking_frames, 90), seed)
+                print(f"{key:<32} {results[key]['fps']:>8.1f} fps  rmse {results[key]['rmse_px']:.2f} px  "
+                      f"occluded {results[key]['occluded_rmse_px']:.2f} px  "
+                      f"after {results[key]['after_rmse_px']:.2f} px")
+        for path in paths:
+            for mode in blend_modes:
+                key = f"compose/{path}/{mode}/{resolution}"
+                results[key] = bench_composition(mode, size, compose_frames, path == 'roi', seed)
+                print(f"{key:<32} {results[key]['fps']:>8.1f} fps")
+    return results
+
+
+def save_baseline(filepath: str, results: Dict[str, dict]):
+    with open(filepath, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+
+def load_baseline(filepath: str) -> dict:
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, dict],
+            baseline: dict,
+            threshold: float = DEFAULT_THRESHOLD,
+            rmse_tolerance_px: float = 0.05) -> List[str]:
+    """Regressions of results against a baseline, as readable messages.
+
+    A result regresses when its fps drops by more than threshold, or its
+    tracking RMSE grows by more than threshold (and rmse_tolerance_px).
+    Results missing from either side are skipped.
+    """
+    if baseline.get('environment') != environment():
+        print("Warning: baseline was recorded on a different environment")
+
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+
+        if result['fps'] < base['fps'] * (1 - threshold):
+            regressions.append(f"{key}: {result['fps']:.1f} fps vs baseline {base['fps']:.1f} "
+                               f"({result['fps'] / base['fps'] - 1:+.0%})")
+
+        if 'rmse_px' in result and 'rmse_px' in base:
+            limit = base['rmse_px'] * (1 + threshold) + rmse_tolerance_px
+            if result['rmse_px'] > limit:
+                regressions.append(f"{key}: rmse {result['rmse_px']:.2f} px vs baseline "
+                                   f"{base['rmse_px']:.2f} px")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prisma tracker and compositor benchmarks (CPU, offline)")
+    parser.add_argument('--resolutions', nargs='+', default=['720p', '1080p', '4k'], choices=list(RESOLUTIONS))
+    parser.add_argument('--backends', nargs='+', default=list(TRACKER_BACKENDS), choices=list(TRACKER_BACKENDS))
+    parser.add_argument('--blend-modes', nargs='+', default=list(BLEND_MODES), choices=list(BLEND_MODES))
+    parser.add_argument('--paths', nargs='+', default=['roi'], choices=['roi', 'full'],
+                        help="compose path: ROI (default) and/or legacy full-frame blend_frames")
+    parser.add_argument('--tracking-frames', type=int, default=60)
+    parser.add_argument('--compose-frames', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--proxy-scales', nargs='+', type=float, default=[],
+                        help="also track at these proxy scales (e.g. 0.5 0.25) with full-res refinement")
+    parser.add_argument('--refine', default='template', choices=['template', 'subpix', 'none'],
+                        help="full-res refinement of proxy corners")
+    parser.add_argument('--occlusion', action='store_true',
+                        help="also track through a covered corner and a fully covered marquee")
+    parser.add_argument('--output', help="write results (with environment) to this JSON file")
+    parser.add_argument('--save-baseline', help="store results as a baseline")
+    parser.add_argument('--compare', help="baseline to compare against; exits 1 on regression")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed fractional fps drop / rmse increase (default 0.20)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.resolutions, args.backends, args.blend_modes, args.paths,
+                             args.tracking_frames, args.compose_frames, args.seed,
+                             args.proxy_scales, None if args.refine == 'none' else args.refine,
+                             args.occlusion)
+
+    if args.output:
+        save_baseline(args.output, results)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.0%})")
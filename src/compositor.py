@@ -1,12 +1,275 @@
 # src/compositor.py
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+from metrics import metrics, timed
+
+
+# Padding around the marquee bounding box so the 5x5 feather blur never
+# samples outside the zero border of the ROI
+ROI_PADDING = 3
+
+# Default feathering of marquee masks (mask_mode 'gaussian'); a
+# compositor's mask_params are part of every render cache key
+MASK_PARAMS = ('gaussian', (5, 5))
+MASK_MODES = ('gaussian', 'sdf')
+
+# cv2.warpPerspective maps each output pixel from its absolute position, so
+# the ROI is warped into an output starting at the frame origin and cropped:
+# re-basing the homography on the ROI changes rounding in the mapping. The
+# output width is rounded up to this many pixels, so the ROI's columns take
+# the same vectorized path as in a full-frame warp (only the last few
+# columns of a row take the scalar path, which rounds differently).
+WARP_COLUMN_ALIGN = 64
+
+
+def quad_is_convex(quads: np.ndarray, min_area: float = 1e-3) -> np.ndarray:
+    """Per-quad check that (N, 4, 2) corners form a non-degenerate convex quad"""
+    quads = np.asarray(quads, dtype=np.float64).reshape(-1, 4, 2)
+    edges = np.roll(quads, -1, axis=1) - quads
+    next_edges = np.roll(edges, -1, axis=1)
+    cross = edges[:, :, 0] * next_edges[:, :, 1] - edges[:, :, 1] * next_edges[:, :, 0]
+    
+    # Collinear corners give ~0 turns; concave or self-intersecting quads mix signs
+    return np.all(cross > min_area, axis=1) | np.all(cross < -min_area, axis=1)
+
+
+def _edge_lines(corners) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Lines a*x + b*y + c = signed pixel distance to each quad edge, positive inside"""
+    pts = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+    edges = np.roll(pts, -1, axis=0) - pts
+    lengths = np.linalg.norm(edges, axis=1)
+    lengths[lengths == 0] = 1
+    
+    # Unit normals pointing into the quad, whichever its winding
+    area2 = np.sum(pts[:, 0] * np.roll(pts[:, 1], -1) - np.roll(pts[:, 0], -1) * pts[:, 1])
+    sign = 1.0 if area2 >= 0 else -1.0
+    a = -edges[:, 1] / lengths * sign
+    b = edges[:, 0] / lengths * sign
+    c = -(a * pts[:, 0] + b * pts[:, 1])
+    return a, b, c
+
+
+def _row_spans(a, b, c, ys: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Per row, the x interval where every edge distance is >= threshold"""
+    lower = np.full(len(ys), -np.inf)
+    upper = np.full(len(ys), np.inf)
+    for k in range(4):
+        rest = threshold - b[k] * ys - c[k]
+        if a[k] > 1e-12:
+            np.maximum(lower, rest / a[k], out=lower)
+        elif a[k] < -1e-12:
+            np.minimum(upper, rest / a[k], out=upper)
+        else:
+            # Horizontal edge: the whole row is on one side
+            lower[rest > 0] = np.inf
+    return lower, upper
+
+
+def quad_coverage(corners, 
+                  roi: Tuple[int, int, int, int], 
+                  feather: float = 1.0, 
+                  supersample: int = 1, 
+                  dtype=np.uint8, 
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Analytic anti-aliased coverage of a convex quad over roi (x, y, w, h).
+    
+    Coverage ramps linearly across a band `feather` pixels wide centered on
+    the quad edges, from the signed distance to the nearest edge line (exact
+    inside a convex quad); a feather of about 1 px is plain edge
+    anti-aliasing. supersample > 1 averages s x s samples per pixel, which
+    sharpens the corners. Rows are split analytically into outside, inside
+    and edge spans and only edge pixels are evaluated, so the cost is a
+    fill of the ROI plus work proportional to the perimeter. Returns uint8
+    (0-255) or float32 (0-1) coverage.
+    """
+    x, y, w, h = roi
+    a, b, c = _edge_lines(corners)
+    feather = max(float(feather), 1e-3)
+    samples = max(1, int(supersample))
+    float_out = np.dtype(dtype) == np.float32
+    
+    if out is None:
+        out = np.empty((h, w), dtype=np.float32 if float_out else np.uint8)
+    out.fill(0)
+    
+    # Sub-samples sit up to half a pixel (diagonally) from the pixel center
+    reach = 0.5 * np.sqrt(2) if samples > 1 else 0.0
+    ys = np.arange(y, y + h, dtype=np.float64)
+    inner_lo, inner_hi = _row_spans(a, b, c, ys, feather / 2 + reach)
+    outer_lo, outer_hi = _row_spans(a, b, c, ys, -feather / 2 - reach)
+    
+    # Column spans in ROI coordinates, clipped to the ROI
+    def columns(lower, upper):
+        with np.errstate(invalid='ignore'):
+            lo = np.clip(np.ceil(lower - x), 0, w).astype(np.int64)
+            hi = np.clip(np.floor(upper - x), -1, w - 1).astype(np.int64)
+        return lo, hi
+    
+    outer_lo, outer_hi = columns(outer_lo, outer_hi)
+    inner_lo, inner_hi = columns(inner_lo, inner_hi)
+    has_inner = (inner_lo <= inner_hi) & (outer_lo <= outer_hi)
+    
+    # Fully covered spans
+    full = 1.0 if float_out else 255
+    for row in np.flatnonzero(has_inner):
+        out[row, inner_lo[row]:inner_hi[row] + 1] = full
+    
+    # Edge spans: left and right of the covered span, or the whole row
+    left_end = np.where(has_inner, inner_lo - 1, outer_hi)
+    right_start = np.where(has_inner, inner_hi + 1, outer_hi + 1)
+    starts = np.concatenate([outer_lo, right_start])
+    counts = np.maximum(np.concatenate([left_end - outer_lo + 1, outer_hi - right_start + 1]), 0)
+    total = int(counts.sum())
+    if total == 0:
+        return out
+    
+    rows = np.repeat(np.concatenate([np.arange(h), np.arange(h)]), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = np.repeat(starts, counts) + offsets
+    
+    px = cols + float(x)
+    py = rows + float(y)
+    coverage = np.zeros(total, dtype=np.float64)
+    sub = (np.arange(samples) + 0.5) / samples - 0.5
+    for oy in sub:
+        for ox in sub:
+            distance = a[0] * (px + ox) + b[0] * (py + oy) + c[0]
+            for k in range(1, 4):
+                np.minimum(distance, a[k] * (px + ox) + b[k] * (py + oy) + c[k], out=distance)
+            coverage += np.clip(0.5 + distance / feather, 0, 1)
+    coverage /= samples * samples
+    
+    if float_out:
+        out[rows, cols] = coverage
+    else:
+        out[rows, cols] = (coverage * 255 + 0.5).astype(np.uint8)
+    return out
+
+
+def color_lut(gain: np.ndarray) -> np.ndarray:
+    """(256, 1, C) uint8 table applying a per-channel gain, for cv2.LUT"""
+    table = np.arange(256, dtype=np.float64)[:, np.newaxis] * gain[np.newaxis, :]
+    np.clip(table, 0, 255, out=table)
+    return table.astype(np.uint8)[:, np.newaxis, :]
+
+
+class BufferPool:
+    """Preallocated scratch buffers for one output frame shape and dtype"""
+
+    def __init__(self, frame_shape: Tuple[int, ...], dtype=np.uint8):
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self._storage: Dict[str, np.ndarray] = {}
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Contiguous view of the named buffer with the requested shape.
+
+        Storage is sized for a full frame on first use, so ROI-sized requests
+        never reallocate in steady state.
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        storage = self._storage.get(name)
+
+        if storage is None or storage.dtype != dtype or storage.size < size:
+            channels = int(np.prod(shape[2:])) if len(shape) > 2 else 1
+            capacity = self.frame_shape[0] * self.frame_shape[1] * channels
+            storage = np.empty(max(size, capacity), dtype=dtype)
+            self._storage[name] = storage
+
+        return storage[:size].reshape(shape)
+
+    @property
+    def nbytes(self) -> int:
+        """Total bytes held by the pool"""
+        return sum(storage.nbytes for storage in self._storage.values())
+
+    def clear(self):
+        """Release all buffers"""
+        self._storage.clear()
 
 
 class DynamicCompositor:
-    def __init__(self, debug_mode=True):
+    """Warps, masks, color matches and blends artwork into background frames.
+
+    Scratch buffers are shared per compositor, so use one instance per thread.
+    """
+
+    def __init__(self, 
+                 debug_mode=True, 
+                 use_roi=True, 
+                 reuse_output=False, 
+                 render_cache=None, 
+                 color_smoothing=None, 
+                 color_update_interval=1, 
+                 mask_mode='gaussian', 
+                 feather=2.0, 
+                 feather_fraction=None, 
+                 mask_supersample=1):
         self.debug_mode = debug_mode
+        self.use_roi = use_roi
+        self.reuse_output = reuse_output
+        self._pools: Dict[Tuple, BufferPool] = {}
+        
+        # Optional RenderCache for warped artwork and masks (ROI path)
+        self.render_cache = render_cache
+        self._last_mask_key = None
+        
+        # Mask feathering: 'gaussian' (5x5 blur of the filled polygon) or
+        # 'sdf' (analytic coverage, feather in px or as a fraction of the
+        # quad size so it scales with the marquee and resolution)
+        if mask_mode not in MASK_MODES:
+            raise ValueError(f"Unknown mask mode '{mask_mode}', expected one of {MASK_MODES}")
+        self.mask_mode = mask_mode
+        self.feather = feather
+        self.feather_fraction = feather_fraction
+        self.mask_supersample = max(1, int(mask_supersample))
+        
+        # Temporal color matching: EMA weight of each new gain (None: off)
+        # and how many frames reuse a gain before it is measured again.
+        # Stateful, so only meaningful when frames arrive in order.
+        self.color_smoothing = color_smoothing
+        self.color_update_interval = max(1, color_update_interval)
+        self.reset_color_state()
+    
+    def reset_color_state(self):
+        """Forget the smoothed color gain (call between shots)"""
+        self._color_gain: Optional[np.ndarray] = None
+        self._color_lut: Optional[np.ndarray] = None
+        self._color_frames = 0
+
+    @property
+    def mask_params(self) -> Tuple:
+        """Everything that determines the mask besides the corners"""
+        if self.mask_mode == 'gaussian':
+            return MASK_PARAMS
+        return ('sdf', self.feather, self.feather_fraction, self.mask_supersample)
+    
+    def feather_width(self, corners) -> float:
+        """SDF feather width in pixels for this quad"""
+        if self.feather_fraction is None:
+            return float(self.feather)
+        # Quad size as the square root of its area
+        pts = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+        area = 0.5 * abs(np.sum(pts[:, 0] * np.roll(pts[:, 1], -1) - np.roll(pts[:, 0], -1) * pts[:, 1]))
+        return float(self.feather_fraction * np.sqrt(area))
+    
+    def roi_padding(self, corners) -> int:
+        """ROI padding that keeps the whole feather inside the ROI"""
+        if self.mask_mode == 'gaussian':
+            return ROI_PADDING
+        return int(np.ceil(self.feather_width(corners) / 2)) + 1
+
+    def buffer_pool(self, frame_shape: Tuple[int, ...], dtype=np.uint8) -> BufferPool:
+        """Buffer pool for the given output shape and dtype"""
+        key = (tuple(frame_shape), np.dtype(dtype).str)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = BufferPool(frame_shape, dtype)
+            self._pools[key] = pool
+        return pool
         
     def calculate_homography(self, 
                            src_corners: List[Tuple[int, int]], 
@@ -25,80 +288,372 @@ class DynamicCompositor:
             print(f"Error calculating homography: {e}")
             return None
     
+    @timed('compositor.homographies')
+    def batch_homographies(self, 
+                           src_corners: List[Tuple[int, int]], 
+                           corner_history) -> Tuple[np.ndarray, np.ndarray]:
+        """Homographies for a whole shot in one vectorized DLT solve
+        
+        Takes the fixed source quad and an (N, 4, 2) corner history and
+        returns an (N, 3, 3) homography stack plus an (N,) validity mask.
+        Degenerate destination quads (collinear, concave or self-intersecting)
+        are marked invalid and get an all-zero matrix.
+        """
+        src = np.asarray(src_corners, dtype=np.float64).reshape(4, 2)
+        dst = np.asarray(corner_history, dtype=np.float64).reshape(-1, 4, 2)
+        n = len(dst)
+        
+        valid = quad_is_convex(dst)
+        if not quad_is_convex(src[np.newaxis])[0]:
+            valid[:] = False
+        
+        # Two rows per correspondence, h33 fixed to 1:
+        # [x y 1 0 0 0 -ux -uy] h = u,  [0 0 0 x y 1 -vx -vy] h = v
+        x, y = src[:, 0], src[:, 1]
+        u, v = dst[:, :, 0], dst[:, :, 1]
+        A = np.zeros((n, 8, 8), dtype=np.float64)
+        A[:, 0::2, 0] = x
+        A[:, 0::2, 1] = y
+        A[:, 0::2, 2] = 1
+        A[:, 1::2, 3] = x
+        A[:, 1::2, 4] = y
+        A[:, 1::2, 5] = 1
+        A[:, 0::2, 6] = -u * x
+        A[:, 0::2, 7] = -u * y
+        A[:, 1::2, 6] = -v * x
+        A[:, 1::2, 7] = -v * y
+        b = dst.reshape(n, 8)
+        
+        # Keep the batched solve well-posed: degenerate rows solve identity
+        A[~valid] = np.eye(8)
+        h = np.linalg.solve(A, b[:, :, np.newaxis])[:, :, 0]
+        
+        homographies = np.zeros((n, 3, 3), dtype=np.float64)
+        homographies.reshape(n, 9)[:, :8] = h
+        homographies[:, 2, 2] = 1
+        homographies[~valid] = 0
+        
+        return homographies, valid
+    
+    @timed('compositor.warp')
     def warp_artwork(self, 
                      artwork_frame: np.ndarray, 
                      homography: np.ndarray, 
-                     output_shape: Tuple[int, int]) -> np.ndarray:
+                     output_shape: Tuple[int, int],
+                     dst: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply perspective warp to artwork"""
-        warped = cv2.warpPerspective(artwork_frame, homography, output_shape)
+        warped = cv2.warpPerspective(artwork_frame, homography, output_shape, dst=dst)
         return warped
     
+    @timed('compositor.mask')
     def create_mask(self, 
                     corners: List[Tuple[int, int]], 
-                    frame_shape: Tuple[int, int]) -> np.ndarray:
+                    frame_shape: Tuple[int, int],
+                    dst: Optional[np.ndarray] = None,
+                    pool: Optional[BufferPool] = None) -> np.ndarray:
         """Create mask for marquee area"""
-        mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+        if self.mask_mode == 'sdf':
+            mask = dst if dst is not None else np.empty(frame_shape[:2], dtype=np.uint8)
+            mask.fill(0)
+            roi = self.marquee_roi(corners, frame_shape)
+            if roi is not None:
+                x, y, w, h = roi
+                quad_coverage(corners, roi, self.feather_width(corners), self.mask_supersample,
+                              out=mask[y:y + h, x:x + w])
+            return mask
+        
+        if pool is not None:
+            mask = pool.get('mask_poly', frame_shape[:2], np.uint8)
+            mask.fill(0)
+        else:
+            mask = np.zeros(frame_shape[:2], dtype=np.uint8)
         
         # Create polygon mask
         pts = np.array(corners, dtype=np.int32)
         cv2.fillPoly(mask, [pts], 255)
         
         # Optional: feather edges for smoother blend
-        mask = cv2.GaussianBlur(mask, (5, 5), 0)
+        mask = cv2.GaussianBlur(mask, MASK_PARAMS[1], 0, dst=dst)
         
         return mask
     
+    @timed('compositor.blend')
     def blend_frames(self, 
                      background: np.ndarray, 
                      warped_artwork: np.ndarray, 
                      mask: np.ndarray, 
-                     blend_mode='normal') -> np.ndarray:
+                     blend_mode='normal',
+                     out: Optional[np.ndarray] = None,
+                     pool: Optional[BufferPool] = None) -> np.ndarray:
         """Blend warped artwork into background"""
+        if pool is None:
+            pool = BufferPool(background.shape, background.dtype)
+        shape = background.shape
+
         # Normalize mask to 0-1 range
-        mask_norm = mask.astype(float) / 255.0
-        mask_3d = np.stack([mask_norm] * 3, axis=2)
+        mask_3d = pool.get('mask_3d', shape, np.float64)
+        np.divide(mask[:, :, np.newaxis], 255.0, out=mask_3d)
+        inv_mask = pool.get('inv_mask_3d', shape, np.float64)
+        np.subtract(1, mask_3d, out=inv_mask)
         
-        if blend_mode == 'normal':
-            # Simple alpha blending
-            result = background * (1 - mask_3d) + warped_artwork * mask_3d
-        elif blend_mode == 'multiply':
+        blended = pool.get('blended', shape, np.float64)
+        if blend_mode == 'multiply':
             # Multiply blend mode
-            blended = (background.astype(float) * warped_artwork.astype(float)) / 255.0
-            result = background * (1 - mask_3d) + blended * mask_3d
+            np.multiply(background, warped_artwork, out=blended, dtype=np.float64)
+            blended /= 255.0
         elif blend_mode == 'screen':
             # Screen blend mode
-            inv_bg = 255 - background.astype(float)
-            inv_art = 255 - warped_artwork.astype(float)
-            blended = 255 - (inv_bg * inv_art) / 255.0
-            result = background * (1 - mask_3d) + blended * mask_3d
+            inv_bg = pool.get('inv_bg', shape, np.float64)
+            np.subtract(255.0, background, out=inv_bg)
+            np.subtract(255.0, warped_artwork, out=blended)
+            blended *= inv_bg
+            blended /= 255.0
+            np.subtract(255.0, blended, out=blended)
         else:
-            result = background * (1 - mask_3d) + warped_artwork * mask_3d
+            # Simple alpha blending ('normal' and unknown modes)
+            np.copyto(blended, warped_artwork)
             
-        return result.astype(np.uint8)
+        # background * (1 - mask) + blended * mask
+        result = pool.get('blend_result', shape, np.float64)
+        np.multiply(background, inv_mask, out=result)
+        blended *= mask_3d
+        result += blended
+
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        np.copyto(out, result, casting='unsafe')
+        return out
     
+    def color_gain(self, 
+                   background: np.ndarray, 
+                   mask: np.ndarray) -> Optional[np.ndarray]:
+        """Per-channel gain taking the background tint under the mask
+        
+        None when the mask is empty or the background is black there.
+        """
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            return None
+        
+        # Average color in mask area (every non-zero mask pixel counts fully)
+        channels = background.shape[2]
+        avg_bg_color = np.array(
+            cv2.mean(background[y:y + h, x:x + w], mask[y:y + h, x:x + w])[:channels])
+        level = np.mean(avg_bg_color)
+        if level <= 0:
+            return None
+        
+        # Simple color temperature adjustment
+        return avg_bg_color / level
+    
+    @timed('compositor.color_match')
     def color_match(self, 
                     artwork: np.ndarray, 
                     background: np.ndarray, 
-                    mask: np.ndarray) -> np.ndarray:
-        """Match artwork colors to background lighting"""
-        # Extract background colors in marquee area
-        masked_bg = cv2.bitwise_and(background, background, mask=mask)
-        
-        # Calculate average color in mask area
-        mask_area = np.sum(mask > 0)
-        if mask_area == 0:
-            return artwork
+                    mask: np.ndarray,
+                    out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Match artwork colors to background lighting
+
+        The gain is applied through a per-channel lookup table. Returns the
+        artwork unchanged when there is nothing to match against.
+        """
+        if self.color_smoothing is None:
+            gain = self.color_gain(background, mask)
+            if gain is None:
+                return artwork
+            lut = color_lut(gain)
+        else:
+            lut = self._smoothed_color_lut(background, mask)
+            if lut is None:
+                return artwork
+        
+        if out is None:
+            out = np.empty(artwork.shape, dtype=np.uint8)
+        cv2.LUT(artwork, lut, dst=out)
+        return out
+    
+    def _smoothed_color_lut(self, 
+                            background: np.ndarray, 
+                            mask: np.ndarray) -> Optional[np.ndarray]:
+        """Lookup table for the EMA-smoothed gain, re-measured every interval"""
+        frame = self._color_frames
+        self._color_frames += 1
+        if self._color_lut is not None and frame % self.color_update_interval:
+            return self._color_lut
+        
+        gain = self.color_gain(background, mask)
+        if gain is None:
+            return self._color_lut
+        if self._color_gain is not None:
+            gain = self.color_smoothing * gain + (1 - self.color_smoothing) * self._color_gain
+        self._color_gain = gain
+        self._color_lut = color_lut(gain)
+        return self._color_lut
+
+    def marquee_roi(self, 
+                    corners: List[Tuple[int, int]], 
+                    frame_shape: Tuple[int, int]) -> Optional[Tuple[int, int, int, int]]:
+        """Bounding rectangle (x, y, w, h) of the marquee and its feather, clipped to the frame"""
+        pts = np.array(corners, dtype=np.int32)
+        height, width = frame_shape[:2]
+        padding = self.roi_padding(corners)
+        
+        x0 = max(int(pts[:, 0].min()) - padding, 0)
+        y0 = max(int(pts[:, 1].min()) - padding, 0)
+        x1 = min(int(pts[:, 0].max()) + padding + 1, width)
+        y1 = min(int(pts[:, 1].max()) + padding + 1, height)
+        
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+    
+    def compose_roi(self, 
+                    background: np.ndarray, 
+                    artwork_frame: np.ndarray, 
+                    homography: np.ndarray, 
+                    dst_corners: List[Tuple[int, int]], 
+                    blend_mode='normal', 
+                    match_colors=True,
+                    out: Optional[np.ndarray] = None,
+                    art_key=None) -> np.ndarray:
+        """Composite artwork only inside the marquee ROI.
+
+        Writes into `out` (default: background, in place). Pixels outside the
+        ROI are expected to already hold the background. With a render_cache
+        set, `art_key` (artwork source id and frame index) enables caching of
+        the warped artwork and mask.
+        """
+        if out is None:
+            out = background
+        roi = self.marquee_roi(dst_corners, background.shape)
+        if roi is None:
+            return out
+        x, y, w, h = roi
+        pool = self.buffer_pool(background.shape, background.dtype)
+        channels = background.shape[2]
+        
+        cache_key = None
+        cached = None
+        if art_key is not None and self.render_cache is not None:
+            cache_key = self.render_cache.make_key(
+                art_key, homography, background.shape, roi, self.mask_params)
+            with metrics.stage('compositor.cache_get'):
+                cached = self.render_cache.get(cache_key)
+        
+        if cached is not None:
+            warped, mask = cached
+        else:
+            # Same pixels as a full-frame warp (see WARP_COLUMN_ALIGN)
+            warp_width = min(-(-(x + w) // WARP_COLUMN_ALIGN) * WARP_COLUMN_ALIGN, background.shape[1])
+            warped = self.warp_artwork(artwork_frame, homography, (warp_width, y + h),
+                                       dst=pool.get('roi_warped', (y + h, warp_width, channels)))
+            warped = warped[y:y + h, x:x + w]
+            
+            # Mask is built the same way as create_mask, offset into the ROI;
+            # unchanged corners (locked-off shots) reuse the previous mask.
+            # The SDF mask uses sub-pixel corners, the polygon fill whole pixels.
+            if self.mask_mode == 'sdf':
+                pts = np.asarray(dst_corners, dtype=np.float32)
+            else:
+                pts = np.array(dst_corners, dtype=np.int32)
+            mask = pool.get('roi_mask', (h, w))
+            mask_key = (background.shape, roi, pts.tobytes(), self.mask_params)
+            if mask_key != self._last_mask_key:
+                with metrics.stage('compositor.mask'):
+                    if self.mask_mode == 'sdf':
+                        quad_coverage(pts, roi, self.feather_width(pts), self.mask_supersample,
+                                      out=mask)
+                    else:
+                        poly = pool.get('roi_mask_poly', (h, w), np.uint8)
+                        poly.fill(0)
+                        cv2.fillPoly(poly, [pts], 255, offset=(-x, -y))
+                        cv2.GaussianBlur(poly, MASK_PARAMS[1], 0, dst=mask)
+                self._last_mask_key = mask_key
             
-        avg_bg_color = np.sum(masked_bg, axis=(0, 1)) / mask_area
+            if cache_key is not None:
+                with metrics.stage('compositor.cache_put'):
+                    self.render_cache.put(cache_key, warped, mask)
         
-        # Adjust artwork to match background tone
-        artwork_float = artwork.astype(float)
+        bg_roi = background[y:y + h, x:x + w]
+        if match_colors:
+            warped = self.color_match(warped, bg_roi, mask,
+                                      out=pool.get('roi_matched', (h, w, channels)))
         
-        # Simple color temperature adjustment
-        color_factor = avg_bg_color / np.mean(avg_bg_color)
-        adjusted_artwork = artwork_float * color_factor
+        with metrics.stage('compositor.blend'):
+            self._blend_roi(out[y:y + h, x:x + w], bg_roi, warped, mask, blend_mode, pool)
+        
+        return out
+    
+    def _blend_roi(self, 
+                   out_roi: np.ndarray, 
+                   bg_roi: np.ndarray, 
+                   warped: np.ndarray, 
+                   mask: np.ndarray, 
+                   blend_mode: str, 
+                   pool: BufferPool):
+        """float32 blend of warped into out_roi: matches blend_frames within 1 LSB"""
+        h, w, channels = bg_roi.shape
+        alpha = pool.get('roi_alpha', (h, w, 1), np.float32)
+        np.multiply(mask[:, :, np.newaxis], np.float32(1.0 / 255.0), out=alpha)
+        bg = pool.get('roi_bg', (h, w, channels), np.float32)
+        np.copyto(bg, bg_roi)
+        art = pool.get('roi_art', (h, w, channels), np.float32)
+        np.copyto(art, warped)
         
-        # Clamp values
-        adjusted_artwork = np.clip(adjusted_artwork, 0, 255)
+        if blend_mode == 'multiply':
+            art *= bg
+            art *= np.float32(1.0 / 255.0)
+        elif blend_mode == 'screen':
+            inv_bg = pool.get('roi_inv_bg', (h, w, channels), np.float32)
+            np.subtract(np.float32(255.0), bg, out=inv_bg)
+            np.subtract(np.float32(255.0), art, out=art)
+            art *= inv_bg
+            art *= np.float32(1.0 / 255.0)
+            np.subtract(np.float32(255.0), art, out=art)
+        
+        # bg + (art - bg) * alpha, written back into the frame
+        art -= bg
+        art *= alpha
+        art += bg
+        np.copyto(out_roi, art, casting='unsafe')
+        
+    @timed('compositor.compose')
+    def compose_frame(self, 
+                      background: np.ndarray, 
+                      artwork_frame: np.ndarray, 
+                      homography: np.ndarray, 
+                      dst_corners: List[Tuple[int, int]], 
+                      blend_mode='normal', 
+                      match_colors=True,
+                      out: Optional[np.ndarray] = None,
+                      art_key=None) -> np.ndarray:
+        """Warp, mask, color match and blend one frame.
+
+        The result goes to `out` when given (pass the background itself to
+        compose in place). Otherwise it is written to the pool's shared result
+        buffer when `reuse_output` is set, or to a fresh array.
+        """
+        pool = self.buffer_pool(background.shape, background.dtype)
+        if out is None:
+            if self.reuse_output:
+                out = pool.get('result', background.shape, background.dtype)
+            else:
+                out = np.empty_like(background)
+
+        if self.use_roi:
+            if out is not background:
+                np.copyto(out, background)
+            return self.compose_roi(background, artwork_frame, homography, 
+                                    dst_corners, blend_mode, match_colors, out=out,
+                                    art_key=art_key)
         
-        return adjusted_artwork.astype(np.uint8)
+        height, width = background.shape[:2]
+        warped_art = self.warp_artwork(artwork_frame, homography, (width, height),
+                                       dst=pool.get('warped', background.shape))
+        mask = self.create_mask(dst_corners, background.shape,
+                                dst=pool.get('mask', background.shape[:2]), pool=pool)
+        if match_colors:
+            warped_art = self.color_match(warped_art, background, mask,
+                                          out=pool.get('matched', background.shape))
+        return self.blend_frames(background, warped_art, mask, blend_mode=blend_mode,
+                                 out=out, pool=pool)
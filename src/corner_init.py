@@ -0,0 +1,152 @@
+# src/corner_init.py
+import json
+import os
+import re
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+from compositor import quad_is_convex
+
+
+# Sidecar corner file next to a shot: <video>.corners.json
+CORNERS_EXT = '.corners.json'
+
+
+def order_corners(corners) -> np.ndarray:
+    """Corners ordered clockwise on screen from the top-left, as (4, 2) float32"""
+    pts = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+    center = pts.mean(axis=0)
+    angles = np.arctan2(pts[:, 1] - center[1], pts[:, 0] - center[0])
+    pts = pts[np.argsort(angles)]
+
+    # Start at the corner closest to the image origin
+    start = int(np.argmin(pts.sum(axis=1)))
+    return np.roll(pts, -start, axis=0)
+
+
+def parse_corners(text: str) -> List[Tuple[float, float]]:
+    """Corners from "x1,y1 x2,y2 x3,y3 x4,y4" (any separators, 8 numbers)"""
+    values = [float(v) for v in re.findall(r'-?\d+(?:\.\d+)?', text)]
+    if len(values) != 8:
+        raise ValueError(f"Expected 8 corner coordinates, got {len(values)}: '{text}'")
+    return [(values[i], values[i + 1]) for i in range(0, 8, 2)]
+
+
+def corners_path(video_path: str) -> str:
+    """Sidecar corner file for a video"""
+    return os.path.splitext(video_path)[0] + CORNERS_EXT
+
+
+def save_corners(filepath: str, corners):
+    """Write corners to a sidecar file"""
+    with open(filepath, 'w') as f:
+        json.dump({'corners': [[float(x), float(y)] for x, y in corners]}, f, indent=2)
+
+
+def load_corners(filepath: str) -> List[Tuple[float, float]]:
+    """Corners from a sidecar file.
+
+    Accepts a JSON list of four [x, y] pairs, a JSON object with 'corners'
+    or 'initial_corners' (so tracking data files work too), or text with
+    eight numbers.
+    """
+    with open(filepath, 'r') as f:
+        text = f.read()
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return parse_corners(text)
+
+    if isinstance(data, dict):
+        data = data.get('corners', data.get('initial_corners'))
+    if data is None or len(data) != 4:
+        raise ValueError(f"{filepath} does not contain four corners")
+    return [(float(x), float(y)) for x, y in data]
+
+
+def _quad_candidates(gray: np.ndarray):
+    """Contours from edges and from Otsu thresholds of both polarities"""
+    edges = cv2.Canny(gray, 50, 150)
+    edges = cv2.dilate(edges, None)
+    yield edges
+
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    yield binary
+    yield cv2.bitwise_not(binary)
+
+
+def detect_marquee_quad(frame: np.ndarray,
+                        min_area_ratio: float = 0.01,
+                        max_area_ratio: float = 0.95,
+                        approx_epsilon: float = 0.02,
+                        refine_window: int = 5) -> Optional[np.ndarray]:
+    """Find the marquee as the largest convex quadrilateral in the frame.
+
+    Candidate contours are simplified with approxPolyDP and the vertices of
+    the best 4-gon are refined to sub-pixel accuracy with cornerSubPix.
+    Returns (4, 2) float32 corners clockwise from top-left, or None.
+    """
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    frame_area = gray.shape[0] * gray.shape[1]
+
+    best, best_area = None, 0.0
+    for binary in _quad_candidates(blurred):
+        contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if not (min_area_ratio * frame_area <= area <= max_area_ratio * frame_area):
+                continue
+            if area <= best_area:
+                continue
+
+            perimeter = cv2.arcLength(contour, True)
+            quad = cv2.approxPolyDP(contour, approx_epsilon * perimeter, True)
+            if len(quad) != 4 or not quad_is_convex(quad.reshape(1, 4, 2))[0]:
+                continue
+            best, best_area = quad.reshape(4, 2).astype(np.float32), area
+
+    if best is None:
+        return None
+
+    if refine_window:
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 40, 0.01)
+        refined = best.reshape(-1, 1, 2).copy()
+        cv2.cornerSubPix(gray, refined, (refine_window, refine_window), (-1, -1), criteria)
+        # Keep the refinement only where it stayed near the polygon vertex
+        refined = refined.reshape(4, 2)
+        moved = np.linalg.norm(refined - best, axis=1) <= refine_window
+        best = np.where(moved[:, np.newaxis], refined, best)
+
+    return order_corners(best)
+
+
+def resolve_initial_corners(first_frame: np.ndarray,
+                            corners=None,
+                            corners_file: Optional[str] = None,
+                            auto_detect: bool = False) -> Optional[List[Tuple[float, float]]]:
+    """Headless corner initialization.
+
+    Uses, in order: explicit corners, a sidecar corners file, then automatic
+    quad detection when enabled. Returns None if none of them applies.
+    """
+    if corners is not None:
+        if isinstance(corners, str):
+            corners = parse_corners(corners)
+        return [(float(x), float(y)) for x, y in np.asarray(corners, dtype=np.float64).reshape(4, 2)]
+
+    if corners_file and os.path.exists(corners_file):
+        print(f"Loading corners from {corners_file}")
+        return load_corners(corners_file)
+
+    if auto_detect:
+        quad = detect_marquee_quad(first_frame)
+        if quad is None:
+            print("Automatic marquee detection found no quad")
+            return None
+        print(f"Detected marquee corners: {[tuple(map(float, c)) for c in quad]}")
+        return [(float(x), float(y)) for x, y in quad]
+
+    return None
@@ -0,0 +1,145 @@
+# src/corner_refine.py
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+
+REFINE_METHODS = ('template', 'subpix')
+
+
+def _gray_patch(frame: np.ndarray, center, half: int) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+    """Grayscale (2*half+1)^2 patch around center and its top-left, None if it leaves the frame"""
+    x0 = int(round(center[0])) - half
+    y0 = int(round(center[1])) - half
+    size = 2 * half + 1
+    height, width = frame.shape[:2]
+    if x0 < 0 or y0 < 0 or x0 + size > width or y0 + size > height:
+        return None, (x0, y0)
+    patch = frame[y0:y0 + size, x0:x0 + size]
+    if patch.ndim == 3:
+        patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    return patch, (x0, y0)
+
+
+def _subpixel_peak(scores: np.ndarray, x: int, y: int) -> Tuple[float, float]:
+    """Parabolic sub-pixel offset of the peak at (x, y)"""
+    def offset(left, center, right):
+        denominator = left - 2 * center + right
+        if denominator >= 0:
+            return 0.0
+        return float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5))
+
+    height, width = scores.shape
+    dx = offset(scores[y, x - 1], scores[y, x], scores[y, x + 1]) if 0 < x < width - 1 else 0.0
+    dy = offset(scores[y - 1, x], scores[y, x], scores[y + 1, x]) if 0 < y < height - 1 else 0.0
+    return dx, dy
+
+
+class CornerRefiner:
+    """Full-resolution local refinement of approximate corners.
+
+    Used with proxy tracking: the tracker finds the corners on a downscaled
+    frame and each corner is then refined in a small full-resolution patch
+    around the estimate. 'template' matches a patch cut around the corner
+    on the first frame (normalized cross-correlation with a sub-pixel peak);
+    it cannot drift, and tolerates the rotation and zoom of a typical shot.
+    'subpix' runs cornerSubPix, which snaps to the nearest image corner and
+    needs a marquee with a crisp corner. Only the patches are converted to
+    grayscale, so the cost does not grow with the frame size.
+    """
+
+    def __init__(self,
+                 method: str = 'template',
+                 search_radius: int = 8,
+                 template_radius: int = 12,
+                 min_score: float = 0.6):
+        if method not in REFINE_METHODS:
+            raise ValueError(f"Unknown refine method '{method}', expected one of {REFINE_METHODS}")
+        self.method = method
+        self.search_radius = search_radius
+        self.template_radius = template_radius
+        self.min_score = min_score
+        self.templates = []
+
+    def init(self, frame: np.ndarray, corners):
+        """Cut the reference templates around the initial corners"""
+        self.templates = []
+        if self.method != 'template':
+            return
+        for corner in corners:
+            self.templates.append(self._cut_template(frame, corner))
+
+    def _cut_template(self, frame: np.ndarray, corner):
+        patch, _ = _gray_patch(frame, corner, self.template_radius)
+        if patch is None:
+            return None
+        # Keep the sub-pixel position of the corner inside the template
+        offset = (float(corner[0]) - round(float(corner[0])),
+                  float(corner[1]) - round(float(corner[1])))
+        return patch.copy(), offset
+
+    def update_template(self, frame: np.ndarray, index: int, corner):
+        """Re-cut the template of corner index at a trusted position"""
+        template = self._cut_template(frame, corner)
+        if template is not None:
+            self.templates[index] = template
+
+    def refine(self, frame: np.ndarray, corners: np.ndarray) -> np.ndarray:
+        """Refined (4, 2) corners; a corner that cannot be refined keeps its estimate"""
+        refined = np.asarray(corners, dtype=np.float32).reshape(4, 2).copy()
+        for i, corner in enumerate(refined):
+            # Lost corners (NaN) are left to the caller
+            if not np.isfinite(corner).all():
+                continue
+            if self.method == 'template':
+                result = self.match(frame, i, corner)
+                result = result[:2] if result is not None else None
+            else:
+                result = self._subpix(frame, corner)
+            if result is not None:
+                refined[i] = result
+        return refined
+
+    def match(self,
+              frame: np.ndarray,
+              index: int,
+              corner,
+              search_radius: Optional[int] = None,
+              min_score: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
+        """Template match of corner index around corner: (x, y, score) or None below min_score"""
+        template = self.templates[index] if index < len(self.templates) else None
+        if template is None:
+            return None
+        template, (ox, oy) = template
+
+        radius = self.search_radius if search_radius is None else search_radius
+        patch, (x0, y0) = _gray_patch(frame, corner, self.template_radius + radius)
+        if patch is None:
+            return None
+
+        scores = cv2.matchTemplate(patch, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < (self.min_score if min_score is None else min_score):
+            return None
+
+        dx, dy = _subpixel_peak(scores, bx, by)
+        return (x0 + bx + dx + self.template_radius + ox,
+                y0 + by + dy + self.template_radius + oy,
+                float(best))
+
+    def _subpix(self, frame: np.ndarray, corner) -> Optional[Tuple[float, float]]:
+        half = self.search_radius + 2
+        patch, (x0, y0) = _gray_patch(frame, corner, half)
+        if patch is None:
+            return None
+
+        point = np.array([[[corner[0] - x0, corner[1] - y0]]], dtype=np.float32)
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+        window = max(2, self.search_radius // 2)
+        cv2.cornerSubPix(patch, point, (window, window), (-1, -1), criteria)
+
+        x, y = point.reshape(2)
+        # Reject a snap to some other corner outside the search radius
+        if np.hypot(x + x0 - corner[0], y + y0 - corner[1]) > self.search_radius:
+            return None
+        return float(x + x0), float(y + y0)
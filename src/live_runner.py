@@ -0,0 +1,558 @@
+# src/live_runner.py
+import argparse
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from artwork_source import open_artwork
+from compositor import DynamicCompositor
+from corner_init import corners_path
+from motion_tracker import MarqueeTracker
+from smoothing import OneEuroFilter
+from metrics import metrics
+
+
+# Quality levels of the live loop, cheapest last: track on a half-size
+# proxy, then skip color matching, then fall back to the normal blend
+DEGRADATION_LEVELS = (
+    {'proxy_scale': None, 'match_colors': True, 'cheap_blend': False},
+    {'proxy_scale': 0.5, 'match_colors': True, 'cheap_blend': False},
+    {'proxy_scale': 0.5, 'match_colors': False, 'cheap_blend': False},
+    {'proxy_scale': 0.5, 'match_colors': False, 'cheap_blend': True},
+)
+
+# Live corners come from the tracker's causal filter, so its history only
+# needs the last frame (held when tracking is lost); it is cut back to that
+# whenever it reaches this many frames, so a long session runs in bounded memory
+LIVE_HISTORY_FRAMES = 1024
+
+# Session latency and frame time percentiles cover this many most recent
+# frames (ten minutes at 30 fps), so stats memory does not grow with the session
+LIVE_STATS_FRAMES = 18000
+
+
+def _percentiles(values) -> Dict[str, float]:
+    if not len(values):
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(np.max(values))}
+
+
+class LatestFrameCapture:
+    """Capture thread that keeps only the newest frame.
+
+    read() returns the most recent frame; frames the consumer was too slow
+    for are dropped here instead of queueing, so latency cannot build up.
+    A video file is replayed at its frame rate as a stand-in for a camera
+    (loop restarts it). Frames are stamped with their capture time in
+    perf_counter seconds: when the device or stream delivered them, or
+    when a replayed frame was due.
+    """
+
+    def __init__(self, source, replay: Optional[bool] = None, loop: bool = False, fps: Optional[float] = None):
+        self.source = source
+        self.replay = os.path.isfile(str(source)) if replay is None else replay
+        self.loop = loop
+
+        self._cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        if not self._cap.isOpened():
+            raise IOError(f"Cannot open video source {source}")
+        if not self.replay:
+            # Keep the driver from buffering frames behind our back
+            self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.fps = fps or self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_size = (int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        self.captured = 0
+        self.dropped = 0
+        self._frame = None
+        self._index = -1
+        self._timestamp = 0.0
+        self._consumed = -1
+        self._running = True
+        self._ended = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='live-capture', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start = time.perf_counter()
+        replayed = 0
+        while self._running:
+            with metrics.stage('live.decode'):
+                ret, frame = self._cap.read()
+            if not ret:
+                if self.replay and self.loop and replayed:
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                break
+
+            if self.replay:
+                # Deliver at the file's frame rate, like a camera would
+                timestamp = start + replayed / self.fps
+                delay = timestamp - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                replayed += 1
+            else:
+                timestamp = time.perf_counter()
+
+            with self._cond:
+                if self._index > self._consumed:
+                    self.dropped += 1
+                    metrics.count('live.dropped')
+                self._frame = frame
+                self._index = self.captured
+                self._timestamp = timestamp
+                self.captured += 1
+                self._cond.notify_all()
+
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+    def read(self, timeout: float = 2.0) -> Optional[Tuple[np.ndarray, int, float]]:
+        """Newest unread frame as (frame, capture index, capture time).
+
+        None once the source has ended or stalled for timeout seconds.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._index > self._consumed or self._ended, timeout)
+            if self._index <= self._consumed:
+                return None
+            self._consumed = self._index
+            return self._frame, self._index, self._timestamp
+
+    def release(self):
+        self._running = False
+        self._thread.join()
+        self._cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class PreviewSink:
+    """Where composed live frames go; show() returns False to stop the session"""
+
+    name = 'base'
+
+    def show(self, frame: np.ndarray) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WindowSink(PreviewSink):
+    """OpenCV preview window; q or Esc stops"""
+
+    name = 'window'
+
+    def __init__(self, title: str = 'Prisma Live'):
+        self.title = title
+        cv2.namedWindow(title, cv2.WINDOW_NORMAL)
+
+    def show(self, frame: np.ndarray) -> bool:
+        cv2.imshow(self.title, frame)
+        return cv2.waitKey(1) & 0xFF not in (ord('q'), 27)
+
+    def close(self):
+        cv2.destroyWindow(self.title)
+
+
+class NullSink(PreviewSink):
+    """Discards frames (headless runs and latency measurements)"""
+
+    name = 'null'
+
+    def show(self, frame: np.ndarray) -> bool:
+        return True
+
+
+class VideoSink(PreviewSink):
+    """Records the preview to a video file.
+
+    Encoding runs on its own thread behind a short queue, so a slow encoder
+    costs recorded frames (counted as live.record_dropped) rather than
+    latency.
+    """
+
+    name = 'video'
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int], fourcc: str = 'mp4v', max_queue: int = 4):
+        self.path = path
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise IOError(f"Cannot open video writer for {path}")
+        self.recorded = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='live-record', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            with metrics.stage('live.record'):
+                self.writer.write(frame)
+            self.recorded += 1
+
+    def show(self, frame: np.ndarray) -> bool:
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+            metrics.count('live.record_dropped')
+        return True
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.release()
+
+
+def open_sink(spec: str, fps: float, size: Tuple[int, int]) -> PreviewSink:
+    """Preview sink: 'window', 'null', or a video file path to record to"""
+    if spec == WindowSink.name:
+        return WindowSink()
+    if spec == NullSink.name:
+        return NullSink()
+    return VideoSink(spec, fps, size)
+
+
+class LatencyGovernor:
+    """Quality level from recent per-frame processing times.
+
+    The processing time is smoothed with an EMA. `patience` consecutive
+    frames over the budget step one level down (cheaper); `recover_wait`
+    frames under recover_ratio * budget step back up. Stepping down soon
+    after stepping up doubles the wait, so the level settles instead of
+    oscillating around the budget.
+    """
+
+    def __init__(self,
+                 budget_ms: float,
+                 levels: int = len(DEGRADATION_LEVELS),
+                 smoothing: float = 0.2,
+                 patience: int = 3,
+                 recover_ratio: float = 0.7,
+                 recover_wait: int = 30,
+                 max_recover_wait: int = 960):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.smoothing = smoothing
+        self.patience = patience
+        self.recover_ratio = recover_ratio
+        self.recover_wait = recover_wait
+        self.max_recover_wait = max_recover_wait
+        self.level = 0
+        self.changes = 0
+        self._wait = recover_wait
+        self._since_up = None
+        self._reset_window()
+
+    def _reset_window(self):
+        # A new level starts a fresh average: the old times no longer apply
+        self.frame_ms = None
+        self._over = 0
+        self._under = 0
+
+    def update(self, frame_ms: float) -> int:
+        """Record one frame's processing time; returns the level for the next frame"""
+        if self.frame_ms is None:
+            self.frame_ms = frame_ms
+        else:
+            self.frame_ms += self.smoothing * (frame_ms - self.frame_ms)
+        if self._since_up is not None:
+            self._since_up += 1
+
+        self._over = self._over + 1 if self.frame_ms > self.budget_ms else 0
+        self._under = self._under + 1 if self.frame_ms < self.recover_ratio * self.budget_ms else 0
+
+        if self._over >= self.patience and self.level < self.levels - 1:
+            if self._since_up is not None and self._since_up < 2 * self._wait:
+                self._wait = min(2 * self._wait, self.max_recover_wait)
+            self._since_up = None
+            self._step(1)
+        elif self._under >= self._wait and self.level > 0:
+            self._since_up = 0
+            self._step(-1)
+        return self.level
+
+    def _step(self, direction: int):
+        self.level += direction
+        self.changes += 1
+        metrics.count('live.level_changes')
+        self._reset_window()
+
+
+def draw_live_hud(frame: np.ndarray, fps: float, latency_ms: float, level: int, tracked: bool) -> np.ndarray:
+    """Frame rate, glass-to-glass latency and quality level onto the preview"""
+    color = (0, 255, 0) if tracked else (0, 0, 255)
+    text = f"{fps:5.1f} fps  {latency_ms:5.1f} ms  Q{level}" + ("" if tracked else "  LOST")
+    cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    return frame
+
+
+class LiveSession:
+    """Real-time track-and-compose loop on a live source.
+
+    Each iteration takes the newest captured frame, tracks it (corners
+    through the tracker's causal filter, timed by capture time), composes
+    the artwork into it in place and hands it to the preview sink. Artwork
+    frames follow wall time, so dropped frames do not slow the artwork
+    down. Processing time is held to budget_ms (default one source frame
+    interval) by the LatencyGovernor's DEGRADATION_LEVELS.
+
+    Glass-to-glass latency is measured from capture time to the moment the
+    sink returns; display scan-out (and camera exposure and transfer before
+    the frame reaches OpenCV) is not included.
+    """
+
+    def __init__(self,
+                 capture: LatestFrameCapture,
+                 tracker: MarqueeTracker,
+                 compositor: DynamicCompositor,
+                 artwork,
+                 sink: PreviewSink,
+                 blend_mode: str = 'normal',
+                 budget_ms: Optional[float] = None,
+                 adaptive: bool = True,
+                 artwork_fps: Optional[float] = None,
+                 hud: bool = True):
+        self.capture = capture
+        self.tracker = tracker
+        self.compositor = compositor
+        self.artwork = artwork
+        self.sink = sink
+        self.blend_mode = blend_mode
+        self.budget_ms = budget_ms or 1000.0 / capture.fps
+        self.governor = LatencyGovernor(self.budget_ms) if adaptive else None
+        self.artwork_fps = artwork_fps or capture.fps
+        self.hud = hud
+        self.base_proxy_scale = tracker.proxy_scale
+        self._start_time = None
+
+    def start(self,
+              corners=None,
+              corners_file: Optional[str] = None,
+              auto_detect: bool = False,
+              interactive: bool = True) -> bool:
+        """Pick the initial corners on the newest frame and start tracking"""
+        item = self.capture.read()
+        if item is None:
+            print("Error: No frame from the live source")
+            return False
+        frame, _, timestamp = item
+
+        corners = self.tracker.setup_tracking(frame, corners=corners, corners_file=corners_file,
+                                              auto_detect=auto_detect, interactive=interactive)
+        if not corners:
+            print("Corner selection cancelled")
+            return False
+        self.tracker.debug_mode = False
+        self.tracker.initialize_trackers(frame, corners)
+        self.compositor.reset_color_state()
+        self._start_time = timestamp
+        return True
+
+    def _apply_level(self, frame: np.ndarray, level: int):
+        settings = DEGRADATION_LEVELS[level]
+        proxy_scale = self.base_proxy_scale
+        if settings['proxy_scale'] is not None:
+            proxy_scale = min(proxy_scale or 1.0, settings['proxy_scale'])
+        if proxy_scale != self.tracker.proxy_scale:
+            self.tracker.set_proxy_scale(frame, proxy_scale)
+        return settings
+
+    def process(self, frame: np.ndarray, timestamp: float, level: int = 0) -> Optional[List[Tuple[float, float]]]:
+        """Track and compose one frame in place; returns its corners (None if lost)
+
+        A new level's tracking resolution applies from the next frame: the
+        tracker restarts on this frame, whose corners it has just found.
+        """
+        with metrics.stage('live.track'):
+            corners = self.tracker.track_frame(frame, timestamp=timestamp)
+            settings = self._apply_level(frame, level)
+            if len(self.tracker.tracking_history) >= LIVE_HISTORY_FRAMES:
+                self.tracker.tracking_history.keep_last(1)
+        if corners is None:
+            return None
+
+        with metrics.stage('live.compose'):
+            homographies, valid = self.compositor.batch_homographies(
+                self.artwork.corners, np.asarray(corners, dtype=np.float32)[np.newaxis])
+            if not valid[0]:
+                return None
+            art_index = int((timestamp - self._start_time) * self.artwork_fps)
+            blend_mode = 'normal' if settings['cheap_blend'] else self.blend_mode
+            self.compositor.compose_frame(
+                frame, self.artwork.get(art_index), homographies[0], corners,
+                blend_mode=blend_mode, match_colors=settings['match_colors'],
+                out=frame, art_key=self.artwork.frame_key(art_index)
+            )
+        return corners
+
+    def run(self, max_frames: Optional[int] = None, duration: Optional[float] = None) -> dict:
+        """Run until the source ends, the sink stops, max_frames or duration; returns stats
+
+        Latency and frame time percentiles cover the last LIVE_STATS_FRAMES
+        frames; counts cover the whole session.
+        """
+        if self._start_time is None:
+            raise RuntimeError("LiveSession.run() needs a successful start() first")
+        latencies = collections.deque(maxlen=LIVE_STATS_FRAMES)
+        frame_times = collections.deque(maxlen=LIVE_STATS_FRAMES)
+        presented = 0
+        level_frames = [0] * len(DEGRADATION_LEVELS)
+        lost = over_budget = 0
+        level = 0
+        shown_fps = 0.0
+        start = time.perf_counter()
+        last_present = None
+
+        while max_frames is None or presented < max_frames:
+            if duration is not None and time.perf_counter() - start >= duration:
+                break
+            item = self.capture.read()
+            if item is None:
+                break
+            frame, _, timestamp = item
+            frame_start = time.perf_counter()
+
+            corners = self.process(frame, timestamp, level)
+            if corners is None:
+                lost += 1
+            if self.hud:
+                latency = (time.perf_counter() - timestamp) * 1e3
+                draw_live_hud(frame, shown_fps, latency, level, corners is not None)
+            with metrics.stage('live.present'):
+                keep = self.sink.show(frame)
+            present = time.perf_counter()
+
+            frame_ms = (present - frame_start) * 1e3
+            latency = (present - timestamp) * 1e3
+            latencies.append(latency)
+            frame_times.append(frame_ms)
+            presented += 1
+            level_frames[level] += 1
+            over_budget += frame_ms > self.budget_ms
+            metrics.gauge('live.glass_to_glass_ms', latency)
+            metrics.gauge('live.level', level)
+            metrics.count('frames.presented')
+
+            if last_present is not None:
+                rate = 1.0 / max(present - last_present, 1e-6)
+                shown_fps = rate if not shown_fps else 0.9 * shown_fps + 0.1 * rate
+            last_present = present
+
+            if self.governor is not None:
+                level = self.governor.update(frame_ms)
+            if not keep:
+                break
+
+        elapsed = time.perf_counter() - start
+        return {
+            'frames': presented,
+            'captured': self.capture.captured,
+            'dropped': self.capture.dropped,
+            'elapsed_s': elapsed,
+            'fps': presented / elapsed if elapsed > 0 else 0.0,
+            'source_fps': self.capture.fps,
+            'budget_ms': self.budget_ms,
+            'over_budget': int(over_budget),
+            'lost': lost,
+            'glass_to_glass_ms': _percentiles(latencies),
+            'frame_ms': _percentiles(frame_times),
+            'level_frames': level_frames,
+            'level_changes': self.governor.changes if self.governor is not None else 0,
+        }
+
+
+def stats_table(stats: dict) -> str:
+    """Human-readable live session stats"""
+    g2g = stats['glass_to_glass_ms']
+    work = stats['frame_ms']
+    levels = ", ".join(f"Q{i} {n}" for i, n in enumerate(stats['level_frames']) if n)
+    return "\n".join([
+        f"presented {stats['frames']} of {stats['captured']} captured frames "
+        f"({stats['dropped']} dropped), {stats['fps']:.1f} fps (source {stats['source_fps']:.1f})",
+        f"glass-to-glass ms  p50 {g2g['p50']:.1f}  p95 {g2g['p95']:.1f}  p99 {g2g['p99']:.1f}  max {g2g['max']:.1f}",
+        f"frame ms           p50 {work['p50']:.1f}  p95 {work['p95']:.1f}  p99 {work['p99']:.1f}  "
+        f"(budget {stats['budget_ms']:.1f}, over {stats['over_budget']})",
+        f"quality levels     {levels} ({stats['level_changes']} changes), {stats['lost']} frames without tracking",
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live in-situ preview from a camera, stream or replayed file")
+    parser.add_argument('source', help="capture device index, stream URL, or a video file replayed in real time")
+    parser.add_argument('artwork_video')
+    parser.add_argument('--corners', help="initial marquee corners, 'x1,y1 x2,y2 x3,y3 x4,y4'")
+    parser.add_argument('--corners-file', help="sidecar corners file (default <source>.corners.json for files)")
+    parser.add_argument('--auto-corners', action='store_true', help="detect the marquee quad on the first frame")
+    parser.add_argument('--no-interactive', action='store_true', help="never open the selection window")
+    parser.add_argument('--backend', default='lk', help="tracker backend (lk, csrt); csrt is rarely real-time")
+    parser.add_argument('--proxy-scale', type=float, help="always track on frames downscaled by this factor")
+    parser.add_argument('--blend-mode', default='normal')
+    parser.add_argument('--mask', default='gaussian', choices=['gaussian', 'sdf'], help="marquee mask feathering")
+    parser.add_argument('--sink', default='window', help="'window', 'null', or a video file to record the preview to")
+    parser.add_argument('--budget-ms', type=float, help="per-frame processing budget (default one source frame)")
+    parser.add_argument('--no-adaptive', action='store_true', help="never degrade quality to hold the budget")
+    parser.add_argument('--min-cutoff', type=float, default=1.0, help="One-Euro filter cutoff at rest (Hz)")
+    parser.add_argument('--beta', type=float, default=0.05, help="One-Euro filter speed coefficient")
+    parser.add_argument('--loop', action='store_true', help="loop a replayed file")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--max-frames', type=int)
+    parser.add_argument('--no-hud', action='store_true', help="no fps / latency overlay")
+    parser.add_argument('--profile', help="export per-stage metrics (JSON, or a Chrome trace if *.trace.json)")
+    parser.add_argument('--stats', help="write the session stats to this JSON file")
+    args = parser.parse_args()
+
+    if args.profile:
+        metrics.enable(trace=args.profile.endswith('.trace.json'))
+
+    capture = LatestFrameCapture(args.source, loop=args.loop)
+    corners_file = args.corners_file
+    if corners_file is None and capture.replay:
+        corners_file = corners_path(args.source)
+
+    tracker = MarqueeTracker(debug_mode=False, backend=args.backend, proxy_scale=args.proxy_scale,
+                             causal_filter=OneEuroFilter(capture.fps, args.min_cutoff, args.beta))
+    compositor = DynamicCompositor(debug_mode=False, mask_mode=args.mask,
+                                   color_smoothing=0.2, color_update_interval=5)
+    # Artwork is decoded up front, so the loop never waits on a decoder
+    artwork = open_artwork(args.artwork_video, 'memory')
+    sink = open_sink(args.sink, capture.fps, capture.frame_size)
+    try:
+        session = LiveSession(capture, tracker, compositor, artwork, sink, blend_mode=args.blend_mode,
+                              budget_ms=args.budget_ms, adaptive=not args.no_adaptive, hud=not args.no_hud)
+        if session.start(args.corners, corners_file, args.auto_corners, interactive=not args.no_interactive):
+            stats = session.run(args.max_frames, args.duration)
+            print("=== LIVE SESSION ===")
+            print(stats_table(stats))
+            if args.stats:
+                with open(args.stats, 'w') as f:
+                    json.dump(stats, f, indent=2)
+                print(f"Stats saved to {args.stats}")
+    finally:
+        capture.release()
+        sink.close()
+        artwork.close()
+
+    if args.profile:
+        print(metrics.summary_table())
+        metrics.export(args.profile)
@@ -0,0 +1,264 @@
+# src/metrics.py
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class _NullStage:
+    """Shared no-op context returned while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'start', 'mem_start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        if self.metrics.track_allocations:
+            self.metrics._check_allocation_thread()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        allocated = 0
+        if self.metrics.track_allocations:
+            allocated = max(tracemalloc.get_traced_memory()[0] - self.mem_start, 0)
+        self.metrics._record(self.name, self.start, end, allocated)
+        return False
+
+
+class Metrics:
+    """Per-stage wall time, throughput, queue depth and allocation metrics.
+
+    Code is instrumented with `with metrics.stage('name'):` blocks, the
+    @timed decorator, gauge() samples and count() counters. While disabled
+    every call returns immediately, so instrumentation can stay in hot loops.
+    track_allocations uses tracemalloc (which is itself slow) to record the
+    net bytes each stage leaves allocated, numpy buffers included. tracemalloc
+    counts the whole process, so allocation tracking is single-threaded: a
+    stage entered on any thread but the one that enabled it raises
+    RuntimeError. Nested stages include the bytes of the stages they contain.
+    """
+
+    def __init__(self, enabled: bool = False, trace: bool = True, track_allocations: bool = False):
+        self.enabled = enabled
+        self.trace = trace
+        self.track_allocations = track_allocations
+        self._allocation_thread = threading.get_ident()
+        self.reset()
+
+    def reset(self):
+        self._durations: Dict[str, List[int]] = {}
+        self._allocated: Dict[str, int] = {}
+        self._gauges: Dict[str, List[float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._events: List[tuple] = []
+        self._gauge_events: List[tuple] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._first = None
+        self._last = None
+
+    def enable(self, trace: Optional[bool] = None, track_allocations: Optional[bool] = None):
+        if trace is not None:
+            self.trace = trace
+        if track_allocations is not None:
+            self.track_allocations = track_allocations
+        if self.track_allocations:
+            self._allocation_thread = threading.get_ident()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.track_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stage(self, name: str):
+        """Context manager timing one occurrence of a stage"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def _check_allocation_thread(self):
+        if threading.get_ident() != self._allocation_thread:
+            raise RuntimeError("Allocation tracking measures the whole process; stages must run "
+                               "on the thread that enabled it")
+
+    def _record(self, name: str, start: int, end: int, allocated: int):
+        durations = self._durations.get(name)
+        if durations is None:
+            with self._lock:
+                durations = self._durations.setdefault(name, [])
+                self._allocated.setdefault(name, 0)
+        durations.append(end - start)
+        if allocated:
+            with self._lock:
+                self._allocated[name] += allocated
+        if self.trace:
+            self._events.append((name, start, end - start, threading.get_ident()))
+        if self._first is None:
+            self._first = start
+        self._last = end
+
+    def gauge(self, name: str, value: float):
+        """Sample an instantaneous value (e.g. a queue depth)"""
+        if not self.enabled:
+            return
+        samples = self._gauges.get(name)
+        if samples is None:
+            with self._lock:
+                samples = self._gauges.setdefault(name, [])
+        samples.append(value)
+        if self.trace:
+            self._gauge_events.append((name, time.perf_counter_ns(), value))
+
+    def count(self, name: str, value: int = 1):
+        """Add to a counter (e.g. frames written)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds between the first and last recorded stage"""
+        if self._first is None:
+            return 0.0
+        return (self._last - self._first) / 1e9
+
+    def summary(self) -> dict:
+        """Aggregated metrics as plain data"""
+        elapsed = self.elapsed
+        stages = {}
+        for name, durations in sorted(self._durations.items()):
+            ms = np.asarray(durations, dtype=np.float64) / 1e6
+            total = float(ms.sum())
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stages[name] = {
+                'count': len(ms),
+                'total_ms': total,
+                'mean_ms': total / len(ms),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(ms.max()),
+                # Calls per second of time spent in the stage
+                'fps': len(ms) / (total / 1e3) if total > 0 else 0.0,
+                'allocated_bytes': self._allocated.get(name, 0),
+            }
+
+        gauges = {
+            name: {
+                'samples': len(values),
+                'mean': float(np.mean(values)),
+                'max': float(np.max(values)),
+            }
+            for name, values in sorted(self._gauges.items()) if values
+        }
+
+        counters = dict(sorted(self._counters.items()))
+        rates = {f"{name}_per_s": value / elapsed for name, value in counters.items() if elapsed > 0}
+
+        return {
+            'elapsed_s': elapsed,
+            'stages': stages,
+            'gauges': gauges,
+            'counters': counters,
+            'rates': rates,
+        }
+
+    def summary_table(self) -> str:
+        """Human-readable summary, one row per stage"""
+        summary = self.summary()
+        lines = [f"{'stage':<28} {'count':>7} {'total s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                 f"{'p99 ms':>8} {'fps':>9} {'alloc MB':>9}"]
+        for name, s in summary['stages'].items():
+            lines.append(f"{name:<28} {s['count']:>7} {s['total_ms'] / 1e3:>9.3f} {s['p50_ms']:>8.2f} "
+                         f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['fps']:>9.1f} "
+                         f"{s['allocated_bytes'] / 1e6:>9.2f}")
+        for name, g in summary['gauges'].items():
+            lines.append(f"{name:<28} mean {g['mean']:.1f}, max {g['max']:.0f} ({g['samples']} samples)")
+        for name, value in summary['counters'].items():
+            rate = summary['rates'].get(f"{name}_per_s")
+            rate_text = f" ({rate:.1f}/s)" if rate is not None else ""
+            lines.append(f"{name:<28} {value}{rate_text}")
+        lines.append(f"elapsed {summary['elapsed_s']:.3f} s")
+        return "\n".join(lines)
+
+    def save_json(self, filepath: str):
+        with open(filepath, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def save_chrome_trace(self, filepath: str):
+        """Write recorded stages as a Chrome trace (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        events = [
+            {
+                'name': name,
+                'cat': name.split('.', 1)[0],
+                'ph': 'X',
+                'ts': (start - self._origin) / 1e3,
+                'dur': duration / 1e3,
+                'pid': pid,
+                'tid': tid,
+            }
+            for name, start, duration, tid in self._events
+        ]
+        events += [
+            {
+                'name': name,
+                'ph': 'C',
+                'ts': (timestamp - self._origin) / 1e3,
+                'pid': pid,
+                'args': {'value': value},
+            }
+            for name, timestamp, value in self._gauge_events
+        ]
+        with open(filepath, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def export(self, filepath: str):
+        """Chrome trace when the name ends in .trace.json, summary JSON otherwise"""
+        if filepath.endswith('.trace.json'):
+            self.save_chrome_trace(filepath)
+        else:
+            self.save_json(filepath)
+
+
+# Process-wide metrics, disabled by default
+metrics = Metrics()
+
+
+def timed(name: str):
+    """Decorator recording each call as a stage of the global metrics"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with _Stage(metrics, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
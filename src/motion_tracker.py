@@ -1,16 +1,75 @@
 # src/motion_tracker.py
 import cv2
 import numpy as np
-import json
 from typing import List, Tuple, Optional
 
+from smoothing import CornerHistory, moving_average
+from tracking_io import save_tracking
+from tracker_backends import TrackerBackend, create_backend
+from corner_init import resolve_initial_corners
+from corner_refine import CornerRefiner
+from tracking_recovery import TrackingRecovery, TRACKED, REACQUIRED
+from metrics import metrics, timed
+
 
 class MarqueeTracker:
-    def __init__(self, debug_mode=True):
+    def __init__(self, 
+                 debug_mode=True, 
+                 backend='csrt', 
+                 causal_filter=None, 
+                 proxy_scale=None, 
+                 refine='template', 
+                 refine_radius=None, 
+                 recovery=True):
         self.debug_mode = debug_mode
-        self.corner_trackers = []
-        self.tracking_history = []
+        self.backend_type = backend
+        self.backend: Optional[TrackerBackend] = None
+        self.tracking_history = CornerHistory()
+        
+        # Optional O(1)-per-frame smoother for live use (e.g. OneEuroFilter)
+        self.causal_filter = causal_filter
         self.initial_corners = None
+        self._start_corners = None
+        
+        # Proxy tracking: the backend runs on frames downscaled by
+        # proxy_scale (e.g. 0.25) and each corner is refined at full
+        # resolution ('template', 'subpix' or None). The search radius
+        # defaults to two proxy pixels.
+        self.proxy_scale = proxy_scale if proxy_scale and proxy_scale < 1 else None
+        self.refine = refine
+        self.refine_radius = refine_radius
+        self.refiner = self._make_refiner()
+        self._proxy_factors = None
+        
+        # Loss recovery (True for the default TrackingRecovery, or an
+        # instance): lost corners are predicted and re-acquired instead of
+        # ending the track. Every frame gets a history entry with its
+        # validity and confidence, so the history stays frame-aligned.
+        if recovery is True:
+            recovery = TrackingRecovery()
+        self.recovery = recovery or None
+        
+    def setup_tracking(self, 
+                       first_frame: np.ndarray, 
+                       corners=None, 
+                       corners_file: Optional[str] = None, 
+                       auto_detect: bool = False, 
+                       interactive: bool = True) -> Optional[List[Tuple[float, float]]]:
+        """Initial marquee corners without a display when possible
+        
+        Tries explicit corners, a sidecar corners file and automatic quad
+        detection (see corner_init.resolve_initial_corners), then falls back
+        to manual selection if interactive.
+        """
+        found = resolve_initial_corners(first_frame, corners, corners_file, auto_detect)
+        if found is not None:
+            self.initial_corners = found
+            return found
+        
+        if not interactive:
+            print("No initial corners available and interactive selection is disabled")
+            return None
+        return self.setup_manual_tracking(first_frame)
         
     def setup_manual_tracking(self, first_frame: np.ndarray) -> List[Tuple[int, int]]:
         """Setup manual corner selection for marquee"""
@@ -48,7 +107,8 @@ class MarqueeTracker:
             
             cv2.imshow('Marquee Selection', display_frame)
             
-            key = cv2.waitKey(1) & 0xFF
+            # Wait for input instead of spinning at full speed
+            key = cv2.waitKey(30) & 0xFF
             if key == ord('r'):  # Reset
                 self.corners = []
                 print("Reset corners")
@@ -64,96 +124,156 @@ class MarqueeTracker:
         return self.corners
     
     def initialize_trackers(self, frame: np.ndarray, corners: List[Tuple[int, int]]):
-        """Initialize individual corner trackers"""
-        self.corner_trackers = []
-        
-        for corner in corners:
-            # Create bounding box around corner
-            x, y = corner
-            bbox = (x-15, y-15, 30, 30)
-            
-            # Initialize tracker
-            tracker = cv2.TrackerCSRT_create()
-            success = tracker.init(frame, bbox)
-            
-            if success:
-                self.corner_trackers.append(tracker)
-            else:
-                print(f"Failed to initialize tracker for corner {corner}")
-                
-        print(f"Initialized {len(self.corner_trackers)} corner trackers")
+        """Initialize the corner tracking backend"""
+        # The tracker draws its own markers (see track_frame): backend
+        # drawing would land on the proxy or in the recovery templates
+        self._start_backend(frame, corners)
+        if self.recovery is not None:
+            self.recovery.init(frame, corners)
+        self._start_corners = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+        if self.causal_filter is not None:
+            self.causal_filter.reset()
     
-    def track_frame(self, frame: np.ndarray) -> Optional[List[Tuple[int, int]]]:
-        """Track corners in current frame"""
-        if not self.corner_trackers:
+    def _make_refiner(self) -> Optional[CornerRefiner]:
+        if not (self.proxy_scale and self.refine):
             return None
-            
-        current_corners = []
-        valid_trackers = []
+        radius = self.refine_radius
+        if radius is None:
+            radius = max(4, int(np.ceil(2 / self.proxy_scale)))
+        return CornerRefiner(self.refine, search_radius=radius)
+    
+    def _start_backend(self, frame: np.ndarray, corners):
+        self.backend = create_backend(self.backend_type, debug_mode=False)
+        if self.proxy_scale is None:
+            self.backend.init(frame, corners)
+        else:
+            proxy = self._proxy_frame(frame)
+            self.backend.init(proxy, [tuple(c) for c in self._to_proxy(corners)])
+            if self.refiner is not None:
+                self.refiner.init(frame, corners)
+    
+    def set_proxy_scale(self, frame: np.ndarray, proxy_scale: Optional[float]):
+        """Switch proxy tracking while tracking (e.g. live degradation)
         
-        for i, tracker in enumerate(self.corner_trackers):
-            success, bbox = tracker.update(frame)
+        The backend restarts on frame, which must be the frame tracked last,
+        from its corners; the recovery templates, causal filter and history
+        carry over.
+        """
+        proxy_scale = proxy_scale if proxy_scale and proxy_scale < 1 else None
+        if proxy_scale == self.proxy_scale:
+            return
+        self.proxy_scale = proxy_scale
+        self.refiner = self._make_refiner()
+        if self.backend is None:
+            return
+        corners = self.tracking_history[-1] if len(self.tracking_history) else self._start_corners
+        self._start_backend(frame, [tuple(c) for c in np.asarray(corners, dtype=np.float64)])
+    
+    def _proxy_frame(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (max(1, int(round(width * self.proxy_scale))), max(1, int(round(height * self.proxy_scale))))
+        self._proxy_factors = np.array([size[0] / width, size[1] / height], dtype=np.float64)
+        with metrics.stage('tracker.proxy'):
+            return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    
+    def _to_proxy(self, corners) -> np.ndarray:
+        # Pixel centers: full-res x maps to (x + 0.5) * s - 0.5
+        corners = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+        return (corners + 0.5) * self._proxy_factors - 0.5
+    
+    def _from_proxy(self, corners) -> np.ndarray:
+        corners = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+        return ((corners + 0.5) / self._proxy_factors - 0.5).astype(np.float32)
+    
+    def _update_backend(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(corners with NaN where lost, found mask, frame the backend tracked on)"""
+        if self.proxy_scale is None:
+            with metrics.stage(f'tracker.{self.backend.name}'):
+                corners, found = self.backend.update_partial(frame)
+            return corners, found, frame
+        
+        # Track on the downscaled frame, then refine at full resolution
+        proxy = self._proxy_frame(frame)
+        with metrics.stage(f'tracker.{self.backend.name}'):
+            corners, found = self.backend.update_partial(proxy)
+        corners = self._from_proxy(corners)
+        if self.refiner is not None and found.any():
+            with metrics.stage('tracker.refine'):
+                corners = self.refiner.refine(frame, corners)
+        return corners, found, proxy
+        
+    def _draw_corners(self, frame: np.ndarray, corners: np.ndarray, status: np.ndarray):
+        # Green: tracked, yellow: re-acquired, red: predicted
+        colors = {TRACKED: (0, 255, 0), REACQUIRED: (0, 255, 255)}
+        for i, (x, y) in enumerate(corners):
+            color = colors.get(int(status[i]), (0, 0, 255))
+            cv2.circle(frame, (int(round(x)), int(round(y))), 6, color, 2)
+            cv2.putText(frame, f'C{i}', (int(x) + 8, int(y)), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    
+    @timed('tracker.track_frame')
+    def track_frame(self, 
+                    frame: np.ndarray, 
+                    timestamp: Optional[float] = None) -> Optional[List[Tuple[float, float]]]:
+        """Track corners in current frame
+        
+        Returns sub-pixel corners, passed through the causal filter when one
+        is configured (the raw corners always go to tracking_history), or
+        None when the frame has no valid corners. Every frame still gets a
+        tracking_history entry: recovered corners, or the last corners held
+        and marked invalid. timestamp (seconds) paces the causal filter, so
+        frames dropped by a live source do not distort it.
+        """
+        if self.backend is None:
+            return None
             
-            if success:
-                # Calculate center of bounding box
-                center_x = bbox[0] + bbox[2] / 2
-                center_y = bbox[1] + bbox[3] / 2
-                current_corners.append((int(center_x), int(center_y)))
-                valid_trackers.append(tracker)
-                
-                if self.debug_mode:
-                    # Draw tracking box
-                    cv2.rectangle(frame, 
-                                (int(bbox[0]), int(bbox[1])), 
-                                (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3])), 
-                                (255, 0, 0), 2)
-                    cv2.putText(frame, f'C{i}', 
-                               (int(center_x), int(center_y)), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            else:
-                print(f"Lost tracking for corner {i}")
-                
-        self.corner_trackers = valid_trackers
+        corners, found, tracked_frame = self._update_backend(frame)
         
-        if len(current_corners) == 4:
-            self.tracking_history.append(current_corners)
-            return current_corners
+        if self.recovery is not None:
+            with metrics.stage('tracker.recover'):
+                corners, status, confidence, valid, reacquired = self.recovery.update(frame, corners, found)
+            if len(reacquired):
+                print(f"Re-acquired corners {reacquired.tolist()}")
+                metrics.count('tracker.reacquired', len(reacquired))
+                restart = corners if self.proxy_scale is None else self._to_proxy(corners)
+                self.backend.reinit_corners(tracked_frame, restart, reacquired)
         else:
+            valid = bool(found.all())
+            confidence = 1.0 if valid else 0.0
+            status = np.where(found, TRACKED, -1)
+            if not valid:
+                corners = self.tracking_history[-1] if len(self.tracking_history) else self._start_corners
+        
+        self.tracking_history.append(corners, valid, confidence)
+        if self.debug_mode:
+            self._draw_corners(frame, corners, status)
+        if not valid:
+            metrics.count('tracker.invalid_frames')
             return None
-    
-    def smooth_tracking(self, history_window=5) -> List[List[Tuple[int, int]]]:
-        """Apply smoothing to tracking history"""
-        if len(self.tracking_history) < history_window:
-            return self.tracking_history
-            
-        smoothed_history = []
         
-        for i in range(len(self.tracking_history)):
-            start_idx = max(0, i - history_window // 2)
-            end_idx = min(len(self.tracking_history), i + history_window // 2 + 1)
-            
-            # Average corners in window
-            smoothed_corners = []
-            for corner_idx in range(4):
-                avg_x = np.mean([self.tracking_history[j][corner_idx][0] 
-                               for j in range(start_idx, end_idx)])
-                avg_y = np.mean([self.tracking_history[j][corner_idx][1] 
-                               for j in range(start_idx, end_idx)])
-                smoothed_corners.append((int(avg_x), int(avg_y)))
-                
-            smoothed_history.append(smoothed_corners)
+        if self.causal_filter is not None:
+            with metrics.stage('tracker.filter'):
+                corners = self.causal_filter(corners, timestamp)
+        return [(float(x), float(y)) for x, y in corners]
+    
+    def smooth_tracking(self, history_window=5) -> np.ndarray:
+        """Apply centered moving-average smoothing to tracking history
             
-        return smoothed_history
+        Only frames with valid tracking are averaged. Returns an (N, 4, 2)
+        float32 array of sub-pixel corners.
+        """
+        return moving_average(self.tracking_history.array, history_window, 
+                              self.tracking_history.valid)
     
     def save_tracking_data(self, filepath: str):
-        """Save tracking data to JSON"""
-        data = {
-            'initial_corners': self.initial_corners,
-            'tracking_history': self.tracking_history,
-            'smoothed_history': self.smooth_tracking()
-        }
-        
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        """Save tracking data (binary .trk or JSON, by extension)"""
+        save_tracking(
+            filepath, 
+            self.smooth_tracking(), 
+            raw=self.tracking_history.array, 
+            valid=self.tracking_history.valid, 
+            confidence=self.tracking_history.confidence, 
+            initial_corners=self.initial_corners
+        )
             
         print(f"Tracking data saved to {filepath}")
@@ -0,0 +1,539 @@
+# src/pipeline.py
+import os
+import queue
+import threading
+import multiprocessing
+import cv2
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+
+from compositor import DynamicCompositor
+from render_cache import RenderCache
+from artwork_source import ArtworkSource, open_artwork, scaled_size
+from motion_tracker import MarqueeTracker
+from smoothing import LookaheadSmoother
+from metrics import metrics
+
+
+# Queue sentinel marking the end of a stream
+_END = object()
+
+# Lossless intermediate codec for chunk segments, so stitching re-encodes
+# exactly the frames a serial render would have encoded
+SEGMENT_FOURCC = 'FFV1'
+SEGMENT_EXT = 'avi'
+
+
+def render_frame(compositor: DynamicCompositor,
+                 frame_index: int,
+                 bg_frame: np.ndarray,
+                 art_frame: np.ndarray,
+                 homography: Optional[np.ndarray],
+                 dst_corners,
+                 blend_mode='normal',
+                 art_key=None) -> np.ndarray:
+    """Compose a single frame with debug overlay"""
+    if homography is not None:
+        # Warp, mask, color match and blend in place into bg_frame
+        result = compositor.compose_frame(
+            bg_frame, art_frame, homography, dst_corners,
+            blend_mode=blend_mode, out=bg_frame, art_key=art_key
+        )
+
+        # Add debug info
+        cv2.putText(result, f"Frame: {frame_index}",
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+    else:
+        result = bg_frame
+        cv2.putText(result, "NO HOMOGRAPHY",
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+    return result
+
+
+def draw_tracking_overlay(frame: np.ndarray, frame_index: int, corners) -> np.ndarray:
+    """Draw tracked corners, marquee outline and frame info onto frame"""
+    if corners is not None:
+        # Draw corners
+        for i, (x, y) in enumerate(corners):
+            corner = (int(x), int(y))
+            cv2.circle(frame, corner, 8, (0, 255, 0), -1)
+            cv2.putText(frame, f'{i+1}',
+                       (corner[0]+10, corner[1]),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Draw marquee outline
+        pts = np.array(corners, dtype=np.int32)
+        cv2.polylines(frame, [pts], True, (255, 0, 0), 3)
+
+        # Draw tracking info
+        cv2.putText(frame, f"Frame: {frame_index}",
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        cv2.putText(frame, f"Corners: {len(corners)}/4",
+                   (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    else:
+        cv2.putText(frame, "TRACKING LOST",
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    return frame
+
+
+class ThreadedCompositionPipeline:
+    """Bounded-queue decode / compose / encode pipeline.
+
+    A reader thread decodes the background and pairs each frame with its
+    artwork frame from an ArtworkSource, a pool of compose workers (one
+    DynamicCompositor each) renders frames, and the calling thread writes
+    results in frame order. Output matches the serial
+    loop in PrismaMotionTest.test_composition frame for frame.
+
+    At most queue_depth + num_workers frames are in flight between decode
+    and encode, including results held back for reordering, so one slow
+    frame stalls the reader instead of piling up composited frames.
+    """
+
+    def __init__(self,
+                 render_fn: Callable[[DynamicCompositor, int, np.ndarray, np.ndarray], np.ndarray],
+                 compositor_factory: Callable[[], DynamicCompositor] = DynamicCompositor,
+                 num_workers: int = 4,
+                 queue_depth: int = 8):
+        self.render_fn = render_fn
+        self.compositor_factory = compositor_factory
+        self.num_workers = max(1, num_workers)
+        self.queue_depth = max(1, queue_depth)
+
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        """Blocking get that returns the end sentinel once the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _acquire(self, slots: threading.Semaphore) -> bool:
+        """Blocking acquire that gives up once the pipeline is stopping"""
+        while not self._stop.is_set():
+            if slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _read_frames(self,
+                     cap: cv2.VideoCapture,
+                     artwork: ArtworkSource,
+                     max_frames: int,
+                     work_q: queue.Queue,
+                     slots: threading.Semaphore):
+        frame_index = 0
+        while frame_index < max_frames and self._acquire(slots):
+            with metrics.stage('io.decode'):
+                ret, bg_frame = cap.read()
+            if not ret:
+                break
+            # Artwork loops by index; no seeking or re-decoding
+            with metrics.stage('io.artwork'):
+                art_frame = artwork.get(frame_index)
+            if not self._put(work_q, (frame_index, bg_frame, art_frame)):
+                return
+            metrics.gauge('queue.work', work_q.qsize())
+            frame_index += 1
+
+        # Background is done: stop the workers
+        for _ in range(self.num_workers):
+            self._put(work_q, _END)
+
+    def _compose(self, work_q: queue.Queue, result_q: queue.Queue):
+        compositor = self.compositor_factory()
+        try:
+            while True:
+                item = self._get(work_q)
+                if item is _END:
+                    break
+                frame_index, bg_frame, art_frame = item
+                with metrics.stage('render.frame'):
+                    result = self.render_fn(compositor, frame_index, bg_frame, art_frame)
+                if not self._put(result_q, (frame_index, result)):
+                    return
+        finally:
+            self._put(result_q, _END)
+
+    def run(self,
+            bg_cap: cv2.VideoCapture,
+            artwork: ArtworkSource,
+            writer: cv2.VideoWriter,
+            max_frames: int,
+            progress_every: Optional[int] = 30) -> int:
+        """Compose up to max_frames frames and write them in order.
+
+        Returns the number of frames written.
+        """
+        self._stop.clear()
+        self._errors = []
+
+        work_q = queue.Queue(maxsize=self.queue_depth)
+        result_q = queue.Queue(maxsize=self.queue_depth)
+        # One slot per frame from decode until it is written
+        slots = threading.Semaphore(self.queue_depth + self.num_workers)
+
+        threads = [
+            threading.Thread(target=self._guard,
+                             args=(self._read_frames, bg_cap, artwork, max_frames, work_q, slots),
+                             name='reader', daemon=True),
+        ]
+        threads += [
+            threading.Thread(target=self._guard, args=(self._compose, work_q, result_q),
+                             name=f'compose-{i}', daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Ordered writer: hold out-of-order results until their turn
+        pending = {}
+        next_index = 0
+        finished_workers = 0
+
+        try:
+            while finished_workers < self.num_workers and not self._stop.is_set():
+                try:
+                    item = result_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _END:
+                    finished_workers += 1
+                    continue
+
+                metrics.gauge('queue.result', result_q.qsize())
+                frame_index, result = item
+                pending[frame_index] = result
+                while next_index in pending:
+                    with metrics.stage('io.encode'):
+                        writer.write(pending.pop(next_index))
+                    slots.release()
+                    metrics.count('frames.composed')
+                    next_index += 1
+                    if progress_every and next_index % progress_every == 0:
+                        print(f"Composed {next_index} frames")
+        finally:
+            # Also on a failed write, so no thread stays blocked on a queue
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        return next_index
+
+
+class SinglePassPipeline:
+    """Track, smooth, compose and encode each background frame in one decode.
+
+    Corners are smoothed with a LookaheadSmoother, so a frame is composed
+    once window // 2 later frames have been tracked and the output matches
+    tracking to a file and composing from it. A window of 1 (or a tracker
+    with a causal_filter) composes every frame as soon as it is tracked.
+    Frames are tracked in place without tracker overlays; the tracking
+    debug video is an optional sink and the only reason to copy a frame.
+    """
+
+    def __init__(self,
+                 tracker: MarqueeTracker,
+                 compositor: DynamicCompositor,
+                 artwork: ArtworkSource,
+                 blend_mode='normal',
+                 smoothing_window: int = 5):
+        self.tracker = tracker
+        self.compositor = compositor
+        self.artwork = artwork
+        self.blend_mode = blend_mode
+        if tracker.causal_filter is not None:
+            smoothing_window = 1
+        self.smoother = LookaheadSmoother(smoothing_window)
+
+    def _compose(self, frame_index: int, bg_frame: np.ndarray, corners) -> np.ndarray:
+        homography = None
+        if corners is not None:
+            homographies, valid = self.compositor.batch_homographies(
+                self.artwork.corners, corners[np.newaxis])
+            if valid[0]:
+                homography = homographies[0]
+        return render_frame(self.compositor, frame_index, bg_frame,
+                            self.artwork.get(frame_index), homography, corners,
+                            self.blend_mode, art_key=self.artwork.frame_key(frame_index))
+
+    def run(self,
+            bg_cap: cv2.VideoCapture,
+            writer: cv2.VideoWriter,
+            first_frame: Optional[np.ndarray] = None,
+            debug_writer: Optional[cv2.VideoWriter] = None,
+            max_frames: Optional[int] = None,
+            progress_every: Optional[int] = 30) -> int:
+        """Process the shot; first_frame is the already decoded frame 0.
+
+        The tracker must already be initialized. Returns the number of
+        frames written.
+        """
+        # Frames are tracked in place, so the tracker must not draw on them
+        self.tracker.debug_mode = False
+        if self.tracker.backend is not None:
+            self.tracker.backend.debug_mode = False
+        self.smoother.reset()
+
+        # Frames waiting for their smoothed corners: [frame, history index or
+        # None without a history entry, smoothed corners, tracking valid]
+        pending = {}
+        next_write = 0
+        frame_index = 0
+
+        def write_ready():
+            nonlocal next_write
+            while next_write in pending:
+                bg_frame, history_index, corners, valid = pending[next_write]
+                if history_index is not None and corners is None:
+                    break
+                with metrics.stage('render.frame'):
+                    result = self._compose(next_write, bg_frame, corners if valid else None)
+                with metrics.stage('io.encode'):
+                    writer.write(result)
+                metrics.count('frames.composed')
+                del pending[next_write]
+                next_write += 1
+                if progress_every and next_write % progress_every == 0:
+                    print(f"Composed {next_write} frames")
+
+        by_history = {}
+        while max_frames is None or frame_index < max_frames:
+            if frame_index == 0 and first_frame is not None:
+                bg_frame = first_frame
+            else:
+                with metrics.stage('io.decode'):
+                    ret, bg_frame = bg_cap.read()
+                if not ret:
+                    break
+
+            history = self.tracker.tracking_history
+            recorded = len(history)
+            corners = self.tracker.track_frame(bg_frame)
+            if debug_writer is not None:
+                with metrics.stage('io.debug_encode'):
+                    debug_writer.write(draw_tracking_overlay(bg_frame.copy(), frame_index, corners))
+
+            if len(history) == recorded:
+                pending[frame_index] = [bg_frame, None, None, False]
+            else:
+                # Frames without valid tracking still hold their place in the
+                # smoothing window but, like in the saved tracking data, are
+                # left out of their neighbours' averages
+                history_index = len(history) - 1
+                valid = corners is not None
+                pending[frame_index] = [bg_frame, history_index, None, valid]
+                by_history[history_index] = frame_index
+                if not valid:
+                    corners = history[history_index]
+                for index, smoothed in self.smoother.push(corners, valid):
+                    pending[by_history.pop(index)][2] = smoothed
+
+            write_ready()
+            metrics.gauge('queue.lookahead', len(pending))
+            frame_index += 1
+
+        for index, smoothed in self.smoother.flush():
+            pending[by_history.pop(index)][2] = smoothed
+        write_ready()
+
+        return next_write
+
+
+def render_segment(segment_path: str,
+                   background_path: str,
+                   artwork_path: str,
+                   start: int,
+                   end: int,
+                   corners,
+                   homographies: np.ndarray,
+                   valid: np.ndarray,
+                   artwork_mode: str = 'memmap',
+                   artwork_options: Optional[dict] = None,
+                   blend_mode='normal',
+                   cache_dir: Optional[str] = None,
+                   cache_max_bytes: int = 2 * 1024 ** 3,
+                   compositor_options: Optional[dict] = None) -> int:
+    """Compose background frames [start, end) into a lossless segment file.
+
+    corners, homographies and valid hold the entries of those frames only.
+    Returns the number of frames written.
+    """
+    artwork_options = artwork_options or {}
+    compositor_options = compositor_options or {}
+
+    bg_cap = cv2.VideoCapture(background_path)
+    bg_cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    # Artwork frame index = background index mod artwork length
+    artwork = open_artwork(artwork_path, artwork_mode, **artwork_options)
+
+    fps = int(bg_cap.get(cv2.CAP_PROP_FPS))
+    width = int(bg_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(bg_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(segment_path, cv2.VideoWriter_fourcc(*SEGMENT_FOURCC),
+                             fps, (width, height))
+    if not writer.isOpened():
+        bg_cap.release()
+        artwork.close()
+        raise IOError(f"Cannot open segment writer for {segment_path}")
+
+    render_cache = RenderCache(cache_dir, cache_max_bytes) if cache_dir else None
+    compositor = DynamicCompositor(debug_mode=False, render_cache=render_cache, **compositor_options)
+    written = 0
+
+    for frame_index in range(start, end):
+        ret_bg, bg_frame = bg_cap.read()
+        if not ret_bg:
+            break
+
+        k = frame_index - start
+        homography = homographies[k] if valid[k] else None
+        result = render_frame(compositor, frame_index, bg_frame, artwork.get(frame_index),
+                              homography, corners[k], blend_mode,
+                              art_key=artwork.frame_key(frame_index))
+        writer.write(result)
+        written += 1
+
+    bg_cap.release()
+    artwork.close()
+    writer.release()
+    return written
+
+
+def _render_segment(task) -> int:
+    """Worker process entry point: render_segment over a task tuple"""
+    # Parallelism comes from processes; keep OpenCV from oversubscribing cores
+    cv2.setNumThreads(1)
+    return render_segment(*task)
+
+
+def stitch_segments(segment_paths: List[str],
+                    output_path: str,
+                    fps: float,
+                    size: Tuple[int, int],
+                    fourcc='mp4v',
+                    remove: bool = True) -> int:
+    """Concatenate segment files in order into output_path; returns frames written"""
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    if not writer.isOpened():
+        raise IOError(f"Cannot open video writer for {output_path}")
+    written = 0
+    for segment_path in segment_paths:
+        cap = cv2.VideoCapture(segment_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(frame)
+            written += 1
+        cap.release()
+        if remove:
+            os.remove(segment_path)
+    writer.release()
+    return written
+
+
+def render_chunked(background_path: str,
+                   artwork_path: str,
+                   corner_history: List,
+                   output_path: str,
+                   num_processes: Optional[int] = None,
+                   num_chunks: Optional[int] = None,
+                   segment_dir: Optional[str] = None,
+                   blend_mode='normal',
+                   fourcc='mp4v',
+                   homographies: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                   cache_dir: Optional[str] = None,
+                   cache_max_bytes: int = 2 * 1024 ** 3,
+                   artwork_mode: str = 'memmap',
+                   artwork_max_size: Optional[Tuple[int, int]] = None,
+                   compositor_options: Optional[dict] = None) -> int:
+    """Render the composition in frame-range chunks across worker processes.
+
+    Each worker seeks its own captures, composes its range from the shared
+    corner history and writes a lossless segment; segments are then stitched
+    in order into output_path. homographies is an optional precomputed
+    (stack, valid) pair from DynamicCompositor.batch_homographies; cache_dir
+    enables a RenderCache shared by the workers. Workers read artwork
+    through open_artwork(artwork_mode); the default memmap mode decodes the
+    artwork once here and shares the frames with every worker.
+    compositor_options are extra DynamicCompositor arguments (mask mode).
+    Returns the number of frames written.
+    """
+    num_processes = num_processes or os.cpu_count() or 1
+    num_chunks = num_chunks or num_processes
+    segment_dir = segment_dir or os.path.join(os.path.dirname(output_path) or '.', 'segments')
+    os.makedirs(segment_dir, exist_ok=True)
+
+    artwork_options = {'max_size': artwork_max_size}
+    if artwork_mode == 'memmap':
+        # Decode once up front so workers only map the frame file
+        try:
+            with open_artwork(artwork_path, artwork_mode, **artwork_options) as artwork:
+                art_width, art_height = artwork.frame_size
+        except IOError as e:
+            print(f"Error: {e}")
+            return 0
+    else:
+        art_cap = cv2.VideoCapture(artwork_path)
+        art_width, art_height = scaled_size(
+            (int(art_cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(art_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+            artwork_max_size)
+        art_cap.release()
+
+    if homographies is None:
+        art_corners = [(0, 0), (art_width, 0), (art_width, art_height), (0, art_height)]
+        homographies = DynamicCompositor().batch_homographies(art_corners, corner_history)
+    homography_stack, valid = homographies
+
+    bg_cap = cv2.VideoCapture(background_path)
+    fps = int(bg_cap.get(cv2.CAP_PROP_FPS))
+    width = int(bg_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(bg_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    bg_cap.release()
+
+    total = len(corner_history)
+    bounds = np.linspace(0, total, min(num_chunks, max(total, 1)) + 1).astype(int)
+    tasks = []
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if end <= start:
+            continue
+        segment_path = os.path.join(segment_dir, f"segment_{i:04d}.{SEGMENT_EXT}")
+        tasks.append((segment_path, background_path, artwork_path, int(start), int(end),
+                      corner_history[start:end], homography_stack[start:end], valid[start:end],
+                      artwork_mode, artwork_options, blend_mode, cache_dir, cache_max_bytes,
+                      compositor_options))
+
+    # spawn: cv2 and fork do not mix well once OpenCV threads exist
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=min(num_processes, len(tasks)) or 1) as pool:
+        pool.map(_render_segment, tasks)
+
+    # Stitch segments in order
+    return stitch_segments([task[0] for task in tasks], output_path, fps, (width, height), fourcc)
@@ -0,0 +1,120 @@
+# src/render_cache.py
+import hashlib
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+import numpy as np
+from typing import Optional, Tuple
+
+
+class RenderCache:
+    """On-disk, content-addressed cache of warped artwork and masks.
+
+    Entries are keyed by a hash of everything that determines them (artwork
+    source and frame index, homography, output shape, ROI and mask params),
+    so re-renders that only change blend settings skip warp and mask work.
+    Total size is capped with least-recently-used eviction. Safe to share
+    between threads; processes can point separate instances at one directory.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._index: 'OrderedDict[str, int]' = OrderedDict()
+        self._total = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.npz'):
+                path = os.path.join(cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Stable hash of arrays, tuples and scalars"""
+        digest = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                digest.update(str((part.shape, part.dtype.str)).encode())
+                digest.update(np.ascontiguousarray(part).tobytes())
+            else:
+                digest.update(repr(part).encode())
+            digest.update(b'|')
+        return digest.hexdigest()
+
+    @staticmethod
+    def source_id(path: str) -> str:
+        """Identity of a source file that changes when the file does"""
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Cached (warped, mask) for key, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                warped, mask = data['warped'], data['mask']
+            os.utime(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            with self._lock:
+                self.misses += 1
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._total -= size
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+        return warped, mask
+
+    def put(self, key: str, warped: np.ndarray, mask: np.ndarray):
+        """Store an entry (written atomically) and evict down to max_bytes"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, warped=warped, mask=mask)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._total += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def nbytes(self) -> int:
+        return self._total
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._total = 0
@@ -0,0 +1,241 @@
+# src/smoothing.py
+from collections import deque
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+class CornerHistory:
+    """Growable, contiguous (N, 4, 2) float32 store of per-frame corners,
+    with a validity flag and a 0-1 confidence per frame"""
+
+    def __init__(self, capacity: int = 1024):
+        capacity = max(1, capacity)
+        self._data = np.empty((capacity, 4, 2), dtype=np.float32)
+        self._valid = np.empty(capacity, dtype=bool)
+        self._confidence = np.empty(capacity, dtype=np.float32)
+        self._length = 0
+
+    def append(self, corners, valid: bool = True, confidence: float = 1.0):
+        """Append one frame of corners (amortized O(1))"""
+        if self._length == len(self._data):
+            self._data = self._grow(self._data)
+            self._valid = self._grow(self._valid)
+            self._confidence = self._grow(self._confidence)
+        self._data[self._length] = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+        self._valid[self._length] = valid
+        self._confidence[self._length] = confidence
+        self._length += 1
+
+    def _grow(self, array: np.ndarray) -> np.ndarray:
+        grown = np.empty((len(array) * 2,) + array.shape[1:], dtype=array.dtype)
+        grown[:self._length] = array[:self._length]
+        return grown
+
+    def clear(self):
+        self._length = 0
+
+    def keep_last(self, count: int):
+        """Drop all but the last count frames, keeping the storage"""
+        count = min(max(0, count), self._length)
+        start = self._length - count
+        self._data[:count] = self._data[start:self._length]
+        self._valid[:count] = self._valid[start:self._length]
+        self._confidence[:count] = self._confidence[start:self._length]
+        self._length = count
+
+    @property
+    def array(self) -> np.ndarray:
+        """View of the stored corners, shape (N, 4, 2)"""
+        return self._data[:self._length]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Per-frame validity, shape (N,)"""
+        return self._valid[:self._length]
+
+    @property
+    def confidence(self) -> np.ndarray:
+        """Per-frame tracking confidence, shape (N,)"""
+        return self._confidence[:self._length]
+
+    def tolist(self) -> List[List[Tuple[float, float]]]:
+        return [[(float(x), float(y)) for x, y in corners] for corners in self.array]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __iter__(self):
+        return iter(self.array)
+
+
+def moving_average(history, window: int = 5, valid=None) -> np.ndarray:
+    """Centered moving average over an (N, 4, 2) corner history.
+
+    The window shrinks at the ends of the shot, matching the original
+    per-frame loop; histories shorter than the window are returned as is.
+    With a per-frame valid mask only valid frames are averaged, so held
+    corners from lost frames do not drag their neighbours; a frame with no
+    valid frame in its window keeps its own corners.
+    """
+    history = np.asarray(history, dtype=np.float32).reshape(-1, 4, 2)
+    n = len(history)
+    if n < window:
+        return history.copy()
+
+    half = window // 2
+    index = np.arange(n)
+    start = np.maximum(index - half, 0)
+    end = np.minimum(index + half + 1, n)
+
+    # float64 running sum keeps hour-long shots exact enough
+    csum = np.zeros((n + 1, 4, 2), dtype=np.float64)
+    if valid is None:
+        np.cumsum(history, axis=0, out=csum[1:])
+        counts = end - start
+    else:
+        valid = np.asarray(valid, dtype=bool).reshape(n)
+        np.cumsum(np.where(valid[:, np.newaxis, np.newaxis], history, 0), axis=0, out=csum[1:])
+        cvalid = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(valid, out=cvalid[1:])
+        counts = cvalid[end] - cvalid[start]
+
+    averaged = (csum[end] - csum[start]) / np.maximum(counts, 1)[:, np.newaxis, np.newaxis]
+    empty = counts == 0
+    if empty.any():
+        averaged[empty] = history[empty]
+    return averaged.astype(np.float32)
+
+
+class LookaheadSmoother:
+    """Streaming centered moving average with a window // 2 frame look-ahead.
+
+    push() takes one frame of corners and returns the frames whose window is
+    now complete; flush() returns the rest at the end of the shot. The
+    output equals moving_average() over the whole history, with the same
+    per-frame valid weighting.
+    """
+
+    def __init__(self, window: int = 5):
+        self.window = max(1, window)
+        self.half = self.window // 2
+        self.reset()
+
+    def reset(self):
+        self._raw = deque()
+        self._csum = deque([np.zeros((4, 2), dtype=np.float64)])
+        self._cvalid = deque([0])
+        self._first = 0
+        self._count = 0
+        self._emitted = 0
+
+    def _emit(self, index: int, end: int) -> np.ndarray:
+        start = max(index - self.half, 0)
+        count = self._cvalid[end - self._first] - self._cvalid[start - self._first]
+        if count == 0:
+            return self._raw[index - self._first].copy()
+        total = self._csum[end - self._first] - self._csum[start - self._first]
+        return (total / count).astype(np.float32)
+
+    def push(self, corners, valid: bool = True) -> List[Tuple[int, np.ndarray]]:
+        """Add the next frame; returns ready (history index, smoothed corners).
+
+        Invalid frames hold their place in the window but are left out of
+        every average.
+        """
+        x = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+        self._raw.append(x)
+        self._csum.append(self._csum[-1] + x if valid else self._csum[-1])
+        self._cvalid.append(self._cvalid[-1] + int(bool(valid)))
+        self._count += 1
+
+        # Short histories are returned unsmoothed, so wait for a full window
+        ready = []
+        if self._count < self.window:
+            return ready
+        while self._emitted + self.half < self._count:
+            ready.append((self._emitted, self._emit(self._emitted, self._emitted + self.half + 1)))
+            self._emitted += 1
+        self._trim()
+        return ready
+
+    def flush(self) -> List[Tuple[int, np.ndarray]]:
+        """Remaining frames, with the window shrinking at the end of the shot"""
+        ready = []
+        while self._emitted < self._count:
+            index = self._emitted
+            if self._count < self.window:
+                smoothed = self._raw[index - self._first].copy()
+            else:
+                smoothed = self._emit(index, min(index + self.half + 1, self._count))
+            ready.append((index, smoothed))
+            self._emitted += 1
+        self._trim()
+        return ready
+
+    def _trim(self):
+        # Keep only what the next window can reach
+        while self._first < self._emitted - self.half and len(self._raw) > 1:
+            self._raw.popleft()
+            self._csum.popleft()
+            self._cvalid.popleft()
+            self._first += 1
+
+
+class OneEuroFilter:
+    """Causal One-Euro filter over corner arrays, O(1) per frame.
+
+    Smooths jitter at low speeds while letting fast marquee motion through
+    with little lag (Casiez et al., 2012).
+    """
+
+    def __init__(self,
+                 freq: float = 30.0,
+                 min_cutoff: float = 1.0,
+                 beta: float = 0.05,
+                 d_cutoff: float = 1.0):
+        self.freq = freq
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x_prev: Optional[np.ndarray] = None
+        self._dx_prev: Optional[np.ndarray] = None
+        self._t_prev: Optional[float] = None
+
+    @staticmethod
+    def _alpha(cutoff, dt: float):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, corners, timestamp: Optional[float] = None) -> np.ndarray:
+        """Filter one frame of corners; timestamp in seconds (default 1/freq steps)"""
+        x = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+
+        if self._x_prev is None:
+            self._x_prev = x.copy()
+            self._dx_prev = np.zeros_like(x)
+            self._t_prev = timestamp
+            return x.copy()
+
+        dt = 1.0 / self.freq
+        if timestamp is not None and self._t_prev is not None and timestamp > self._t_prev:
+            dt = timestamp - self._t_prev
+        self._t_prev = timestamp
+
+        # Filtered speed drives the cutoff of the position filter
+        dx = (x - self._x_prev) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = a_d * dx + (1 - a_d) * self._dx_prev
+
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        a = self._alpha(cutoff, dt)
+        x_hat = (a * x + (1 - a) * self._x_prev).astype(np.float32)
+
+        self._x_prev = x_hat
+        self._dx_prev = dx_hat
+        return x_hat.copy()
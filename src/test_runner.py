@@ -1,17 +1,90 @@
 # src/test_runner.py
 import cv2
 import numpy as np
+import argparse
 import os
-import sys
 from motion_tracker import MarqueeTracker
 from compositor import DynamicCompositor
+from tracking_io import (BINARY_EXT, homography_cache_path, load_homography_cache, 
+                         load_tracking, save_homography_cache)
+from render_cache import RenderCache
+from artwork_source import open_artwork, warp_resolution
+from corner_init import corners_path
+from metrics import metrics
+from pipeline import (SinglePassPipeline, ThreadedCompositionPipeline, draw_tracking_overlay, 
+                      render_frame, render_chunked)
+
+
+# Ways run_full_test composes: serial loop, threaded pipeline, chunked
+# worker processes, or tracking and composing in one decode
+COMPOSITION_MODES = ('serial', 'threaded', 'chunked', 'single-pass')
 
 
 class PrismaMotionTest:
-    def __init__(self, output_dir="output"):
+    def __init__(self, 
+                 output_dir="output", 
+                 tracker_backend='csrt', 
+                 tracking_format='json', 
+                 blend_mode='normal', 
+                 cache_dir=None, 
+                 artwork_mode='memory', 
+                 artwork_max_size=None, 
+                 corners=None, 
+                 corners_file=None, 
+                 auto_corners=False, 
+                 interactive=True, 
+                 profile=None, 
+                 profile_allocations=False, 
+                 color_smoothing=None, 
+                 mask_mode='gaussian', 
+                 feather=2.0, 
+                 feather_fraction=None, 
+                 mask_supersample=1, 
+                 proxy_scale=None, 
+                 refine='template'):
         self.output_dir = output_dir
-        self.tracker = MarqueeTracker(debug_mode=True)
-        self.compositor = DynamicCompositor(debug_mode=True)
+        self.blend_mode = blend_mode
+        
+        # Artwork source mode (see artwork_source.ARTWORK_SOURCES) and an
+        # optional (width, height) limit, or 'auto' for the warp resolution
+        self.artwork_mode = artwork_mode
+        self.artwork_max_size = artwork_max_size
+        
+        # Headless corner initialization; corners_file defaults to the
+        # shot's sidecar (<video>.corners.json) when it exists
+        self.corners = corners
+        self.corners_file = corners_file
+        self.auto_corners = auto_corners
+        self.interactive = interactive
+        
+        # Per-stage metrics export path (.trace.json for a Chrome trace)
+        self.profile = profile
+        if profile:
+            metrics.reset()
+            metrics.enable(track_allocations=profile_allocations)
+        
+        # 'json' for interchange, 'binary' for the memory-mapped .trk format
+        ext = BINARY_EXT if tracking_format == 'binary' else '.json'
+        self.tracking_data_path = f"{output_dir}/tracking_debug/tracking_data{ext}"
+        # proxy_scale < 1 tracks on downscaled frames, refining at full res
+        self.tracker = MarqueeTracker(debug_mode=True, backend=tracker_backend, 
+                                      proxy_scale=proxy_scale, refine=refine)
+        
+        # Warped artwork / mask cache shared across re-renders
+        self.cache_dir = cache_dir
+        render_cache = RenderCache(cache_dir) if cache_dir else None
+        
+        # Mask feathering (see DynamicCompositor), shared by every compositor
+        self.mask_options = {
+            'mask_mode': mask_mode, 
+            'feather': feather, 
+            'feather_fraction': feather_fraction, 
+            'mask_supersample': mask_supersample, 
+        }
+        # color_smoothing (EMA of the color gain) applies to in-order renders:
+        # the serial loop and single pass; parallel workers match per frame
+        self.compositor = DynamicCompositor(debug_mode=True, render_cache=render_cache, 
+                                            color_smoothing=color_smoothing, **self.mask_options)
         
         # Create output directories
         os.makedirs(f"{output_dir}/tracking_debug", exist_ok=True)
@@ -45,8 +118,14 @@ class PrismaMotionTest:
             print("Error: Cannot read first frame")
             return False
             
-        # Manual corner selection
-        corners = self.tracker.setup_manual_tracking(first_frame)
+        # Corner selection: given, sidecar file, auto-detected or manual
+        corners = self.tracker.setup_tracking(
+            first_frame, 
+            corners=self.corners, 
+            corners_file=self.corners_file or corners_path(background_video_path), 
+            auto_detect=self.auto_corners, 
+            interactive=self.interactive
+        )
         if not corners:
             print("Corner selection cancelled")
             return False
@@ -54,71 +133,115 @@ class PrismaMotionTest:
         # Initialize trackers
         self.tracker.initialize_trackers(first_frame, corners)
         
-        # Process video
+        # Process video, starting with the already decoded first frame
         frame_count = 0
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset to beginning
+        frame = first_frame
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
+        while frame is not None:
             # Track corners
             current_corners = self.tracker.track_frame(frame.copy())
             
             # Draw tracking visualization
-            if current_corners:
-                # Draw corners
-                for i, corner in enumerate(current_corners):
-                    cv2.circle(frame, corner, 8, (0, 255, 0), -1)
-                    cv2.putText(frame, f'{i+1}', 
-                               (corner[0]+10, corner[1]), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                
-                # Draw marquee outline
-                pts = np.array(current_corners, dtype=np.int32)
-                cv2.polylines(frame, [pts], True, (255, 0, 0), 3)
-                
-                # Draw tracking info
-                cv2.putText(frame, f"Frame: {frame_count}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                cv2.putText(frame, f"Corners: {len(current_corners)}/4", 
-                           (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            else:
-                cv2.putText(frame, "TRACKING LOST", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            draw_tracking_overlay(frame, frame_count, current_corners)
             
-            debug_out.write(frame)
+            with metrics.stage('io.debug_encode'):
+                debug_out.write(frame)
+            metrics.count('frames.tracked')
             frame_count += 1
             
             if frame_count % 30 == 0:
                 print(f"Processed {frame_count} frames")
+            
+            with metrics.stage('io.decode'):
+                ret, frame = cap.read()
+            if not ret:
+                frame = None
         
         cap.release()
         debug_out.release()
         
         # Save tracking data
-        self.tracker.save_tracking_data(
-            f"{self.output_dir}/tracking_debug/tracking_data.json"
-        )
+        self.tracker.save_tracking_data(self.tracking_data_path)
         
         print(f"Tracking test completed. {frame_count} frames processed.")
-        print(f"Tracking success rate: {len(self.tracker.tracking_history)}/{frame_count} frames")
+        print(f"Tracking success rate: {int(self.tracker.tracking_history.valid.sum())}/{frame_count} frames")
         
         return True
     
+    def load_corner_history(self, 
+                            background_video_path: str, 
+                            tracking_data_path: str = None):
+        """Load smoothed corners from tracking data, tracking first if missing"""
+        if tracking_data_path and os.path.exists(tracking_data_path):
+            return load_tracking(tracking_data_path).smoothed
+        
+        print("No tracking data provided, running tracking first...")
+        if not self.test_tracking_only(background_video_path):
+            return None
+        return self.tracker.smooth_tracking()
+    
+    def load_tracking_valid(self, 
+                            frames: int, 
+                            tracking_data_path: str = None) -> np.ndarray:
+        """Per-frame tracking validity matching load_corner_history"""
+        if tracking_data_path and os.path.exists(tracking_data_path):
+            valid = load_tracking(tracking_data_path).valid
+            source = tracking_data_path
+        else:
+            valid = self.tracker.tracking_history.valid
+            source = "Tracking history"
+        if len(valid) != frames:
+            raise ValueError(f"{source} has validity for {len(valid)} frames, expected {frames}")
+        return valid
+    
+    def load_homographies(self, 
+                          art_corners, 
+                          corner_history, 
+                          tracking_data_path: str = None):
+        """Batched homography stack, cached next to the tracking data
+        
+        Frames whose tracking was lost are marked invalid along with frames
+        with degenerate corners, so composition leaves them untouched.
+        """
+        cache_path = None
+        if tracking_data_path and os.path.exists(tracking_data_path):
+            cache_path = homography_cache_path(tracking_data_path)
+            cached = load_homography_cache(cache_path, art_corners, tracking_data_path)
+            if cached is not None:
+                return cached
+        
+        homographies, valid = self.compositor.batch_homographies(art_corners, corner_history)
+        invalid = int(np.count_nonzero(~valid))
+        if invalid:
+            print(f"{invalid} frames have degenerate marquee corners")
+        
+        tracked = self.load_tracking_valid(len(corner_history), tracking_data_path)
+        lost = int(np.count_nonzero(valid & ~tracked))
+        if lost:
+            print(f"{lost} frames have no valid tracking and are left uncomposited")
+        valid = valid & tracked
+        
+        if cache_path:
+            save_homography_cache(cache_path, art_corners, homographies, valid)
+        return homographies, valid
+    
     def test_composition(self, 
                         background_video_path: str, 
                         artwork_video_path: str, 
-                        tracking_data_path: str = None):
-        """Test full composition pipeline"""
+                        tracking_data_path: str = None, 
+                        num_workers: int = 0, 
+                        queue_depth: int = 8):
+        """Test full composition pipeline
+        
+        num_workers > 0 runs the threaded decode/compose/encode pipeline
+        with that many compose workers instead of the serial loop.
+        """
         print("=== TESTING COMPOSITION ===")
         
         # Load videos
         bg_cap = cv2.VideoCapture(background_video_path)
-        art_cap = cv2.VideoCapture(artwork_video_path)
         
-        if not bg_cap.isOpened() or not art_cap.isOpened():
+        if not bg_cap.isOpened() or not os.path.exists(artwork_video_path):
             print("Error: Cannot open video files")
             return False
         
@@ -135,119 +258,325 @@ class PrismaMotionTest:
         )
         
         # Load or generate tracking data
-        if tracking_data_path and os.path.exists(tracking_data_path):
-            import json
-            with open(tracking_data_path, 'r') as f:
-                tracking_data = json.load(f)
-            corner_history = tracking_data['smoothed_history']
-        else:
-            print("No tracking data provided, running tracking first...")
-            if not self.test_tracking_only(background_video_path):
-                return False
-            corner_history = self.tracker.smooth_tracking()
+        corner_history = self.load_corner_history(background_video_path, tracking_data_path)
+        if corner_history is None:
+            return False
         
-        # Get artwork frame for homography calculation
-        ret, art_frame = art_cap.read()
-        if not ret:
-            print("Error: Cannot read artwork frame")
+        # Artwork frames by index, decoded once and looped without seeking
+        try:
+            artwork = open_artwork(artwork_video_path, self.artwork_mode, 
+                                   max_size=self.resolve_artwork_max_size(corner_history))
+        except IOError as e:
+            print(f"Error: {e}")
             return False
             
-        art_height, art_width = art_frame.shape[:2]
-        
         # Define source corners (artwork corners)
-        art_corners = [(0, 0), (art_width, 0), (art_width, art_height), (0, art_height)]
+        art_corners = artwork.corners
+        
+        # Homographies for the whole shot, precomputed once
+        homographies, valid = self.load_homographies(art_corners, corner_history, tracking_data_path)
         
         # Process composition
         frame_count = 0
         
-        while frame_count < len(corner_history):
-            ret_bg, bg_frame = bg_cap.read()
-            ret_art, art_frame = art_cap.read()
-            
-            if not ret_bg:
-                break
-                
-            # Loop artwork if shorter than background
-            if not ret_art:
-                art_cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                ret_art, art_frame = art_cap.read()
+        if num_workers > 0 and metrics.enabled and metrics.track_allocations:
+            # Allocation deltas are process-wide, so they need a single thread
+            print("Allocation profiling composes on one thread; ignoring num_workers")
+            num_workers = 0
+        
+        if num_workers > 0:
+            pipeline = ThreadedCompositionPipeline(
+                lambda compositor, index, bg_frame, art_frame: self.render_frame(
+                    compositor, index, bg_frame, art_frame, 
+                    homographies[index] if valid[index] else None, corner_history[index], 
+                    art_key=artwork.frame_key(index)
+                ),
+                compositor_factory=lambda: DynamicCompositor(
+                    debug_mode=True, render_cache=self.compositor.render_cache, **self.mask_options
+                ),
+                num_workers=num_workers, queue_depth=queue_depth
+            )
+            frame_count = pipeline.run(bg_cap, artwork, comp_out, len(corner_history))
+        else:
+            while frame_count < len(corner_history):
+                with metrics.stage('io.decode'):
+                    ret_bg, bg_frame = bg_cap.read()
                 
-            if not ret_art:
-                break
-            
-            # Get tracking corners for this frame
-            dst_corners = corner_history[frame_count]
+                if not ret_bg:
+                    break
             
-            # Calculate homography
-            homography = self.compositor.calculate_homography(art_corners, dst_corners)
-            
-            if homography is not None:
-                # Warp artwork
-                warped_art = self.compositor.warp_artwork(
-                    art_frame, homography, (width, height)
-                )
-                
-                # Create mask
-                mask = self.compositor.create_mask(dst_corners, bg_frame.shape)
+                # Artwork loops if shorter than background
+                with metrics.stage('io.artwork'):
+                    art_frame = artwork.get(frame_count)
+                with metrics.stage('render.frame'):
+                    result = self.render_frame(
+                        self.compositor, frame_count, bg_frame, art_frame, 
+                        homographies[frame_count] if valid[frame_count] else None, 
+                        corner_history[frame_count], art_key=artwork.frame_key(frame_count)
+                    )
                 
-                # Color matching
-                color_matched_art = self.compositor.color_match(
-                    warped_art, bg_frame, mask
-                )
+                with metrics.stage('io.encode'):
+                    comp_out.write(result)
+                metrics.count('frames.composed')
+                frame_count += 1
                 
-                # Blend frames
-                result = self.compositor.blend_frames(
-                    bg_frame, color_matched_art, mask, blend_mode='normal'
-                )
-                
-                # Add debug info
-                cv2.putText(result, f"Frame: {frame_count}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                
-            else:
-                result = bg_frame
-                cv2.putText(result, "NO HOMOGRAPHY", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            
-            comp_out.write(result)
-            frame_count += 1
-            
-            if frame_count % 30 == 0:
-                print(f"Composed {frame_count} frames")
+                if frame_count % 30 == 0:
+                    print(f"Composed {frame_count} frames")
         
         bg_cap.release()
-        art_cap.release()
+        artwork.close()
         comp_out.release()
         
         print(f"Composition test completed. {frame_count} frames processed.")
         return True
     
-    def run_full_test(self, background_video: str, artwork_video: str):
-        """Run complete test pipeline"""
-        print("=== RUNNING FULL PRISMA MOTION TEST ===")
+    def test_composition_chunked(self, 
+                                 background_video_path: str, 
+                                 artwork_video_path: str, 
+                                 tracking_data_path: str = None, 
+                                 num_processes: int = None, 
+                                 num_chunks: int = None):
+        """Test composition rendered in frame-range chunks across processes"""
+        print("=== TESTING CHUNKED COMPOSITION ===")
         
-        # Step 1: Test tracking
-        if not self.test_tracking_only(background_video):
-            print("Tracking test failed")
+        corner_history = self.load_corner_history(background_video_path, tracking_data_path)
+        if corner_history is None:
             return False
-            
-        # Step 2: Test composition
-        tracking_data_path = f"{self.output_dir}/tracking_debug/tracking_data.json"
-        if not self.test_composition(background_video, artwork_video, tracking_data_path):
-            print("Composition test failed")
+        
+        # Workers share the artwork through a memory-mapped frame file
+        artwork_max_size = self.resolve_artwork_max_size(corner_history)
+        try:
+            with open_artwork(artwork_video_path, 'memmap', max_size=artwork_max_size) as artwork:
+                art_corners = artwork.corners
+        except IOError as e:
+            print(f"Error: {e}")
+            return False
+        
+        frame_count = render_chunked(
+            background_video_path, artwork_video_path, corner_history, 
+            f"{self.output_dir}/composition_tests/composition_test.mp4", 
+            num_processes=num_processes, num_chunks=num_chunks, 
+            segment_dir=f"{self.output_dir}/composition_tests/segments", 
+            blend_mode=self.blend_mode, 
+            homographies=self.load_homographies(art_corners, corner_history, tracking_data_path), 
+            cache_dir=self.cache_dir, 
+            artwork_mode='memmap', 
+            artwork_max_size=artwork_max_size, 
+            compositor_options=self.mask_options
+        )
+        
+        print(f"Chunked composition completed. {frame_count} frames processed.")
+        return frame_count > 0
+    
+    def resolve_artwork_max_size(self, corner_history):
+        """Artwork size limit, resolving 'auto' to the shot's warp resolution"""
+        if self.artwork_max_size == 'auto':
+            return warp_resolution(corner_history)
+        return self.artwork_max_size
+    
+    def render_frame(self, 
+                     compositor: DynamicCompositor, 
+                     frame_index: int, 
+                     bg_frame: np.ndarray, 
+                     art_frame: np.ndarray, 
+                     homography: np.ndarray, 
+                     dst_corners, 
+                     art_key=None) -> np.ndarray:
+        """Compose a single frame with debug overlay"""
+        return render_frame(compositor, frame_index, bg_frame, art_frame, 
+                            homography, dst_corners, self.blend_mode, art_key=art_key)
+    
+    def test_single_pass(self, 
+                         background_video_path: str, 
+                         artwork_video_path: str, 
+                         debug_video: bool = True, 
+                         smoothing_window: int = 5):
+        """Track and compose in one decode of the background
+        
+        Writes the same composition as tracking then composing, plus the
+        tracking data and (optionally) the tracking debug video.
+        """
+        print("=== TESTING SINGLE-PASS TRACKING + COMPOSITION ===")
+        
+        bg_cap = cv2.VideoCapture(background_video_path)
+        if not bg_cap.isOpened():
+            print(f"Error: Cannot open video {background_video_path}")
             return False
+        
+        fps = int(bg_cap.get(cv2.CAP_PROP_FPS))
+        width = int(bg_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(bg_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        
+        ret, first_frame = bg_cap.read()
+        if not ret:
+            print("Error: Cannot read first frame")
+            return False
+        
+        corners = self.tracker.setup_tracking(
+            first_frame, 
+            corners=self.corners, 
+            corners_file=self.corners_file or corners_path(background_video_path), 
+            auto_detect=self.auto_corners, 
+            interactive=self.interactive
+        )
+        if not corners:
+            print("Corner selection cancelled")
+            return False
+        self.tracker.initialize_trackers(first_frame, corners)
+        
+        # The marquee size is not known up front, so 'auto' downscaling
+        # does not apply here
+        try:
+            artwork = open_artwork(artwork_video_path, self.artwork_mode, 
+                                   max_size=None if self.artwork_max_size == 'auto' else self.artwork_max_size)
+        except IOError as e:
+            print(f"Error: {e}")
+            return False
+        
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        comp_out = cv2.VideoWriter(
+            f"{self.output_dir}/composition_tests/composition_test.mp4",
+            fourcc, fps, (width, height)
+        )
+        debug_out = None
+        if debug_video:
+            debug_out = cv2.VideoWriter(
+                f"{self.output_dir}/tracking_debug/tracking_test.mp4",
+                fourcc, fps, (width, height)
+            )
+        
+        pipeline = SinglePassPipeline(self.tracker, self.compositor, artwork, 
+                                      blend_mode=self.blend_mode, 
+                                      smoothing_window=smoothing_window)
+        frame_count = pipeline.run(bg_cap, comp_out, first_frame=first_frame, debug_writer=debug_out)
+        
+        bg_cap.release()
+        artwork.close()
+        comp_out.release()
+        if debug_out is not None:
+            debug_out.release()
+        
+        self.tracker.save_tracking_data(self.tracking_data_path)
+        
+        print(f"Single-pass test completed. {frame_count} frames processed.")
+        print(f"Tracking success rate: {int(self.tracker.tracking_history.valid.sum())}/{frame_count} frames")
+        return frame_count > 0
+    
+    def report_metrics(self):
+        """Print the metrics summary and export it when profiling"""
+        if not self.profile:
+            return
+        print("=== METRICS ===")
+        print(metrics.summary_table())
+        metrics.export(self.profile)
+        print(f"Metrics saved to {self.profile}")
+    
+    def run_full_test(self, background_video: str, artwork_video: str, single_pass: bool = False, 
+                      debug_video: bool = True, mode: str = 'serial', workers: int = None, 
+                      queue_depth: int = 8):
+        """Run complete test pipeline
+        
+        mode is one of COMPOSITION_MODES (single_pass selects 'single-pass').
+        workers is the number of compose threads (default 4) for 'threaded'
+        and of processes (default one per core) for 'chunked'.
+        """
+        print("=== RUNNING FULL PRISMA MOTION TEST ===")
+        if single_pass:
+            mode = 'single-pass'
+        if mode not in COMPOSITION_MODES:
+            raise ValueError(f"Unknown composition mode '{mode}', expected one of {COMPOSITION_MODES}")
+        
+        try:
+            if mode == 'single-pass':
+                if not self.test_single_pass(background_video, artwork_video, debug_video):
+                    print("Single-pass test failed")
+                    return False
+                print("=== ALL TESTS COMPLETED SUCCESSFULLY ===")
+                return True
             
-        print("=== ALL TESTS COMPLETED SUCCESSFULLY ===")
-        return True
+            # Step 1: Test tracking
+            if not self.test_tracking_only(background_video):
+                print("Tracking test failed")
+                return False
+                
+            # Step 2: Test composition
+            if mode == 'chunked':
+                composed = self.test_composition_chunked(background_video, artwork_video, 
+                                                         self.tracking_data_path, num_processes=workers)
+            else:
+                num_workers = (workers or 4) if mode == 'threaded' else 0
+                composed = self.test_composition(background_video, artwork_video, self.tracking_data_path, 
+                                                 num_workers=num_workers, queue_depth=queue_depth)
+            if not composed:
+                print("Composition test failed")
+                return False
+                
+            print("=== ALL TESTS COMPLETED SUCCESSFULLY ===")
+            return True
+        finally:
+            self.report_metrics()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python test_runner.py <background_video> <artwork_video>")
-        sys.exit(1)
-        
-    background_video = sys.argv[1]
-    artwork_video = sys.argv[2]
+    parser = argparse.ArgumentParser(description="Prisma motion tracking + composition test")
+    parser.add_argument('background_video')
+    parser.add_argument('artwork_video')
+    parser.add_argument('--output-dir', default='output')
+    parser.add_argument('--corners', help="initial marquee corners, 'x1,y1 x2,y2 x3,y3 x4,y4'")
+    parser.add_argument('--corners-file', help="sidecar corners file (default <background>.corners.json)")
+    parser.add_argument('--auto-corners', action='store_true', help="detect the marquee quad on the first frame")
+    parser.add_argument('--no-interactive', action='store_true', help="never open the selection window")
+    parser.add_argument('--backend', default='csrt', help="tracker backend (csrt, lk)")
+    parser.add_argument('--proxy-scale', type=float, help="track on frames downscaled by this factor (e.g. 0.25)")
+    parser.add_argument('--refine', default='template', choices=['template', 'subpix', 'none'], 
+                        help="full-res refinement of proxy-tracked corners")
+    parser.add_argument('--tracking-format', default='json', choices=['json', 'binary'])
+    parser.add_argument('--blend-mode', default='normal')
+    parser.add_argument('--cache-dir')
+    parser.add_argument('--mode', default='serial', choices=COMPOSITION_MODES, 
+                        help="composition: serial loop, threaded pipeline, chunked processes or single pass")
+    parser.add_argument('--single-pass', action='store_true', help="same as --mode single-pass")
+    parser.add_argument('--workers', type=int, 
+                        help="compose threads (threaded, default 4) or processes (chunked, default one per core)")
+    parser.add_argument('--queue-depth', type=int, default=8, help="frames per queue of the threaded pipeline")
+    parser.add_argument('--no-debug-video', action='store_true', help="skip the tracking debug video (single pass)")
+    parser.add_argument('--profile', help="export per-stage metrics (JSON, or a Chrome trace if *.trace.json)")
+    parser.add_argument('--profile-allocations', action='store_true', help="also track bytes allocated (slow)")
+    parser.add_argument('--color-smoothing', type=float, help="EMA weight of each frame's color gain (0-1]")
+    parser.add_argument('--artwork-mode', default='memory', choices=['memory', 'memmap', 'stream'])
+    parser.add_argument('--mask', default='gaussian', choices=['gaussian', 'sdf'], help="marquee mask feathering")
+    parser.add_argument('--feather', default='2', help="SDF feather width in px, or a percentage of the quad size ('1.5%%')")
+    parser.add_argument('--mask-supersample', type=int, default=1, help="SDF samples per pixel side")
+    args = parser.parse_args()
     
-    tester = PrismaMotionTest()
-    tester.run_full_test(background_video, artwork_video)
+    feather, feather_fraction = 2.0, None
+    if args.feather.endswith('%'):
+        feather_fraction = float(args.feather[:-1]) / 100
+    else:
+        feather = float(args.feather)
+        
+    tester = PrismaMotionTest(
+        output_dir=args.output_dir, 
+        tracker_backend=args.backend, 
+        tracking_format=args.tracking_format, 
+        blend_mode=args.blend_mode, 
+        cache_dir=args.cache_dir, 
+        artwork_mode=args.artwork_mode, 
+        corners=args.corners, 
+        corners_file=args.corners_file, 
+        auto_corners=args.auto_corners, 
+        interactive=not args.no_interactive, 
+        profile=args.profile, 
+        profile_allocations=args.profile_allocations, 
+        color_smoothing=args.color_smoothing, 
+        mask_mode=args.mask, 
+        feather=feather, 
+        feather_fraction=feather_fraction, 
+        mask_supersample=args.mask_supersample, 
+        proxy_scale=args.proxy_scale, 
+        refine=None if args.refine == 'none' else args.refine
+    )
+    if not tester.run_full_test(args.background_video, args.artwork_video, 
+                                single_pass=args.single_pass, debug_video=not args.no_debug_video, 
+                                mode=args.mode, workers=args.workers, queue_depth=args.queue_depth):
+        raise SystemExit(1)
@@ -0,0 +1,259 @@
+# src/tracker_backends.py
+import cv2
+import numpy as np
+from typing import List, Tuple, Optional
+
+
+class TrackerBackend:
+    """Interface for marquee corner tracking backends"""
+
+    name = 'base'
+
+    def __init__(self, debug_mode=True):
+        self.debug_mode = debug_mode
+
+    def init(self, frame: np.ndarray, corners: List[Tuple[int, int]]) -> bool:
+        """Start tracking the given corners on frame"""
+        raise NotImplementedError
+
+    def update(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Track corners into frame, returning a (4, 2) float array or None"""
+        raise NotImplementedError
+
+    def update_partial(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Track corners into frame, keeping the ones that were found.
+
+        Returns (4, 2) corners (NaN where lost) and a (4,) bool found mask.
+        Backends that track the quad as a whole find all corners or none.
+        """
+        corners = self.update(frame) if self.active else None
+        if corners is None:
+            return np.full((4, 2), np.nan, dtype=np.float32), np.zeros(4, dtype=bool)
+        return np.asarray(corners, dtype=np.float32).reshape(4, 2), np.ones(4, dtype=bool)
+
+    def reinit_corners(self, frame: np.ndarray, corners, indices):
+        """Resume tracking after corners were re-acquired.
+
+        corners holds the current estimate of all four corners and indices
+        the re-acquired ones; by default the whole backend restarts from it.
+        """
+        self.init(frame, [tuple(c) for c in np.asarray(corners).reshape(4, 2)])
+
+    @property
+    def active(self) -> bool:
+        """Whether the backend can still produce corners"""
+        raise NotImplementedError
+
+
+class CSRTBackend(TrackerBackend):
+    """One CSRT tracker per corner (accurate, slow).
+
+    A corner whose tracker fails stays lost (its slot is None) until it is
+    re-initialized with reinit_corners; the other corners keep tracking.
+    """
+
+    name = 'csrt'
+
+    def __init__(self, debug_mode=True, box_size=30):
+        super().__init__(debug_mode)
+        self.box_size = box_size
+        self.trackers = [None] * 4
+        # Sub-pixel part of each corner, lost to the integer tracking box
+        self.offsets = [(0.0, 0.0)] * 4
+
+    def _start(self, frame: np.ndarray, index: int, corner) -> bool:
+        half = self.box_size // 2
+
+        # Create bounding box around corner
+        x, y = int(corner[0]), int(corner[1])
+        bbox = (x - half, y - half, self.box_size, self.box_size)
+
+        # Initialize tracker (OpenCV >= 4.5.1 returns None from init)
+        tracker = cv2.TrackerCSRT_create()
+        success = tracker.init(frame, bbox)
+
+        if success is None or success:
+            self.trackers[index] = tracker
+            self.offsets[index] = (corner[0] - x, corner[1] - y)
+            return True
+        self.trackers[index] = None
+        print(f"Failed to initialize tracker for corner {corner}")
+        return False
+
+    def init(self, frame: np.ndarray, corners: List[Tuple[int, int]]) -> bool:
+        self.trackers = [None] * 4
+        self.offsets = [(0.0, 0.0)] * 4
+        started = sum(self._start(frame, i, corner) for i, corner in enumerate(corners))
+        print(f"Initialized {started} corner trackers")
+        return started == 4
+
+    def reinit_corners(self, frame: np.ndarray, corners, indices):
+        """Restart only the trackers of the re-acquired corners"""
+        for i in indices:
+            self._start(frame, i, corners[i])
+
+    def update(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        corners, found = self.update_partial(frame)
+        if found.all():
+            return corners
+        return None
+
+    def update_partial(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        current_corners = np.full((4, 2), np.nan, dtype=np.float32)
+        found = np.zeros(4, dtype=bool)
+
+        for i, (tracker, offset) in enumerate(zip(self.trackers, self.offsets)):
+            if tracker is None:
+                continue
+            success, bbox = tracker.update(frame)
+
+            if success:
+                # Calculate center of bounding box
+                center_x = bbox[0] + bbox[2] / 2
+                center_y = bbox[1] + bbox[3] / 2
+                current_corners[i] = (center_x + offset[0], center_y + offset[1])
+                found[i] = True
+
+                if self.debug_mode:
+                    # Draw tracking box
+                    cv2.rectangle(frame,
+                                (int(bbox[0]), int(bbox[1])),
+                                (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3])),
+                                (255, 0, 0), 2)
+                    cv2.putText(frame, f'C{i}',
+                               (int(center_x), int(center_y)),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            else:
+                print(f"Lost tracking for corner {i}")
+                self.trackers[i] = None
+
+        return current_corners, found
+
+    @property
+    def active(self) -> bool:
+        return any(tracker is not None for tracker in self.trackers)
+
+
+class OpticalFlowBackend(TrackerBackend):
+    """Pyramidal Lucas-Kanade tracking of the corners plus interior features.
+
+    All points are tracked in one batched calcOpticalFlowPyrLK call, filtered
+    with a forward-backward check, and a RANSAC homography fitted to the
+    survivors moves the four corners. Occluded corners keep following the
+    marquee as long as enough interior features survive.
+    """
+
+    name = 'lk'
+
+    def __init__(self,
+                 debug_mode=True,
+                 max_features=200,
+                 min_features=12,
+                 win_size=(21, 21),
+                 max_level=3,
+                 fb_threshold=1.0,
+                 ransac_threshold=3.0):
+        super().__init__(debug_mode)
+        self.max_features = max_features
+        self.min_features = min_features
+        self.lk_params = dict(
+            winSize=win_size,
+            maxLevel=max_level,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01),
+        )
+        self.fb_threshold = fb_threshold
+        self.ransac_threshold = ransac_threshold
+
+        self.prev_gray = None
+        self.corners = None
+        self.features = None
+
+    @staticmethod
+    def _gray(frame: np.ndarray) -> np.ndarray:
+        if frame.ndim == 2:
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _detect_features(self, gray: np.ndarray, corners: np.ndarray) -> np.ndarray:
+        """Good features to track inside the marquee quad"""
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        cv2.fillPoly(mask, [corners.astype(np.int32)], 255)
+        features = cv2.goodFeaturesToTrack(gray, self.max_features, 0.01, 7, mask=mask)
+        if features is None:
+            return np.empty((0, 2), dtype=np.float32)
+        return features.reshape(-1, 2)
+
+    def init(self, frame: np.ndarray, corners: List[Tuple[int, int]]) -> bool:
+        self.prev_gray = self._gray(frame)
+        self.corners = np.array(corners, dtype=np.float32).reshape(4, 2)
+        self.features = self._detect_features(self.prev_gray, self.corners)
+        print(f"Initialized optical flow tracker with {len(self.features)} features")
+        return True
+
+    def update(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        if self.corners is None:
+            return None
+        gray = self._gray(frame)
+
+        # Corners first, interior features after, tracked in one batch
+        prev_pts = np.vstack([self.corners, self.features]).astype(np.float32)
+        next_pts, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.prev_gray, gray, prev_pts.reshape(-1, 1, 2), None, **self.lk_params)
+        back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(
+            gray, self.prev_gray, next_pts, None, **self.lk_params)
+
+        next_pts = next_pts.reshape(-1, 2)
+        fb_error = np.linalg.norm(prev_pts - back_pts.reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.fb_threshold)
+
+        if np.count_nonzero(good) < 4:
+            print("Lost optical flow tracking: too few points")
+            self.corners = None
+            return None
+
+        homography, inliers = cv2.findHomography(
+            prev_pts[good], next_pts[good], cv2.RANSAC, self.ransac_threshold)
+        if homography is None:
+            print("Lost optical flow tracking: no homography")
+            self.corners = None
+            return None
+
+        corners = cv2.perspectiveTransform(self.corners.reshape(-1, 1, 2), homography)
+        self.corners = corners.reshape(4, 2)
+
+        # Keep interior features that survived and agree with the homography
+        keep = good.copy()
+        keep[np.flatnonzero(good)] = inliers.ravel().astype(bool)
+        keep[:4] = False
+        self.features = next_pts[keep]
+
+        if len(self.features) < self.min_features:
+            self.features = self._detect_features(gray, self.corners)
+
+        self.prev_gray = gray
+
+        if self.debug_mode:
+            for x, y in self.features:
+                cv2.circle(frame, (int(x), int(y)), 2, (0, 255, 255), -1)
+
+        return self.corners.copy()
+
+    @property
+    def active(self) -> bool:
+        return self.corners is not None
+
+
+TRACKER_BACKENDS = {
+    CSRTBackend.name: CSRTBackend,
+    OpticalFlowBackend.name: OpticalFlowBackend,
+}
+
+
+def create_backend(backend, debug_mode=True) -> TrackerBackend:
+    """Backend instance from a name in TRACKER_BACKENDS or an instance"""
+    if isinstance(backend, TrackerBackend):
+        return backend
+    if backend not in TRACKER_BACKENDS:
+        raise ValueError(f"Unknown tracker backend '{backend}', "
+                         f"expected one of {sorted(TRACKER_BACKENDS)}")
+    return TRACKER_BACKENDS[backend](debug_mode=debug_mode)
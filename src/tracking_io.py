@@ -0,0 +1,355 @@
+# src/tracking_io.py
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+# Binary layout: MAGIC, uint32 header length, JSON header, then 64-byte
+# aligned sections (offsets in the header are relative to the first one):
+# smoothed (N,4,2) float32, raw (N,4,2) float32, a packed per-frame
+# validity bitmap and (when recorded) per-frame confidence (N,) float32
+MAGIC = b'PRSMTRK1'
+BINARY_EXT = '.trk'
+_ALIGN = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class TrackingData:
+    """Per-frame tracking data, either memory-mapped or in memory"""
+
+    def __init__(self,
+                 smoothed: np.ndarray,
+                 raw: Optional[np.ndarray] = None,
+                 valid_bits: Optional[np.ndarray] = None,
+                 initial_corners: Optional[List[Tuple[float, float]]] = None,
+                 confidence: Optional[np.ndarray] = None):
+        self.smoothed = smoothed
+        self.raw = raw if raw is not None else smoothed
+        if valid_bits is None:
+            valid_bits = np.packbits(np.ones(len(smoothed), dtype=bool))
+        self.valid_bits = valid_bits
+        self.initial_corners = initial_corners
+        # Files written before confidence was recorded: 1 where valid
+        if confidence is None:
+            confidence = self.valid.astype(np.float32)
+        self.confidence = confidence
+
+    def __len__(self) -> int:
+        return len(self.smoothed)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.smoothed[index]
+
+    def is_valid(self, index: int) -> bool:
+        """Whether frame index has tracked corners (O(1), no unpacking)"""
+        return bool(self.valid_bits[index >> 3] & (0x80 >> (index & 7)))
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Validity of every frame as a bool array"""
+        return np.unpackbits(self.valid_bits, count=len(self)).astype(bool)
+
+
+def save_tracking_binary(filepath: str,
+                         smoothed,
+                         raw=None,
+                         valid=None,
+                         initial_corners=None,
+                         confidence=None):
+    """Write tracking data in the compact binary format"""
+    smoothed = np.ascontiguousarray(smoothed, dtype=np.float32).reshape(-1, 4, 2)
+    raw = smoothed if raw is None else np.ascontiguousarray(raw, dtype=np.float32).reshape(-1, 4, 2)
+    frames = len(smoothed)
+    if len(raw) != frames:
+        raise ValueError(f"raw history has {len(raw)} frames, smoothed has {frames}")
+    if valid is None:
+        valid = np.ones(frames, dtype=bool)
+    valid_bits = np.packbits(np.asarray(valid, dtype=bool))
+    if confidence is None:
+        confidence = np.asarray(valid, dtype=np.float32)
+    confidence = np.ascontiguousarray(confidence, dtype=np.float32).reshape(frames)
+
+    header = {
+        'version': 1,
+        'frames': frames,
+        'initial_corners': None if initial_corners is None else [list(map(float, c)) for c in initial_corners],
+    }
+    # Section offsets are relative to the aligned end of the header
+    raw_offset = _align(smoothed.nbytes)
+    valid_offset = _align(raw_offset + raw.nbytes)
+    header['sections'] = {
+        'smoothed': 0,
+        'raw': raw_offset,
+        'valid': valid_offset,
+        'confidence': _align(valid_offset + valid_bits.nbytes),
+    }
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(len(MAGIC) + 4 + len(header_bytes))
+
+    with open(filepath, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in (('smoothed', smoothed), ('raw', raw), ('valid', valid_bits),
+                            ('confidence', confidence)):
+            f.seek(data_start + header['sections'][name])
+            f.write(array.tobytes())
+
+
+def load_tracking_binary(filepath: str) -> TrackingData:
+    """Memory-map a binary tracking file; frames are read on access"""
+    with open(filepath, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filepath} is not a Prisma tracking file")
+        header_len, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len))
+    data_start = _align(len(MAGIC) + 4 + header_len)
+
+    frames = header['frames']
+    sections = {name: data_start + offset for name, offset in header['sections'].items()}
+    if frames == 0:
+        empty = np.empty((0, 4, 2), dtype=np.float32)
+        return TrackingData(empty, empty, np.empty(0, dtype=np.uint8), header['initial_corners'])
+
+    smoothed = np.memmap(filepath, dtype=np.float32, mode='r',
+                         offset=sections['smoothed'], shape=(frames, 4, 2))
+    raw = np.memmap(filepath, dtype=np.float32, mode='r',
+                    offset=sections['raw'], shape=(frames, 4, 2))
+    valid_bits = np.memmap(filepath, dtype=np.uint8, mode='r',
+                           offset=sections['valid'], shape=((frames + 7) // 8,))
+    confidence = None
+    if 'confidence' in sections:
+        confidence = np.memmap(filepath, dtype=np.float32, mode='r',
+                               offset=sections['confidence'], shape=(frames,))
+    return TrackingData(smoothed, raw, valid_bits, header['initial_corners'], confidence)
+
+
+def save_tracking_json(filepath: str,
+                       smoothed,
+                       raw=None,
+                       valid=None,
+                       initial_corners=None,
+                       confidence=None):
+    """Write tracking data as indented JSON (interchange format)"""
+    smoothed = np.asarray(smoothed, dtype=np.float32).reshape(-1, 4, 2)
+    raw = smoothed if raw is None else np.asarray(raw, dtype=np.float32).reshape(-1, 4, 2)
+    data = {
+        'initial_corners': initial_corners,
+        'tracking_history': raw.tolist(),
+        'smoothed_history': smoothed.tolist()
+    }
+    if valid is not None:
+        data['valid'] = [bool(v) for v in valid]
+    if confidence is not None:
+        data['confidence'] = [round(float(c), 4) for c in confidence]
+
+    with open(filepath, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_tracking_json(filepath: str) -> TrackingData:
+    """Load JSON tracking data into memory"""
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+
+    smoothed = np.asarray(data['smoothed_history'], dtype=np.float32).reshape(-1, 4, 2)
+    raw = np.asarray(data.get('tracking_history', smoothed), dtype=np.float32).reshape(-1, 4, 2)
+    if len(raw) != len(smoothed):
+        raw = smoothed
+    valid_bits = None
+    if 'valid' in data:
+        valid_bits = np.packbits(np.asarray(data['valid'], dtype=bool))
+    confidence = None
+    if 'confidence' in data:
+        confidence = np.asarray(data['confidence'], dtype=np.float32)
+    return TrackingData(smoothed, raw, valid_bits, data.get('initial_corners'), confidence)
+
+
+def is_binary_tracking(filepath: str) -> bool:
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_tracking(filepath: str) -> TrackingData:
+    """Load tracking data in either format"""
+    if is_binary_tracking(filepath):
+        return load_tracking_binary(filepath)
+    return load_tracking_json(filepath)
+
+
+def save_tracking(filepath: str, smoothed, raw=None, valid=None, initial_corners=None, confidence=None):
+    """Write tracking data, binary when the path ends in BINARY_EXT"""
+    if filepath.endswith(BINARY_EXT):
+        save_tracking_binary(filepath, smoothed, raw, valid, initial_corners, confidence)
+    else:
+        save_tracking_json(filepath, smoothed, raw, valid, initial_corners, confidence)
+
+
+def convert(src_path: str, dst_path: str):
+    """Convert between JSON and binary tracking files (by dst extension)"""
+    data = load_tracking(src_path)
+    save_tracking(dst_path, np.asarray(data.smoothed), np.asarray(data.raw),
+                  data.valid, data.initial_corners, np.asarray(data.confidence))
+
+
+# Append-only log written while tracking, so an interrupted run can resume:
+# LOG_MAGIC, then one fixed-size record per frame
+LOG_MAGIC = b'PRSMLOG1'
+LOG_EXT = '.tracklog'
+LOG_RECORD = np.dtype([('corners', '<f4', (4, 2)), ('confidence', '<f4'), ('valid', 'u1')])
+
+
+def read_tracking_log(filepath: str) -> np.ndarray:
+    """Complete records of a tracking log (a torn last record is ignored)"""
+    if not os.path.exists(filepath):
+        return np.empty(0, dtype=LOG_RECORD)
+    with open(filepath, 'rb') as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{filepath} is not a Prisma tracking log")
+        data = f.read()
+    count = len(data) // LOG_RECORD.itemsize
+    return np.frombuffer(data[:count * LOG_RECORD.itemsize], dtype=LOG_RECORD).copy()
+
+
+class TrackingLog:
+    """Per-frame tracking records appended to disk as tracking runs.
+
+    Existing complete records are kept (see records) and new ones are
+    appended after them; the file is flushed and synced every flush_every
+    frames, so a crash loses at most that many frames of tracking.
+    """
+
+    def __init__(self, filepath: str, flush_every: int = 30):
+        self.filepath = filepath
+        self.flush_every = max(1, flush_every)
+        self.records = read_tracking_log(filepath)
+
+        self._file = open(filepath, 'r+b' if os.path.exists(filepath) else 'w+b')
+        self._file.seek(0)
+        self._file.write(LOG_MAGIC)
+        # Drop a torn record left by a crash mid-write
+        self._file.truncate(len(LOG_MAGIC) + len(self.records) * LOG_RECORD.itemsize)
+        self._file.seek(0, os.SEEK_END)
+        self._appended = 0
+        self._pending = 0
+
+    def __len__(self) -> int:
+        """Frames logged, including records from earlier runs"""
+        return len(self.records) + self._appended
+
+    def truncate(self, count: int):
+        """Keep only the first count records from earlier runs (before appending)"""
+        if self._appended:
+            raise ValueError("Cannot truncate a tracking log after appending to it")
+        self.records = self.records[:count]
+        self._file.truncate(len(LOG_MAGIC) + len(self.records) * LOG_RECORD.itemsize)
+        self._file.seek(0, os.SEEK_END)
+
+    def append(self, corners, valid: bool = True, confidence: float = 1.0):
+        record = np.zeros(1, dtype=LOG_RECORD)
+        record['corners'] = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+        record['confidence'] = confidence
+        record['valid'] = valid
+        self._file.write(record.tobytes())
+        self._appended += 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def homography_cache_path(tracking_path: str) -> str:
+    """Homography stack cache file next to the tracking data"""
+    root, _ = os.path.splitext(tracking_path)
+    return f"{root}.homography.npz"
+
+
+def save_homography_cache(filepath: str, src_corners, homographies: np.ndarray, valid: np.ndarray):
+    np.savez(filepath,
+             src_corners=np.asarray(src_corners, dtype=np.float64),
+             homographies=homographies,
+             valid=valid)
+
+
+def load_homography_cache(filepath: str,
+                          src_corners,
+                          tracking_path: Optional[str] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Cached (homographies, valid), or None if missing or stale"""
+    if not os.path.exists(filepath):
+        return None
+    if tracking_path and os.path.getmtime(filepath) < os.path.getmtime(tracking_path):
+        return None
+
+    with np.load(filepath) as cache:
+        if not np.array_equal(cache['src_corners'], np.asarray(src_corners, dtype=np.float64)):
+            return None
+        return cache['homographies'], cache['valid']
+
+
+def benchmark(sizes=(10_000, 100_000, 1_000_000), work_dir: Optional[str] = None):
+    """Compare load time and file size of JSON vs binary tracking data"""
+    rng = np.random.default_rng(0)
+    rows = []
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        for frames in sizes:
+            history = rng.uniform(0, 3840, (frames, 4, 2)).astype(np.float32)
+            json_path = os.path.join(tmp, f'{frames}.json')
+            bin_path = os.path.join(tmp, f'{frames}{BINARY_EXT}')
+            save_tracking_json(json_path, history, history)
+            save_tracking_binary(bin_path, history, history)
+
+            start = time.perf_counter()
+            data = load_tracking_json(json_path)
+            _ = data[frames // 2]
+            json_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            data = load_tracking_binary(bin_path)
+            _ = np.array(data[frames // 2])
+            bin_time = time.perf_counter() - start
+
+            rows.append((frames, os.path.getsize(json_path), json_time,
+                         os.path.getsize(bin_path), bin_time))
+
+    print(f"{'frames':>10} {'json MB':>10} {'json load s':>12} {'trk MB':>10} {'trk load s':>12}")
+    for frames, json_size, json_time, bin_size, bin_time in rows:
+        print(f"{frames:>10} {json_size / 1e6:>10.1f} {json_time:>12.4f} "
+              f"{bin_size / 1e6:>10.1f} {bin_time:>12.4f}")
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == 'convert':
+        convert(sys.argv[2], sys.argv[3])
+        print(f"Converted {sys.argv[2]} -> {sys.argv[3]}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'benchmark':
+        sizes = tuple(int(n) for n in sys.argv[2:]) or (10_000, 100_000, 1_000_000)
+        benchmark(sizes)
+    else:
+        print("Usage: python tracking_io.py convert <src> <dst>")
+        print("       python tracking_io.py benchmark [frames ...]")
+        sys.exit(1)
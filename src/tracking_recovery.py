@@ -0,0 +1,238 @@
+# src/tracking_recovery.py
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+from corner_refine import CornerRefiner
+
+
+# Per-corner status recorded by TrackingRecovery.update
+TRACKED = 0
+REACQUIRED = 1
+PREDICTED = 2
+
+
+def _correction(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """2x3 transform moving the src points onto dst: translation, similarity or affine"""
+    if len(src) == 1:
+        return np.float64([[1, 0, dst[0, 0] - src[0, 0]], [0, 1, dst[0, 1] - src[0, 1]]])
+    if len(src) == 2:
+        transform, _ = cv2.estimateAffinePartial2D(src, dst, method=cv2.LMEDS)
+    else:
+        transform, _ = cv2.estimateAffine2D(src, dst, method=cv2.LMEDS)
+    if transform is None:
+        # Degenerate points: fall back to the mean shift
+        shift = (dst - src).mean(axis=0)
+        return np.float64([[1, 0, shift[0]], [0, 1, shift[1]]])
+    return transform
+
+
+def _fit_error(src: np.ndarray, dst: np.ndarray) -> float:
+    """Largest distance of dst from the least-squares similarity fit of src onto it"""
+    w = src[:, 0] + 1j * src[:, 1]
+    z = dst[:, 0] + 1j * dst[:, 1]
+    wc, zc = w - w.mean(), z - z.mean()
+    scale = np.vdot(wc, zc) / max(np.vdot(wc, wc).real, 1e-12)
+    return float(np.abs(scale * wc - zc).max())
+
+
+def _consistent(src: np.ndarray, dst: np.ndarray, candidates: np.ndarray, tolerance: float) -> np.ndarray:
+    """Mask of the points that moved together from src to dst.
+
+    While the points are more than tolerance off their similarity fit, the
+    candidate whose removal fits the rest best is dropped. Any two points
+    fit exactly, so three cannot single out the odd one: inconsistent
+    candidates among three are all dropped.
+    """
+    keep = np.ones(len(src), dtype=bool)
+    while np.count_nonzero(keep) >= 3:
+        index = np.flatnonzero(keep)
+        eligible = index[candidates[index]]
+        if not len(eligible) or _fit_error(src[index], dst[index]) <= tolerance:
+            break
+        if len(index) == 3:
+            keep[eligible] = False
+            break
+        errors = [_fit_error(src[index[index != i]], dst[index[index != i]]) for i in eligible]
+        keep[eligible[int(np.argmin(errors))]] = False
+    return keep
+
+
+class TrackingRecovery:
+    """Keeps a shot tracked through lost corners.
+
+    Backends do not always notice a loss (CSRT happily follows whatever
+    covers its corner), so each tracked corner is first verified against
+    its template: a correlation below verify_score counts as lost. So does
+    a corner that moved against the others (more than max_deviation pixels
+    off a similarity fit of the predicted corners onto the other tracked
+    ones), since it has been dragged along by something covering it. A
+    corner that verifies but has changed in appearance (score below
+    refresh_score) gets a fresh template at its tracked position.
+
+    Each frame, corners the backend lost are predicted from the last quad
+    with all four corners located, moved the way the found corners moved
+    since (a similarity for two, an affine transform for three), so the
+    prediction does not drift frame by frame. With one corner found, the
+    last inter-frame homography (constant motion) is extrapolated and
+    shifted onto it; with none the whole quad coasts. Each lost corner is
+    then searched for around its prediction with a template cut on the
+    first frame; a match re-acquires it, and the backend restarts its
+    tracker.
+    Matches must agree with the other located corners in the same way;
+    with no corner tracked, at least three matches have to agree.
+
+    A frame stays valid while at least min_found corners are tracked or
+    re-acquired, or while the whole quad has coasted for at most max_coast
+    frames; after that the motion stops being extrapolated. Confidence is
+    1 for a tracked corner, the match score for a re-acquired one and fades
+    from 0.5 for a predicted one, averaged over the four corners.
+    """
+
+    def __init__(self,
+                 search_radius: int = 32,
+                 template_radius: int = 12,
+                 min_score: float = 0.7,
+                 min_found: int = 2,
+                 max_coast: int = 15,
+                 verify_score: Optional[float] = 0.8,
+                 verify_radius: int = 3,
+                 refresh_score: float = 0.9,
+                 max_deviation: Optional[float] = 8.0):
+        self.refiner = CornerRefiner('template', search_radius=search_radius,
+                                     template_radius=template_radius, min_score=min_score)
+        self.min_found = min_found
+        self.max_coast = max_coast
+        self.verify_score = verify_score
+        self.verify_radius = verify_radius
+        self.refresh_score = refresh_score
+        self.max_deviation = max_deviation
+        self.reset()
+
+    def reset(self):
+        self.corners = None
+        self.anchor = None
+        self.motion = np.eye(3)
+        self.lost_frames = np.zeros(4, dtype=np.int64)
+        self.coast_frames = 0
+
+    def init(self, frame: np.ndarray, corners, current=None):
+        """Store corner templates from the frame tracking starts on.
+
+        current is where the marquee is now when tracking resumes later in
+        the shot (default: corners).
+        """
+        self.reset()
+        corners = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+        self.refiner.init(frame, corners)
+        self.corners = corners if current is None else np.asarray(current, dtype=np.float64).reshape(4, 2)
+        self.anchor = self.corners.copy()
+
+    def verify(self, frame: np.ndarray, corners: np.ndarray, found: np.ndarray) -> np.ndarray:
+        """found, minus corners that moved against the others or no longer look like their template"""
+        found = found.copy()
+        if self.max_deviation is not None and self.corners is not None:
+            tracked = np.flatnonzero(found)
+            keep = _consistent(self._motion_prediction()[tracked], corners[tracked],
+                               np.ones(len(tracked), dtype=bool), self.max_deviation)
+            found[tracked[~keep]] = False
+        if self.verify_score is None:
+            return found
+        for i in np.flatnonzero(found):
+            match = self.refiner.match(frame, i, corners[i], self.verify_radius, min_score=-1.0)
+            if match is None:
+                # Too close to the frame edge to check; trust the backend
+                continue
+            if match[2] < self.verify_score:
+                found[i] = False
+            elif match[2] < self.refresh_score:
+                self.refiner.update_template(frame, i, corners[i])
+        return found
+
+    def _motion_prediction(self) -> np.ndarray:
+        """Last corners moved by the last inter-frame motion"""
+        predicted = cv2.perspectiveTransform(self.corners.reshape(-1, 1, 2), self.motion).reshape(4, 2)
+        if not np.isfinite(predicted).all():
+            return self.corners.copy()
+        return predicted
+
+    def predict(self, corners: np.ndarray, found: np.ndarray) -> np.ndarray:
+        """All four corners: found ones as given, lost ones predicted"""
+        predicted = self._motion_prediction()
+        if found.any() and not found.all():
+            source = self.anchor if np.count_nonzero(found) >= 2 else predicted
+            transform = _correction(source[found], corners[found].astype(np.float64))
+            lost = ~found
+            predicted[lost] = source[lost] @ transform[:, :2].T + transform[:, 2]
+        predicted[found] = corners[found]
+        return predicted
+
+    def update(self,
+               frame: np.ndarray,
+               corners: np.ndarray,
+               found: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, bool, np.ndarray]:
+        """Fill in lost corners of one frame.
+
+        corners is the backend's (4, 2) estimate with a (4,) found mask.
+        Returns (corners, per-corner status, confidence, valid, indices of
+        re-acquired corners for the backend to restart).
+        """
+        corners = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+        found = self.verify(frame, corners, np.asarray(found, dtype=bool))
+        estimate = self.predict(corners, found)
+
+        status = np.where(found, TRACKED, PREDICTED)
+        confidence = np.where(found, 1.0, 0.0)
+        matched = estimate.copy()
+        for i in np.flatnonzero(~found):
+            match = self.refiner.match(frame, i, estimate[i])
+            if match is not None:
+                matched[i] = match[:2]
+                status[i] = REACQUIRED
+                confidence[i] = match[2]
+        status, confidence = self._check_matches(estimate, matched, status, confidence)
+        reacquired = np.flatnonzero(status == REACQUIRED)
+        estimate[reacquired] = matched[reacquired]
+
+        predicted = status == PREDICTED
+        self.lost_frames = np.where(predicted, self.lost_frames + 1, 0)
+        confidence[predicted] = 0.5 * np.maximum(0.0, 1 - self.lost_frames[predicted] / (self.max_coast + 1))
+
+        located = int(np.count_nonzero(~predicted))
+        self.coast_frames = 0 if located else self.coast_frames + 1
+        valid = located >= self.min_found or (located == 0 and self.coast_frames <= self.max_coast)
+
+        # Motion model for the next prediction, measured on frames with all
+        # four corners located so predictions do not feed back into it;
+        # dropped once coasting runs out
+        if self.coast_frames > self.max_coast:
+            self.motion = np.eye(3)
+        elif located == 4:
+            motion, _ = cv2.findHomography(self.corners, estimate)
+            self.motion = motion if motion is not None else np.eye(3)
+            self.anchor = estimate.copy()
+        self.corners = estimate
+
+        return estimate.astype(np.float32), status, float(confidence.mean()), bool(valid), reacquired
+
+    def _check_matches(self,
+                       estimate: np.ndarray,
+                       matched: np.ndarray,
+                       status: np.ndarray,
+                       confidence: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Drop template matches that disagree with the other located corners"""
+        status, confidence = status.copy(), confidence.copy()
+        reacquired = status == REACQUIRED
+        if not reacquired.any() or self.max_deviation is None:
+            return status, confidence
+
+        located = np.flatnonzero(status != PREDICTED)
+        keep = _consistent(estimate[located], matched[located], reacquired[located], self.max_deviation)
+        rejected = located[~keep]
+        # Matches that could not be checked against three points could be
+        # anything that looks like a corner, e.g. the edge of an occluder
+        if not (status == TRACKED).any() and np.count_nonzero(keep) < 3:
+            rejected = np.flatnonzero(reacquired)
+        status[rejected] = PREDICTED
+        confidence[rejected] = 0.0
+        return status, confidence
@@ -0,0 +1,63 @@
+# tests/test_artwork_source.py
+import os
+import cv2
+import numpy as np
+import pytest
+
+from artwork_source import FRAMES_EXT, MemmapArtworkSource, open_artwork, prune_frames_cache
+
+
+@pytest.fixture
+def artwork_path(tmp_path):
+    path = str(tmp_path / 'art.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (96, 64))
+    for i in range(5):
+        writer.write(np.full((64, 96, 3), 40 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def _touch(path: str, size: int, mtime: float):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_removes_least_recently_used_first(tmp_path):
+    cache_dir = str(tmp_path)
+    for i in range(4):
+        _touch(os.path.join(cache_dir, f"{i}{FRAMES_EXT}"), 100, 1000 + i)
+    _touch(os.path.join(cache_dir, 'other.bin'), 1000, 0)
+
+    freed = prune_frames_cache(cache_dir, max_bytes=250, keep=os.path.join(cache_dir, f"0{FRAMES_EXT}"))
+    assert freed == 200
+    # 0 is the oldest but kept; 1 and 2 go; unrelated files are not counted
+    assert sorted(os.listdir(cache_dir)) == [f"0{FRAMES_EXT}", f"3{FRAMES_EXT}", 'other.bin']
+
+
+def test_memmap_cache_is_capped(tmp_path, artwork_path):
+    cache_dir = str(tmp_path / 'frames')
+    frame_file_bytes = 64 + 5 * 64 * 96 * 3
+
+    with open_artwork(artwork_path, 'memmap', cache_dir=cache_dir) as full:
+        assert full.get(2).shape == (64, 96, 3)
+    # A second size fits under a two-file cap
+    with MemmapArtworkSource(artwork_path, max_size=(48, 32), cache_dir=cache_dir,
+                             cache_max_bytes=2 * frame_file_bytes) as half:
+        assert half.frame_size == (48, 32)
+    assert len(os.listdir(cache_dir)) == 2
+
+    # A third evicts the least recently used, never the one being opened
+    with MemmapArtworkSource(artwork_path, max_size=(24, 16), cache_dir=cache_dir,
+                             cache_max_bytes=64 + 5 * 16 * 24 * 3) as quarter:
+        assert os.path.exists(quarter.frames_path)
+        # MJPG is lossy
+        np.testing.assert_allclose(quarter.get(1), 40, atol=4)
+    assert os.listdir(cache_dir) == [os.path.basename(quarter.frames_path)]
+
+
+def test_explicit_frames_path_is_not_pruned(tmp_path, artwork_path):
+    frames_path = str(tmp_path / f"mine{FRAMES_EXT}")
+    with MemmapArtworkSource(artwork_path, frames_path=frames_path, cache_max_bytes=0):
+        pass
+    assert os.path.exists(frames_path)
@@ -0,0 +1,103 @@
+# tests/test_batch_runner.py
+import contextlib
+import io
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import batch_runner
+from batch_runner import SHOT_DEFAULTS, compose_shot
+from benchmark import synthetic_artwork, write_synthetic_video
+from tracking_io import save_tracking
+
+
+FRAMES = 50
+
+
+class _StitchFailed(Exception):
+    pass
+
+
+@pytest.fixture
+def shot(tmp_path):
+    background = str(tmp_path / 'background.mp4')
+    truth = write_synthetic_video(background, (320, 180), FRAMES)
+    artwork = str(tmp_path / 'artwork.mp4')
+    writer = cv2.VideoWriter(artwork, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 90))
+    for _ in range(4):
+        writer.write(synthetic_artwork((160, 90)))
+    writer.release()
+    tracking = str(tmp_path / 'tracking.json')
+    save_tracking(tracking, truth)
+
+    output = tmp_path / 'out'
+    output.mkdir()
+    return {**SHOT_DEFAULTS, 'name': 'shot', 'background': background, 'artwork': artwork,
+            'tracking': tracking, 'output': str(output), 'artwork_mode': 'memory'}
+
+
+def _compose(monkeypatch, shot, checkpoint, stitch=True):
+    """Segment frame ranges rendered by compose_shot (stitching fails unless stitch)"""
+    rendered = []
+    render = batch_runner.render_segment
+
+    def render_segment(path, background, artwork, start, end, *args, **kwargs):
+        rendered.append((start, end))
+        return render(path, background, artwork, start, end, *args, **kwargs)
+
+    monkeypatch.setattr(batch_runner, 'render_segment', render_segment)
+    if not stitch:
+        def fail(*args, **kwargs):
+            raise _StitchFailed()
+        monkeypatch.setattr(batch_runner, 'stitch_segments', fail)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if stitch:
+            compose_shot(shot, checkpoint, shot['tracking'])
+        else:
+            with pytest.raises(_StitchFailed):
+                compose_shot(shot, checkpoint, shot['tracking'])
+    monkeypatch.undo()
+    return rendered
+
+
+def test_segments_are_reused_only_for_the_same_frames_and_settings(monkeypatch, shot):
+    checkpoint = {'segments': {}}
+    shot['segment_frames'] = 30
+    assert _compose(monkeypatch, shot, checkpoint, stitch=False) == [(0, 30), (30, 50)]
+    assert _compose(monkeypatch, shot, checkpoint, stitch=False) == []
+
+    # segment_0001 has 20 frames either way, but not the same ones
+    shot['segment_frames'] = 20
+    assert _compose(monkeypatch, shot, checkpoint, stitch=False) == [(0, 20), (20, 40), (40, 50)]
+
+    shot['blend_mode'] = 'screen'
+    assert _compose(monkeypatch, shot, checkpoint, stitch=False) == [(0, 20), (20, 40), (40, 50)]
+    shot['compositor'] = {'mask_mode': 'sdf'}
+    assert _compose(monkeypatch, shot, checkpoint, stitch=False) == [(0, 20), (20, 40), (40, 50)]
+
+    assert _compose(monkeypatch, shot, checkpoint) == []
+    assert checkpoint['done'] and checkpoint['frames'] == FRAMES
+    assert os.path.exists(os.path.join(shot['output'], batch_runner.OUTPUT_NAME))
+
+
+def test_retracked_segment_is_rendered_again(monkeypatch, shot):
+    checkpoint = {'segments': {}}
+    shot['segment_frames'] = 20
+    _compose(monkeypatch, shot, checkpoint, stitch=False)
+
+    data = batch_runner.load_tracking(shot['tracking'])
+    smoothed = np.asarray(data.smoothed).copy()
+    smoothed[25] += 1.0
+    save_tracking(shot['tracking'], smoothed)
+    assert _compose(monkeypatch, shot, checkpoint, stitch=False) == [(20, 40)]
+
+
+def test_short_segment_fails_the_shot(monkeypatch, shot):
+    checkpoint = {'segments': {}}
+    monkeypatch.setattr(batch_runner, 'render_segment', lambda *args, **kwargs: 3)
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(IOError):
+        compose_shot(shot, checkpoint, shot['tracking'])
+    assert checkpoint['segments'] == {}
@@ -0,0 +1,76 @@
+# tests/test_compositor_alloc.py
+import tracemalloc
+import numpy as np
+import pytest
+
+from benchmark import synthetic_artwork
+from compositor import DynamicCompositor
+
+
+FRAME_SIZE = (320, 180)
+WARMUP_FRAMES = 50
+FRAMES = 1000
+# Slack for interpreter bookkeeping (frame objects, small ints, caches);
+# one leaked frame-sized buffer per frame would be ~170 KB each
+MAX_GROWTH_BYTES = 64 * 1024
+
+
+def _corners(index: int) -> np.ndarray:
+    """Marquee that moves and changes size, so the ROI differs every frame"""
+    dx = 40 * np.sin(index / 13)
+    dy = 20 * np.cos(index / 17)
+    grow = 10 * np.sin(index / 7)
+    return np.float32([[100 + dx - grow, 50 + dy - grow], [220 + dx + grow, 55 + dy - grow],
+                       [215 + dx + grow, 130 + dy + grow], [105 + dx - grow, 125 + dy + grow]])
+
+
+@pytest.mark.parametrize('use_roi', [True, False])
+@pytest.mark.parametrize('blend_mode', ['normal', 'screen'])
+@pytest.mark.parametrize('output', ['out', 'reuse_output'])
+def test_steady_state_allocation_is_flat(use_roi, blend_mode, output):
+    width, height = FRAME_SIZE
+    compositor = DynamicCompositor(debug_mode=False, use_roi=use_roi, reuse_output=output == 'reuse_output')
+    artwork = synthetic_artwork((256, 144))
+    art_corners = [(0, 0), (256, 0), (256, 144), (0, 144)]
+    background = np.full((height, width, 3), 128, dtype=np.uint8)
+
+    quads = np.stack([_corners(i) for i in range(WARMUP_FRAMES + FRAMES)])
+    homographies, valid = compositor.batch_homographies(art_corners, quads)
+    assert valid.all()
+    out = np.empty_like(background) if output == 'out' else None
+
+    def compose(index):
+        compositor.compose_frame(background, artwork, homographies[index], quads[index],
+                                 blend_mode=blend_mode, out=out)
+
+    tracemalloc.start()
+    try:
+        for index in range(WARMUP_FRAMES):
+            compose(index)
+        baseline = tracemalloc.get_traced_memory()[0]
+        for index in range(WARMUP_FRAMES, WARMUP_FRAMES + FRAMES):
+            compose(index)
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+
+    assert growth < MAX_GROWTH_BYTES, f"{growth} bytes retained over {FRAMES} frames"
+
+
+def test_reuse_output_returns_the_shared_buffer():
+    artwork = synthetic_artwork((256, 144))
+    art_corners = [(0, 0), (256, 0), (256, 144), (0, 144)]
+    background = np.full((180, 320, 3), 128, dtype=np.uint8)
+    quad = _corners(0)
+
+    shared = DynamicCompositor(debug_mode=False, reuse_output=True)
+    fresh = DynamicCompositor(debug_mode=False)
+    H = shared.calculate_homography(art_corners, quad)
+
+    first = shared.compose_frame(background, artwork, H, quad)
+    second = shared.compose_frame(background, artwork, H, quad)
+    # Views of the same pool storage
+    assert np.shares_memory(first, second)
+    assert not np.shares_memory(fresh.compose_frame(background, artwork, H, quad),
+                                fresh.compose_frame(background, artwork, H, quad))
+    np.testing.assert_array_equal(first, fresh.compose_frame(background, artwork, H, quad))
@@ -0,0 +1,41 @@
+# tests/test_compositor_roi.py
+import numpy as np
+import pytest
+
+from benchmark import synthetic_artwork
+from compositor import DynamicCompositor
+
+
+ART_SIZE = (320, 180)
+QUADS = 20
+
+
+def _random_quads(size, count, seed):
+    """Convex-ish marquees of varying size and perspective, some crossing the frame edge"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    base = np.float32([[0.2, 0.2], [0.8, 0.2], [0.8, 0.8], [0.2, 0.8]])
+    quads = base + rng.uniform(-0.25, 0.25, (count, 4, 2)).astype(np.float32)
+    return quads * np.float32([width, height])
+
+
+@pytest.mark.parametrize('size', [(640, 360), (1000, 563)])
+@pytest.mark.parametrize('blend_mode', ['normal', 'multiply', 'screen'])
+@pytest.mark.parametrize('match_colors', [True, False])
+@pytest.mark.parametrize('mask_mode', ['gaussian', 'sdf'])
+def test_roi_matches_full_frame(size, blend_mode, match_colors, mask_mode):
+    width, height = size
+    rng = np.random.default_rng(width + len(blend_mode))
+    artwork = synthetic_artwork(ART_SIZE)
+    art_corners = [(0, 0), (ART_SIZE[0], 0), ART_SIZE, (0, ART_SIZE[1])]
+    quads = _random_quads(size, QUADS, seed=height)
+
+    roi = DynamicCompositor(debug_mode=False, mask_mode=mask_mode)
+    full = DynamicCompositor(debug_mode=False, mask_mode=mask_mode, use_roi=False)
+    homographies, valid = roi.batch_homographies(art_corners, quads)
+    for H, quad in zip(homographies[valid], quads[valid]):
+        background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        expected = full.compose_frame(background, artwork, H, quad, blend_mode, match_colors)
+        result = roi.compose_frame(background, artwork, H, quad, blend_mode, match_colors)
+        # float32 against float64 blending: at most one step of rounding apart
+        assert np.abs(result.astype(np.int16) - expected).max() <= 1
@@ -0,0 +1,92 @@
+# tests/test_corner_init.py
+import json
+
+import numpy as np
+import pytest
+
+from benchmark import synthetic_shot
+from corner_init import (detect_marquee_quad, load_corners, order_corners, parse_corners,
+                         resolve_initial_corners, save_corners)
+
+
+# The synthetic panel has a dark border a few pixels wide: detection lands on
+# that band, so a few pixels of error is as good as the scene allows
+MAX_CORNER_ERROR = 6.0
+MEAN_CORNER_ERROR = 3.5
+
+
+def _frames(size, frames=8, seed=0):
+    shot, truth = synthetic_shot(size, frames, seed=seed)
+    return list(shot), truth
+
+
+@pytest.mark.parametrize('size', [(640, 360), (1280, 720)])
+@pytest.mark.parametrize('seed', [0, 3])
+def test_detects_synthetic_marquee(size, seed):
+    frames, truth = _frames(size, seed=seed)
+    errors = []
+    for frame, expected in zip(frames, truth):
+        quad = detect_marquee_quad(frame)
+        assert quad is not None
+        assert quad.shape == (4, 2) and quad.dtype == np.float32
+        # Same clockwise-from-top-left order as the ground truth
+        errors.append(np.linalg.norm(quad - expected, axis=1))
+
+    errors = np.asarray(errors)
+    assert errors.max() <= MAX_CORNER_ERROR
+    assert errors.mean() <= MEAN_CORNER_ERROR
+
+
+def test_no_quad_in_flat_frame():
+    assert detect_marquee_quad(np.full((360, 640, 3), 128, np.uint8)) is None
+
+
+def test_auto_detect_matches_ground_truth():
+    frames, truth = _frames((640, 360), frames=1)
+    corners = resolve_initial_corners(frames[0], auto_detect=True)
+    assert len(corners) == 4
+    assert all(isinstance(v, float) for corner in corners for v in corner)
+    np.testing.assert_allclose(corners, truth[0], atol=MAX_CORNER_ERROR)
+
+
+def test_resolve_precedence(tmp_path):
+    frames, truth = _frames((640, 360), frames=1)
+    explicit = [(10.0, 20.0), (300.0, 20.0), (300.0, 200.0), (10.0, 200.0)]
+    from_file = [(11.5, 21.5), (301.5, 21.5), (301.5, 201.5), (11.5, 201.5)]
+    sidecar = str(tmp_path / 'shot.corners.json')
+    save_corners(sidecar, from_file)
+
+    # Explicit corners win over the sidecar file and detection
+    assert resolve_initial_corners(frames[0], explicit, sidecar, auto_detect=True) == explicit
+    assert resolve_initial_corners(frames[0], '10,20 300,20 300,200 10,200', sidecar) == explicit
+    # Then the sidecar file, even with detection enabled
+    assert resolve_initial_corners(frames[0], None, sidecar, auto_detect=True) == from_file
+    # A missing sidecar falls through to detection
+    detected = resolve_initial_corners(frames[0], None, str(tmp_path / 'missing.json'), auto_detect=True)
+    np.testing.assert_allclose(detected, truth[0], atol=MAX_CORNER_ERROR)
+    # Nothing to go on
+    assert resolve_initial_corners(frames[0]) is None
+
+
+def test_load_corners_formats(tmp_path):
+    corners = [(1.0, 2.0), (3.0, 4.0), (5.0, 6.0), (7.0, 8.0)]
+    path = tmp_path / 'corners'
+
+    path.write_text(json.dumps([list(c) for c in corners]))
+    assert load_corners(str(path)) == corners
+    path.write_text(json.dumps({'initial_corners': [list(c) for c in corners], 'frames': []}))
+    assert load_corners(str(path)) == corners
+    path.write_text('1 2\n3 4\n5 6\n7 8\n')
+    assert load_corners(str(path)) == corners
+
+    path.write_text(json.dumps({'corners': corners[:3]}))
+    with pytest.raises(ValueError):
+        load_corners(str(path))
+    with pytest.raises(ValueError):
+        parse_corners('1,2 3,4 5,6')
+
+
+def test_order_corners_is_clockwise_from_top_left():
+    expected = np.float32([[10, 10], [200, 15], [190, 120], [5, 110]])
+    shuffled = expected[[2, 0, 3, 1]]
+    np.testing.assert_array_equal(order_corners(shuffled), expected)
@@ -0,0 +1,59 @@
+# tests/test_homographies.py
+import cv2
+import numpy as np
+
+from compositor import DynamicCompositor
+
+
+ART_CORNERS = [(0, 0), (1024, 0), (1024, 576), (0, 576)]
+
+
+def _random_quads(count: int, seed: int = 0) -> np.ndarray:
+    """Convex quads around a moving center: a jittered, rotated, scaled rectangle"""
+    rng = np.random.default_rng(seed)
+    base = np.float64([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * [200, 120]
+    quads = []
+    for _ in range(count):
+        angle = rng.uniform(-0.5, 0.5)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        quad = base @ rotation.T * rng.uniform(0.5, 2.0) + rng.uniform(300, 1500, 2)
+        quads.append(quad + rng.uniform(-25, 25, (4, 2)))
+    return np.asarray(quads)
+
+
+def test_matches_per_frame_find_homography():
+    quads = _random_quads(200)
+    homographies, valid = DynamicCompositor().batch_homographies(ART_CORNERS, quads)
+    assert homographies.shape == (200, 3, 3)
+    assert valid.all()
+
+    src = np.float64(ART_CORNERS)
+    grid = np.stack(np.meshgrid(np.linspace(0, 1024, 9), np.linspace(0, 576, 9)), -1).reshape(-1, 1, 2)
+    for H, quad in zip(homographies, quads):
+        expected, _ = cv2.findHomography(src, quad)
+        # Compare where the matrices send artwork pixels: elementwise, the
+        # near-zero entries make any relative tolerance meaningless
+        np.testing.assert_allclose(cv2.perspectiveTransform(grid, H),
+                                   cv2.perspectiveTransform(grid, expected), atol=1e-3)
+        # The batched solve is exact at the corners
+        mapped = cv2.perspectiveTransform(src.reshape(-1, 1, 2), H).reshape(4, 2)
+        np.testing.assert_allclose(mapped, quad, atol=1e-6)
+
+
+def test_degenerate_quads_are_invalid_and_zero():
+    good = _random_quads(1)[0]
+    collinear = np.float64([[0, 0], [100, 0], [200, 0], [300, 0]])
+    concave = np.float64([[0, 0], [200, 0], [60, 60], [0, 200]])
+    bowtie = np.float64([[0, 0], [200, 200], [200, 0], [0, 200]])
+    quads = np.stack([good, collinear, concave, bowtie])
+
+    homographies, valid = DynamicCompositor().batch_homographies(ART_CORNERS, quads)
+    np.testing.assert_array_equal(valid, [True, False, False, False])
+    assert not homographies[1:].any()
+    assert np.isfinite(homographies).all()
+
+
+def test_empty_history():
+    homographies, valid = DynamicCompositor().batch_homographies(ART_CORNERS, np.empty((0, 4, 2)))
+    assert homographies.shape == (0, 3, 3)
+    assert valid.shape == (0,)
@@ -0,0 +1,69 @@
+# tests/test_live_runner.py
+import contextlib
+import io
+import time
+
+import cv2
+import pytest
+
+import live_runner
+from artwork_source import open_artwork
+from benchmark import synthetic_artwork, synthetic_shot
+from compositor import DynamicCompositor
+from live_runner import LiveSession, NullSink
+from motion_tracker import MarqueeTracker
+from smoothing import OneEuroFilter
+
+
+class _Capture:
+    """Stand-in for LatestFrameCapture serving a synthetic shot without pacing"""
+
+    fps = 30.0
+
+    def __init__(self, frames):
+        self._frames = iter(frames)
+        self.captured = 0
+        self.dropped = 0
+
+    def read(self, timeout: float = 2.0):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        self.captured += 1
+        return frame, self.captured - 1, time.perf_counter()
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(live_runner, 'LIVE_STATS_FRAMES', 8)
+    monkeypatch.setattr(live_runner, 'LIVE_HISTORY_FRAMES', 8)
+    shot, truth = synthetic_shot((320, 180), 30, seed=0)
+    tracker = MarqueeTracker(debug_mode=False, backend='lk', causal_filter=OneEuroFilter(30.0))
+    artwork_path = str(tmp_path / 'artwork.mp4')
+    writer = cv2.VideoWriter(artwork_path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 90))
+    writer.write(synthetic_artwork((160, 90)))
+    writer.release()
+    artwork = open_artwork(artwork_path, 'memory')
+    session = LiveSession(_Capture(shot), tracker, DynamicCompositor(debug_mode=False), artwork, NullSink(),
+                          adaptive=False, hud=False)
+    yield session, truth
+    artwork.close()
+
+
+def test_run_needs_start(session):
+    session, _ = session
+    with pytest.raises(RuntimeError):
+        session.run()
+
+
+def test_long_session_keeps_bounded_state(session):
+    session, truth = session
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert session.start([tuple(c) for c in truth[0]], interactive=False)
+        stats = session.run()
+
+    # Counts cover the session (start() takes the first frame); only the buffers are bounded
+    assert stats['captured'] == len(truth)
+    assert stats['frames'] == len(truth) - 1
+    assert stats['lost'] == 0
+    assert len(session.tracker.tracking_history) < 8
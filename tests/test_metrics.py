@@ -0,0 +1,66 @@
+# tests/test_metrics.py
+import threading
+
+import numpy as np
+import pytest
+
+from metrics import Metrics
+
+
+def _run_in_thread(func):
+    errors = []
+
+    def target():
+        try:
+            func()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    return errors
+
+
+@pytest.fixture
+def tracking():
+    m = Metrics()
+    m.enable(track_allocations=True)
+    yield m
+    m.disable()
+
+
+def test_stage_records_net_allocation(tracking):
+    kept = []
+    with tracking.stage('alloc'):
+        kept.append(np.ones(1 << 20, dtype=np.uint8))
+    with tracking.stage('outer'):
+        with tracking.stage('inner'):
+            kept.append(np.ones(1 << 19, dtype=np.uint8))
+
+    stages = tracking.summary()['stages']
+    assert stages['alloc']['allocated_bytes'] >= 1 << 20
+    # Nested stages are inclusive
+    assert stages['outer']['allocated_bytes'] >= stages['inner']['allocated_bytes'] >= 1 << 19
+
+
+def test_allocation_tracking_rejects_other_threads(tracking):
+    def stage():
+        with tracking.stage('worker'):
+            pass
+
+    errors = _run_in_thread(stage)
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+    assert 'worker' not in tracking.summary()['stages']
+
+
+def test_timing_only_metrics_accept_any_thread():
+    m = Metrics()
+    m.enable()
+
+    def stage():
+        with m.stage('worker'):
+            pass
+
+    assert _run_in_thread(stage) == []
+    assert m.summary()['stages']['worker']['count'] == 1
@@ -0,0 +1,73 @@
+# tests/test_pipeline.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from pipeline import ThreadedCompositionPipeline
+
+
+class _Capture:
+    """Stand-in for cv2.VideoCapture yielding numbered frames"""
+
+    def __init__(self, frames: int):
+        self.frames = frames
+        self.read_count = 0
+
+    def read(self):
+        if self.read_count >= self.frames:
+            return False, None
+        frame = np.full((4, 4, 3), self.read_count % 256, dtype=np.uint8)
+        self.read_count += 1
+        return True, frame
+
+
+class _Artwork:
+    def get(self, index: int) -> np.ndarray:
+        return np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+class _Writer:
+    """Records written frame ids and the most frames decoded but not yet written"""
+
+    def __init__(self, cap: _Capture, fail_at=None):
+        self.cap = cap
+        self.fail_at = fail_at
+        self.written = []
+        self.max_in_flight = 0
+
+    def write(self, frame: np.ndarray):
+        if len(self.written) == self.fail_at:
+            raise IOError("disk full")
+        self.max_in_flight = max(self.max_in_flight, self.cap.read_count - len(self.written))
+        self.written.append(int(frame[0, 0, 0]))
+
+
+def _render(compositor, frame_index, bg_frame, art_frame):
+    # Frame 0 is slow, so every later frame finishes ahead of it
+    if frame_index == 0:
+        time.sleep(0.3)
+    return bg_frame
+
+
+@pytest.mark.parametrize('num_workers, queue_depth', [(1, 1), (4, 2), (3, 8)])
+def test_in_flight_frames_are_bounded(num_workers, queue_depth):
+    cap = _Capture(60)
+    writer = _Writer(cap)
+    pipeline = ThreadedCompositionPipeline(_render, compositor_factory=lambda: None,
+                                           num_workers=num_workers, queue_depth=queue_depth)
+    assert pipeline.run(cap, _Artwork(), writer, 60, progress_every=None) == 60
+    assert writer.written == list(range(60))
+    assert writer.max_in_flight <= queue_depth + num_workers
+
+
+def test_writer_failure_stops_the_workers():
+    cap = _Capture(200)
+    writer = _Writer(cap, fail_at=5)
+    pipeline = ThreadedCompositionPipeline(_render, compositor_factory=lambda: None, num_workers=3, queue_depth=2)
+    before = threading.active_count()
+    with pytest.raises(IOError):
+        pipeline.run(cap, _Artwork(), writer, 200, progress_every=None)
+    assert threading.active_count() == before
+    assert cap.read_count < 200
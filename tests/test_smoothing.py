@@ -0,0 +1,100 @@
+# tests/test_smoothing.py
+import numpy as np
+import pytest
+
+from smoothing import CornerHistory, LookaheadSmoother, moving_average
+
+
+def _random_walk(frames: int, seed: int = 0) -> np.ndarray:
+    """Jittery (frames, 4, 2) corner track drifting across a 1080p frame"""
+    rng = np.random.default_rng(seed)
+    base = np.float32([[600, 300], [1300, 320], [1280, 760], [620, 740]])
+    drift = np.cumsum(rng.normal(0, 2.0, (frames, 1, 2)), axis=0)
+    return (base + drift + rng.normal(0, 0.7, (frames, 4, 2))).astype(np.float32)
+
+
+def _stream(smoother: LookaheadSmoother, history: np.ndarray, valid=None) -> np.ndarray:
+    if valid is None:
+        valid = np.ones(len(history), dtype=bool)
+    out = []
+    for corners, ok in zip(history, valid):
+        out.extend(smoother.push(corners, ok))
+    out.extend(smoother.flush())
+    assert [index for index, _ in out] == list(range(len(history)))
+    return np.asarray([corners for _, corners in out], dtype=np.float32).reshape(-1, 4, 2)
+
+
+@pytest.mark.parametrize('window', [1, 2, 3, 5, 8, 15])
+@pytest.mark.parametrize('frames', [0, 1, 4, 5, 6, 40, 301])
+def test_lookahead_matches_moving_average(window, frames):
+    history = _random_walk(frames, seed=frames + window)
+    np.testing.assert_allclose(_stream(LookaheadSmoother(window), history),
+                               moving_average(history, window), atol=1e-4)
+
+
+@pytest.mark.parametrize('window', [1, 3, 5, 8])
+@pytest.mark.parametrize('frames', [4, 6, 40, 301])
+def test_lookahead_matches_valid_weighted_moving_average(window, frames):
+    history = _random_walk(frames, seed=frames * window)
+    valid = np.random.default_rng(frames).random(frames) > 0.3
+    valid[frames // 3:frames // 3 + window] = False
+    np.testing.assert_allclose(_stream(LookaheadSmoother(window), history, valid),
+                               moving_average(history, window, valid), atol=1e-4)
+
+
+def test_invalid_frames_do_not_pull_their_neighbours():
+    history = _random_walk(30, seed=4)
+    valid = np.ones(30, dtype=bool)
+    held = history.copy()
+    held[10:13] = 5000.0
+    valid[10:13] = False
+    smoothed = moving_average(held, 5, valid)
+
+    # Neighbours average only the valid frames in their window
+    for i in (8, 9, 13, 14):
+        window = [j for j in range(i - 2, i + 3) if valid[j]]
+        np.testing.assert_allclose(smoothed[i], history[window].mean(axis=0), atol=1e-3)
+    # A frame with no valid frame in its window keeps its own corners
+    np.testing.assert_array_equal(moving_average(held, 3, valid)[11], held[11])
+    # All valid is the plain moving average
+    np.testing.assert_array_equal(moving_average(history, 5, np.ones(30, bool)), moving_average(history, 5))
+
+
+def test_lookahead_reset_and_bounded_memory():
+    smoother = LookaheadSmoother(5)
+    _stream(smoother, _random_walk(50, seed=1))
+    smoother.reset()
+
+    history = _random_walk(2000, seed=2)
+    for corners in history:
+        smoother.push(corners)
+        # Only the frames the next window can reach are kept
+        assert len(smoother._raw) <= smoother.window + 1
+    tail = smoother.flush()
+    np.testing.assert_allclose(tail[-1][1], moving_average(history, 5)[-1], atol=1e-4)
+
+
+def test_moving_average_accepts_corner_history():
+    history = _random_walk(30, seed=3)
+    store = CornerHistory(capacity=4)
+    for corners in history:
+        store.append(corners)
+    np.testing.assert_array_equal(moving_average(store.array, 5), moving_average(history, 5))
+
+
+def test_corner_history_keep_last():
+    history = _random_walk(30, seed=5)
+    store = CornerHistory(capacity=8)
+    for i, corners in enumerate(history):
+        store.append(corners, i % 3 != 0, i / 30)
+    store.keep_last(4)
+    assert len(store) == 4
+    np.testing.assert_array_equal(store.array, history[-4:])
+    np.testing.assert_array_equal(store.valid, [i % 3 != 0 for i in range(26, 30)])
+    np.testing.assert_allclose(store.confidence, np.arange(26, 30) / 30)
+
+    # Appending carries on after the kept frames
+    store.append(history[0])
+    np.testing.assert_array_equal(store[-1], history[0])
+    store.keep_last(10)
+    assert len(store) == 5
@@ -0,0 +1,143 @@
+# tests/test_tracking_io.py
+import numpy as np
+import pytest
+
+from tracking_io import (LOG_MAGIC, LOG_RECORD, TrackingLog, convert, is_binary_tracking, load_tracking,
+                         read_tracking_log, save_tracking)
+
+
+INITIAL = [(10.0, 20.0), (110.0, 22.0), (108.0, 80.0), (12.0, 78.0)]
+
+
+@pytest.fixture
+def shot():
+    """13 frames (not a multiple of 8, so the validity bitmap has a partial byte)"""
+    rng = np.random.default_rng(0)
+    raw = (rng.uniform(0, 1000, (13, 4, 2))).astype(np.float32)
+    smoothed = raw + rng.normal(0, 0.5, raw.shape).astype(np.float32)
+    valid = np.ones(13, dtype=bool)
+    valid[[3, 4, 12]] = False
+    confidence = np.where(valid, rng.uniform(0.5, 1.0, 13), 0.0).astype(np.float32)
+    return smoothed, raw, valid, confidence
+
+
+def _check(data, smoothed, raw, valid, confidence, atol=0.0):
+    assert len(data) == len(smoothed)
+    np.testing.assert_array_equal(np.asarray(data.smoothed), smoothed)
+    np.testing.assert_array_equal(np.asarray(data.raw), raw)
+    np.testing.assert_array_equal(data.valid, valid)
+    assert [data.is_valid(i) for i in range(len(valid))] == list(valid)
+    np.testing.assert_allclose(np.asarray(data.confidence), confidence, atol=atol)
+    np.testing.assert_allclose(data.initial_corners, INITIAL)
+
+
+@pytest.mark.parametrize('name', ['tracking.trk', 'tracking.json'])
+def test_round_trip(tmp_path, shot, name):
+    path = str(tmp_path / name)
+    save_tracking(path, *shot[:3], initial_corners=INITIAL, confidence=shot[3])
+    assert is_binary_tracking(path) == name.endswith('.trk')
+    # JSON stores confidence to 4 decimals
+    _check(load_tracking(path), *shot, atol=1e-4 if name.endswith('.json') else 0.0)
+
+
+def test_convert_json_to_binary_and_back(tmp_path, shot):
+    json_path = str(tmp_path / 'a.json')
+    trk_path = str(tmp_path / 'b.trk')
+    back_path = str(tmp_path / 'c.json')
+    save_tracking(json_path, *shot[:3], initial_corners=INITIAL, confidence=shot[3])
+    convert(json_path, trk_path)
+    convert(trk_path, back_path)
+    _check(load_tracking(trk_path), *shot, atol=1e-4)
+    _check(load_tracking(back_path), *shot, atol=1e-4)
+
+
+def test_defaults_without_validity_or_confidence(tmp_path, shot):
+    smoothed = shot[0]
+    for name in ('d.trk', 'd.json'):
+        path = str(tmp_path / name)
+        save_tracking(path, smoothed)
+        data = load_tracking(path)
+        np.testing.assert_array_equal(np.asarray(data.raw), smoothed)
+        assert data.valid.all()
+        np.testing.assert_array_equal(np.asarray(data.confidence), np.ones(len(smoothed), dtype=np.float32))
+
+
+def test_empty_binary(tmp_path):
+    path = str(tmp_path / 'empty.trk')
+    save_tracking(path, np.empty((0, 4, 2), dtype=np.float32))
+    data = load_tracking(path)
+    assert len(data) == 0
+    assert data.valid.shape == (0,)
+
+
+def test_binary_rejects_mismatched_raw(tmp_path, shot):
+    with pytest.raises(ValueError):
+        save_tracking(str(tmp_path / 'bad.trk'), shot[0], raw=shot[1][:-1])
+
+
+def _log(path, corners, valid, confidence, flush_every=4):
+    with TrackingLog(path, flush_every=flush_every) as log:
+        for args in zip(corners, valid, confidence):
+            log.append(*args)
+        return len(log)
+
+
+def _check_log(records, corners, valid, confidence):
+    assert len(records) == len(corners)
+    np.testing.assert_array_equal(records['corners'], corners)
+    np.testing.assert_array_equal(records['valid'].astype(bool), valid)
+    np.testing.assert_array_equal(records['confidence'], confidence)
+
+
+def test_tracking_log_round_trip_and_append(tmp_path, shot):
+    _, raw, valid, confidence = shot
+    path = str(tmp_path / 'tracking.tracklog')
+    assert len(read_tracking_log(path)) == 0
+
+    assert _log(path, raw[:5], valid[:5], confidence[:5]) == 5
+    _check_log(read_tracking_log(path), raw[:5], valid[:5], confidence[:5])
+
+    # A later run keeps the earlier records and appends after them
+    with TrackingLog(path) as log:
+        _check_log(log.records, raw[:5], valid[:5], confidence[:5])
+        for args in zip(raw[5:], valid[5:], confidence[5:]):
+            log.append(*args)
+        assert len(log) == len(raw)
+    _check_log(read_tracking_log(path), raw, valid, confidence)
+
+
+def test_tracking_log_drops_torn_record(tmp_path, shot):
+    _, raw, valid, confidence = shot
+    path = tmp_path / 'tracking.tracklog'
+    _log(str(path), raw[:6], valid[:6], confidence[:6])
+    # A crash mid-write leaves part of a record behind
+    with open(path, 'ab') as f:
+        f.write(b'\x01' * (LOG_RECORD.itemsize // 2))
+    _check_log(read_tracking_log(str(path)), raw[:6], valid[:6], confidence[:6])
+
+    # Reopening cuts the torn bytes, so new records stay aligned
+    _log(str(path), raw[6:], valid[6:], confidence[6:])
+    assert path.stat().st_size == len(LOG_MAGIC) + len(raw) * LOG_RECORD.itemsize
+    _check_log(read_tracking_log(str(path)), raw, valid, confidence)
+
+
+def test_tracking_log_truncate(tmp_path, shot):
+    _, raw, valid, confidence = shot
+    path = str(tmp_path / 'tracking.tracklog')
+    _log(path, raw, valid, confidence)
+    with TrackingLog(path) as log:
+        log.truncate(3)
+        assert len(log) == 3
+        log.append(raw[0])
+        with pytest.raises(ValueError):
+            log.truncate(2)
+    records = read_tracking_log(path)
+    _check_log(records[:3], raw[:3], valid[:3], confidence[:3])
+    np.testing.assert_array_equal(records['corners'][3], raw[0])
+
+
+def test_tracking_log_rejects_other_files(tmp_path, shot):
+    path = str(tmp_path / 'tracking.trk')
+    save_tracking(path, shot[0])
+    with pytest.raises(ValueError):
+        read_tracking_log(path)
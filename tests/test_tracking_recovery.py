@@ -0,0 +1,83 @@
+# tests/test_tracking_recovery.py
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from benchmark import OCCLUSIONS, occlude_shot, synthetic_shot
+from motion_tracker import MarqueeTracker
+from tracking_recovery import TrackingRecovery
+
+
+FRAMES = 80
+SIZE = (640, 360)
+
+
+def _errors(tracked: np.ndarray, truth: np.ndarray) -> np.ndarray:
+    """Worst corner error per frame (NaN where the tracker reported no corners)"""
+    return np.linalg.norm(tracked - truth, axis=2).max(axis=1)
+
+
+@pytest.fixture(scope='module', params=['lk', 'csrt'])
+def occluded(request):
+    """Corners tracked through the occlusion scenario (NaN where lost) and ground truth"""
+    shot, truth = synthetic_shot(SIZE, FRAMES, seed=0)
+    tracker = MarqueeTracker(debug_mode=False, backend=request.param)
+    tracked = np.full(truth.shape, np.nan, dtype=np.float32)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index, frame in enumerate(occlude_shot(shot, truth, OCCLUSIONS)):
+            if index == 0:
+                tracker.initialize_trackers(frame, [tuple(c) for c in truth[0]])
+            corners = tracker.track_frame(frame)
+            if corners is not None:
+                tracked[index] = corners
+    return tracked, truth
+
+
+def test_tracks_through_a_covered_corner(occluded):
+    tracked, truth = occluded
+    (start, end, _), _ = OCCLUSIONS
+    errors = _errors(tracked[:start], truth[:start])
+    assert errors.max() < 4.0
+
+    # Three corners stay tracked, so every frame stays valid and the
+    # covered corner follows them instead of the occluder
+    errors = _errors(tracked[start:end], truth[start:end])
+    assert not np.isnan(errors).any()
+    assert errors.max() < 15.0
+    assert np.sqrt(np.mean(errors ** 2)) < 6.0
+
+
+def test_coasts_through_full_occlusion_and_reacquires(occluded):
+    tracked, truth = occluded
+    _, (start, end, _) = OCCLUSIONS
+    # Short enough to coast on the last motion
+    errors = _errors(tracked[start:end], truth[start:end])
+    assert not np.isnan(errors).any()
+    assert errors.max() < 30.0
+
+    # Back on the marquee within a couple of frames of it reappearing
+    errors = _errors(tracked[end + 2:], truth[end + 2:])
+    assert not np.isnan(errors).any()
+    assert errors.max() < 4.0
+
+
+def test_verify_drops_the_corner_that_moved_alone():
+    shot, truth = synthetic_shot(SIZE, 1, seed=0)
+    frame = next(shot)
+    corners = truth[0] + [5.0, -3.0]
+    corners[1] += [20.0, 4.0]
+    found = np.ones(4, dtype=bool)
+
+    # Template checks off: only the geometry can reject the dragged corner
+    recovery = TrackingRecovery(verify_score=None, max_deviation=4.0)
+    recovery.init(frame, truth[0])
+    np.testing.assert_array_equal(recovery.verify(frame, corners, found), [True, False, True, True])
+    # Lost corners are not checked
+    np.testing.assert_array_equal(recovery.verify(frame, corners, np.array([True, True, False, False])),
+                                  [True, True, False, False])
+
+    recovery = TrackingRecovery(verify_score=None, max_deviation=None)
+    recovery.init(frame, truth[0])
+    assert recovery.verify(frame, corners, found).all()